@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+import datetime
+import platform
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Annotated
+
+import bw2data
+import orjson
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from config import DATA_ROOT_DIR
+from ecobalyse_data.benchmark import create_synthetic_databases, run_benchmarks
+from ecobalyse_data.logging import logger
+
+app = typer.Typer(no_args_is_help=True)
+
+BENCHMARK_PROJECT = "benchmark"
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=DATA_ROOT_DIR,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@app.command()
+def run(
+    output_file: Annotated[
+        Path,
+        typer.Argument(
+            help="The output json file, e.g. `benchmarks/$(git rev-parse --short HEAD).json`."
+        ),
+    ],
+    activities: Annotated[
+        int, typer.Option(help="Number of activities of the synthetic database.")
+    ] = 1000,
+    exchanges: Annotated[
+        int,
+        typer.Option(
+            help="Number of technosphere inputs (and of emissions) of each activity."
+        ),
+    ] = 5,
+    flows: Annotated[int, typer.Option(help="Number of biosphere flows.")] = 200,
+    characterization_factors: Annotated[
+        int, typer.Option(help="Number of characterization factors of each method.")
+    ] = 50,
+    repeat: Annotated[int, typer.Option(help="Number of runs of each stage.")] = 3,
+    sample: Annotated[
+        int,
+        typer.Option(
+            help="Number of activities also computed one LCA at a time, to measure the speedup of the batched computation."
+        ),
+    ] = 20,
+    seed: int = 0,
+):
+    """
+    Time search, LCI, LCIA, corrections and exports on a synthetic database,
+    created in a temporary Brightway directory.
+    """
+    parameters = {
+        "activities": activities,
+        "exchanges": exchanges,
+        "flows": flows,
+        "characterization_factors": characterization_factors,
+        "repeat": repeat,
+        "sample": sample,
+        "seed": seed,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bw2data.projects.change_base_directories(
+            base_dir=Path(tmp_dir),
+            base_logs_dir=Path(tmp_dir),
+            project_name=BENCHMARK_PROJECT,
+            update=False,
+        )
+        bw2data.projects._is_temp_dir = True
+        bw2data.projects.set_current(BENCHMARK_PROJECT)
+
+        eco_activities = create_synthetic_databases(
+            activities=activities,
+            exchanges=exchanges,
+            flows=flows,
+            characterization_factors=characterization_factors,
+            seed=seed,
+        )
+        results = run_benchmarks(
+            eco_activities, Path(tmp_dir), repeat=repeat, sample=sample
+        )
+
+    benchmark = {
+        "commit": _git_commit(),
+        "date": datetime.datetime.now(datetime.UTC).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "parameters": parameters,
+        "results": results,
+    }
+
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_file, "wb") as f:
+        f.write(orjson.dumps(benchmark, option=orjson.OPT_INDENT_2))
+
+    display_results(benchmark)
+    logger.info(f"Exported benchmark results to {output_file}")
+
+
+def display_results(benchmark: dict, reference: dict | None = None):
+    title = f"Benchmark {benchmark['commit']}"
+    if reference is not None:
+        title += f" vs {reference['commit']}"
+    table = Table(title=title, show_header=True)
+    table.add_column("stage", style="cyan")
+    table.add_column("median", style="magenta")
+    table.add_column("min")
+    if reference is not None:
+        table.add_column("reference median")
+        table.add_column("ratio")
+
+    for stage, timings in benchmark["results"].items():
+        row = [stage, f"{timings['median']:.4g}", f"{timings['min']:.4g}"]
+        if reference is not None:
+            reference_timings = reference["results"].get(stage)
+            if reference_timings is None:
+                row += ["", ""]
+            else:
+                row += [
+                    f"{reference_timings['median']:.4g}",
+                    f"{timings['median'] / reference_timings['median']:.2f}",
+                ]
+        table.add_row(*row)
+
+    Console().print(table)
+
+
+@app.command()
+def compare(
+    reference_file: Annotated[
+        Path, typer.Argument(help="The reference results, e.g. from the main branch.")
+    ],
+    results_file: Annotated[Path, typer.Argument(help="The results to compare.")],
+):
+    """
+    Compare two benchmark results (median times, and their ratio)
+    """
+    with open(reference_file, "rb") as f:
+        reference = orjson.loads(f.read())
+    with open(results_file, "rb") as f:
+        benchmark = orjson.loads(f.read())
+
+    if reference["parameters"] != benchmark["parameters"]:
+        logger.warning(
+            f"-> The benchmarks were run with different parameters: {reference['parameters']} and {benchmark['parameters']}"
+        )
+
+    display_results(benchmark, reference)
+
+
+if __name__ == "__main__":
+    app()
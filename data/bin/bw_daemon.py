@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+from pathlib import Path
+from typing import Annotated
+
+import bw2data
+import typer
+
+from config import settings
+from ecobalyse_data.bw.daemon import BrightwayDaemon, get_client, process_impacts
+from ecobalyse_data.logging import logger
+
+app = typer.Typer(no_args_is_help=True)
+
+
+@app.command()
+def serve(
+    socket_path: Annotated[
+        Path,
+        typer.Option(help="Unix socket the daemon listens on."),
+    ] = Path(settings.daemon_socket),
+    project: Annotated[
+        str,
+        typer.Option(help="Brightway project to serve."),
+    ] = settings.bw.project,
+    warm: Annotated[
+        list[str] | None,
+        typer.Option(
+            help="Brightway database to load and factorize at startup, instead of on the first request. You can specify multiple `--warm`."
+        ),
+    ] = None,
+):
+    """
+    Serve impacts and land occupation queries, keeping the Brightway project and
+    its factorized technospheres in memory. `lcia_info.py` uses it when it is running.
+    """
+    with BrightwayDaemon(socket_path, project) as daemon:
+        for database_name in warm or []:
+            activity = next(
+                a for a in bw2data.Database(database_name) if "process" in a.get("type")
+            )
+            logger.info(f"-> Warming up '{database_name}'")
+            process_impacts(activity)
+
+        logger.info(f"-> Listening on {socket_path} for project '{project}'")
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("-> Stopping")
+
+
+@app.command()
+def status(
+    socket_path: Annotated[
+        Path,
+        typer.Option(help="Unix socket the daemon listens on."),
+    ] = Path(settings.daemon_socket),
+):
+    """
+    Check whether a daemon is answering on the socket
+    """
+    bw2data.projects.set_current(settings.bw.project)
+    client = get_client(socket_path)
+    if client is None:
+        logger.info(f"No daemon listening on {socket_path}")
+        raise typer.Exit(1)
+
+    info = client.request("ping")
+    logger.info(
+        f"Daemon {info['pid']} listening on {socket_path} for project '{info['project']}'"
+    )
+
+
+if __name__ == "__main__":
+    app()
@@ -1,18 +1,20 @@
 #!/usr/bin/env python3
 
-import json
 import logging
-import multiprocessing
 from enum import Enum
 from pathlib import Path
 from typing import Annotated
 
 import typer
-from bw2data.project import projects
 
 from config import DATA_ROOT_DIR, settings
+from ecobalyse_data import tracing
+from ecobalyse_data.bw import lock as lci_lock
+from ecobalyse_data.bw.project import activate_project
+from ecobalyse_data.catalog import load_catalog
 from ecobalyse_data.export import export_generic
 from ecobalyse_data.export import food as export_food
+from ecobalyse_data.export import metadata as export_metadata
 from ecobalyse_data.export import process as export_process
 from ecobalyse_data.export import textile as export_textile
 from ecobalyse_data.logging import logger
@@ -21,6 +23,26 @@ from models.process import GENERIC_SCOPES, Scope
 app = typer.Typer(pretty_exceptions_show_locals=False)
 
 
+@app.callback()
+def init(
+    ctx: typer.Context,
+    trace: Annotated[
+        Path | None,
+        typer.Option(
+            help="Record the time, CPU and memory used by each stage of the export to this Chrome trace file (open it in https://ui.perfetto.dev)."
+        ),
+    ] = None,
+):
+    # Init BW project, only when a command is run
+    activate_project()
+
+    if trace is not None:
+        tracing.start_tracing()
+        # Closed in reverse order: the command span ends before the trace is written
+        ctx.call_on_close(lambda: tracing.write_trace(trace))
+        ctx.with_resource(tracing.span(ctx.invoked_subcommand))
+
+
 class MetadataScope(str, Enum):
     food = "food"
     textile = "textile"
@@ -37,10 +59,16 @@ def metadata(
     cpu_count: Annotated[
         int,
         typer.Option(
-            help="The number of CPUs/cores to use for computation. Default to MAX/2."
+            help="The number of processes computing the impacts (and writing the scopes with `--pipeline`). Each one loads and factorizes the technosphere again, with its own memory: opt-in, for the machines with the cores and memory for it."
         ),
-    ] = max(multiprocessing.cpu_count() // 2, 1),
+    ] = 1,
     root_dir: Path = DATA_ROOT_DIR,
+    pipeline: Annotated[
+        bool,
+        typer.Option(
+            help="Compute the land occupations and ecosystemic services shared by the scopes once, then write the scopes in parallel."
+        ),
+    ] = False,
 ):
     """
     Export metadata files (materials.json, ingredients.json, …)
@@ -53,88 +81,226 @@ def metadata(
     # Metadata (materials/ingredients) is written both to the published dir and the local data dir
 
     activities = _get_lcias(root_dir)
+    with tracing.span("load lock"):
+        lock = lci_lock.load_lock(root_dir / settings.lci_catalog_lock_file)
 
     processes_impacts_path = (
         root_dir / settings.export_dir / settings.processes_legacy_impacts_full_file
     )
+    # Computed along the processes impacts by `processes-legacy`
+    land_occupations_path = (
+        root_dir / settings.export_dir / settings.land_occupations_file
+    )
+
+    if pipeline:
+        _export_metadata_pipeline(
+            scopes,
+            activities,
+            lock,
+            processes_impacts_path,
+            land_occupations_path,
+            cpu_count,
+            root_dir,
+        )
+        return
 
     for s in scopes:
-        scope_dirname = settings.scopes.get(s.value).dirname
-        es_files_path = root_dir / scope_dirname
+        with tracing.span(f"metadata {s.value}"):
+            _export_metadata_scope(
+                s,
+                activities,
+                lock,
+                processes_impacts_path,
+                land_occupations_path,
+                cpu_count,
+                root_dir,
+            )
+
+
+def _textile_material_activities(activities: list[dict]) -> list[dict]:
+    scope_dirname = settings.scopes.textile.dirname
+    return [
+        a
+        for a in activities
+        if scope_dirname in a.get("scopes", [])
+        and "textile_material" in a.get("categories", [])
+    ]
+
+
+def _food_ingredient_activities(activities: list[dict]) -> list[dict]:
+    scope_dirname = settings.scopes.food.dirname
+    return [
+        a
+        for a in activities
+        if scope_dirname in a.get("scopes", [])
+        and "ingredient" in a.get("categories", [])
+    ]
+
+
+def _generic_activities(activities: list[dict]) -> list[dict]:
+    # All generic processes (object + veli + food2)
+    return [
+        activity for activity in activities if GENERIC_SCOPES & set(activity["scopes"])
+    ]
+
+
+def _export_metadata_scope(
+    s: MetadataScope,
+    activities: list[dict],
+    lock: dict,
+    processes_impacts_path: Path,
+    land_occupations_path: Path,
+    cpu_count: int,
+    root_dir: Path,
+):
+    scope_dirname = settings.scopes.get(s.value).dirname
+    es_files_path = root_dir / scope_dirname
 
-        feed_file_path = es_files_path / settings.scopes.food.feed_file
+    feed_file_path = es_files_path / settings.scopes.food.feed_file
 
-        ecosystemic_factors_path = (
-            es_files_path / settings.scopes.food.ecosystemic_factors_file
+    ecosystemic_factors_path = (
+        es_files_path / settings.scopes.food.ecosystemic_factors_file
+    )
+    raw_to_transformed_file_path = (
+        es_files_path / settings.scopes.food.raw_to_transformed_ratios_file
+    )
+    if s == MetadataScope.textile:
+        # Export textile materials
+        export_textile.activities_to_materials_json(
+            _textile_material_activities(activities),
+            materials_path=root_dir
+            / settings.frontend_data_dir
+            / scope_dirname
+            / settings.scopes.textile.materials_file,
         )
-        raw_to_transformed_file_path = (
-            es_files_path / settings.scopes.food.raw_to_transformed_ratios_file
+
+    elif s == MetadataScope.food:
+        # Export food ingredients
+        ingredients_path = (
+            root_dir
+            / settings.frontend_data_dir
+            / scope_dirname
+            / settings.scopes.food.ingredients_file
         )
-        if s == MetadataScope.textile:
-            # Export textile materials
-            activities_textile_materials = [
-                a
-                for a in activities
-                if scope_dirname in a.get("scopes", [])
-                and "textile_material" in a.get("categories", [])
-            ]
-
-            export_textile.activities_to_materials_json(
-                activities_textile_materials,
-                materials_path=root_dir
-                / settings.frontend_data_dir
-                / scope_dirname
-                / settings.scopes.textile.materials_file,
-            )
 
-        elif s == MetadataScope.food:
-            # Export food ingredients
-            activities_food_ingredients = [
-                a
-                for a in activities
-                if scope_dirname in a.get("scopes", [])
-                and "ingredient" in a.get("categories", [])
-            ]
-            ingredients_path = (
-                root_dir
-                / settings.frontend_data_dir
-                / scope_dirname
-                / settings.scopes.food.ingredients_file
-            )
+        export_food.activities_to_ingredients_json(
+            _food_ingredient_activities(activities),
+            processes_impacts_path=processes_impacts_path,
+            ingredients_path=ingredients_path,
+            ecosystemic_factors_path=ecosystemic_factors_path,
+            feed_file_path=feed_file_path,
+            raw_to_transformed_file_path=raw_to_transformed_file_path,
+            cpu_count=cpu_count,
+            land_occupations_path=land_occupations_path,
+            lock=lock,
+        )
+
+    elif s == MetadataScope.generic:
+        # Export all generic processes (object + veli + food2) to processes_generic.json
+        export_dir = root_dir / settings.export_dir
+
+        export_generic.activities_to_processes_generic_json(
+            _generic_activities(activities),
+            processes_impacts_path=processes_impacts_path,
+            ecs_output_paths=[export_dir / settings.processes_generic_ecs_file],
+            impacts_output_paths=[export_dir / settings.processes_generic_impacts_file],
+            cpu_count=cpu_count,
+            ecosystemic_factors_path=ecosystemic_factors_path,
+            feed_file_path=feed_file_path,
+            raw_to_transformed_file_path=raw_to_transformed_file_path,
+            land_occupations_path=land_occupations_path,
+            lock=lock,
+        )
 
-            export_food.activities_to_ingredients_json(
-                activities_food_ingredients,
-                processes_impacts_path=processes_impacts_path,
-                ingredients_path=ingredients_path,
-                ecosystemic_factors_path=ecosystemic_factors_path,
-                feed_file_path=feed_file_path,
-                raw_to_transformed_file_path=raw_to_transformed_file_path,
-                cpu_count=cpu_count,
-            )
 
-        elif s == MetadataScope.generic:
-            # Export all generic processes (object + veli + food2) to processes_generic.json
-            generic_activities = [
-                activity
-                for activity in activities
-                if GENERIC_SCOPES & set(activity["scopes"])
-            ]
+def _export_metadata_pipeline(
+    scopes: list[MetadataScope],
+    activities: list[dict],
+    lock: dict,
+    processes_impacts_path: Path,
+    land_occupations_path: Path,
+    cpu_count: int,
+    root_dir: Path,
+):
+    food_dirname = settings.scopes.food.dirname
+    # Read by both the food and the generic scopes
+    es_files_path = root_dir / food_dirname
+    export_dir = root_dir / settings.export_dir
 
-            export_dir = root_dir / settings.export_dir
+    food_activities = (
+        _food_ingredient_activities(activities) if MetadataScope.food in scopes else []
+    )
+    generic_activities = (
+        _generic_activities(activities) if MetadataScope.generic in scopes else []
+    )
 
-            export_generic.activities_to_processes_generic_json(
+    writers = []
+    if MetadataScope.textile in scopes:
+        writers.append(
+            (
+                export_metadata.write_materials,
+                {
+                    "activities": _textile_material_activities(activities),
+                    "materials_path": root_dir
+                    / settings.frontend_data_dir
+                    / settings.scopes.textile.dirname
+                    / settings.scopes.textile.materials_file,
+                },
+            )
+        )
+
+    if food_activities or generic_activities:
+        with tracing.span("metadata shared inputs"):
+            shared = export_metadata.compute_shared_inputs(
+                food_activities,
                 generic_activities,
-                processes_impacts_path=processes_impacts_path,
-                ecs_output_paths=[export_dir / settings.processes_generic_ecs_file],
-                impacts_output_paths=[
-                    export_dir / settings.processes_generic_impacts_file
-                ],
+                processes_impacts_path,
+                ecosystemic_factors_path=es_files_path
+                / settings.scopes.food.ecosystemic_factors_file,
+                feed_file_path=es_files_path / settings.scopes.food.feed_file,
+                raw_to_transformed_file_path=es_files_path
+                / settings.scopes.food.raw_to_transformed_ratios_file,
                 cpu_count=cpu_count,
-                ecosystemic_factors_path=ecosystemic_factors_path,
-                feed_file_path=feed_file_path,
-                raw_to_transformed_file_path=raw_to_transformed_file_path,
+                land_occupations_path=land_occupations_path,
+                lock=lock,
+            )
+
+        if MetadataScope.food in scopes:
+            writers.append(
+                (
+                    export_metadata.write_ingredients,
+                    {
+                        "activities": food_activities,
+                        "es_by_alias": shared["es_by_alias"],
+                        "locations": shared["locations"],
+                        "ingredients_path": root_dir
+                        / settings.frontend_data_dir
+                        / food_dirname
+                        / settings.scopes.food.ingredients_file,
+                    },
+                )
+            )
+        if MetadataScope.generic in scopes:
+            writers.append(
+                (
+                    export_metadata.write_processes_generic,
+                    {
+                        "activities": generic_activities,
+                        "processes_by_id": shared["processes_by_id"],
+                        "es_by_alias": shared["es_by_alias"],
+                        "ecs_output_paths": [
+                            export_dir / settings.processes_generic_ecs_file
+                        ],
+                        "impacts_output_paths": [
+                            export_dir / settings.processes_generic_impacts_file
+                        ],
+                    },
+                )
             )
 
+    with tracing.span("metadata writers"):
+        export_metadata.run_writers(writers, cpu_count=cpu_count)
+
 
 @app.command()
 def processes_legacy(
@@ -148,6 +314,22 @@ def processes_legacy(
     ] = True,
     merge: bool = typer.Option(False, "--merge", "-m"),
     verbose: bool = typer.Option(False, "--verbose", "-v"),
+    cache: Annotated[
+        bool,
+        typer.Option(
+            help="Reuse the brightway impacts computed by previous exports when the databases and methods didn't change."
+        ),
+    ] = True,
+    cache_dir: Annotated[
+        Path,
+        typer.Option(help="The directory where computed impacts are cached."),
+    ] = Path(settings.impacts_cache_dir),
+    cpu_count: Annotated[
+        int,
+        typer.Option(
+            help="The number of processes computing the impacts. Each one loads and factorizes the technosphere again, with its own memory: opt-in, for the machines with the cores and memory for it."
+        ),
+    ] = 1,
     root_dir: Path = DATA_ROOT_DIR,
 ):
     """
@@ -157,6 +339,8 @@ def processes_legacy(
         logger.setLevel(logging.DEBUG)
 
     activities = _get_lcias(root_dir)
+    with tracing.span("load lock"):
+        lock = lci_lock.load_lock(root_dir / settings.lci_catalog_lock_file)
 
     # Filter activities by scope if specified
     if scopes:
@@ -176,6 +360,9 @@ def processes_legacy(
         display_changes=display_changes,
         merge=merge,
         scopes=scopes,
+        cache_dir=cache_dir if cache else None,
+        cpu_count=cpu_count,
+        lock=lock,
     )
 
 
@@ -184,33 +371,63 @@ def merge_processes(
     root_dir: Path = DATA_ROOT_DIR,
 ):
     """take legacy and generic processes from export_dir and merge them, put the merged file in public_dir"""
-    from common import remove_detailed_impacts
-    from common.export import export_json, load_json
+    from common import without_detailed_impacts
+    from common.export import export_json_variants, load_json
 
     export_dir = root_dir / settings.export_dir
-    impacts = load_json(export_dir / settings.processes_legacy_impacts_file)
-    generic_impacts = load_json(export_dir / settings.processes_generic_impacts_file)
-    merged = impacts + generic_impacts
-    merged_ecs = remove_detailed_impacts(merged)
-
+    with tracing.span("load processes"):
+        impacts = load_json(export_dir / settings.processes_legacy_impacts_file)
+        generic_impacts = load_json(
+            export_dir / settings.processes_generic_impacts_file
+        )
     public_dir = root_dir / settings.frontend_data_dir
 
-    export_json(merged, public_dir / settings.processes_merged_impacts_file)
-    export_json(merged_ecs, public_dir / settings.processes_merged_ecs_file)
+    export_json_variants(
+        impacts + generic_impacts,
+        {
+            public_dir / settings.processes_merged_impacts_file: None,
+            public_dir / settings.processes_merged_ecs_file: without_detailed_impacts,
+        },
+    )
+
+
+@app.command("lock")
+def lock_catalog(
+    check: Annotated[
+        bool,
+        typer.Option(
+            help="Only check that the lock file is up to date, exit with an error if not."
+        ),
+    ] = False,
+    root_dir: Path = DATA_ROOT_DIR,
+):
+    """
+    Resolve the Brightway activity of every lci_catalog entry in the lock file.
+    Only new or stale entries are searched again.
+    """
+    lock_path = root_dir / settings.lci_catalog_lock_file
+    activities = _get_lcias(root_dir)
+
+    current_lock = lci_lock.load_lock(lock_path)
+    new_lock, stale, refreshed = lci_lock.update_lock(activities, current_lock)
+    removed = set(current_lock) - set(new_lock)
+
+    logger.info(
+        f"-> {len(new_lock)} locked activities, {len(stale)} resolved again, {len(refreshed)} refreshed, {len(removed)} removed"
+    )
 
+    if check:
+        if stale or refreshed or removed:
+            logger.error(f"{lock_path} is not up to date, run the `lock` command")
+            raise typer.Exit(code=1)
+        return
 
-def _get_lcias(root_dir):
-    lci_catalog = root_dir / "lci_catalog"
-    logger.debug(f"-> Loading lci_catalog {lci_catalog}")
+    lci_lock.write_lock(new_lock, lock_path)
 
-    activities = []
-    for lci_path in lci_catalog.glob("*/*.json"):
-        if lci_path.is_file():
-            with open(lci_path, "r") as file:
-                activities.append(json.load(file))
-    return activities
+
+def _get_lcias(root_dir):
+    return load_catalog(root_dir / "lci_catalog").activities
 
 
 if __name__ == "__main__":
-    projects.set_current(settings.bw.project)
     app()
@@ -1,27 +1,29 @@
 #!/usr/bin/env python3
 
-import json
 import os
 from pathlib import Path
 from typing import Annotated
 
 import bw2data
 import typer
-from bw2data.project import projects
 
-from config import DATA_ROOT_DIR, settings
+from config import DATA_ROOT_DIR
 from ecobalyse_data.bw import ecospold_export, simapro_export
+from ecobalyse_data.bw.project import activate_project
 from ecobalyse_data.bw.search import cached_search_one
+from ecobalyse_data.catalog import load_catalog
 from ecobalyse_data.logging import logger
 from ecobalyse_data.typer import bw_database_validation, bw_databases_validation
 
-# Init BW project
-projects.set_current(settings.bw.project)
-available_bw_databases = ", ".join(bw2data.databases)
-
 app = typer.Typer(no_args_is_help=True)
 
 
+@app.callback()
+def init():
+    # Init BW project, only when a command is run
+    activate_project()
+
+
 @app.command()
 def simapro(
     output_filename: Annotated[
@@ -32,7 +34,7 @@ def simapro(
         str | None,
         typer.Argument(
             callback=bw_database_validation,
-            help=f"Brightway databases you want to compute impacts for. Default to all. You can specify multiple `--db`.\n\nAvailable databases are: {available_bw_databases}.",
+            help="Brightway databases you want to compute impacts for. Default to all. You can specify multiple `--db`.",
         ),
     ] = "Ecobalyse_custom_lci",
 ):
@@ -95,10 +97,7 @@ def ecospold1(
     if whole_lci_catalog:
         lci_catalog = DATA_ROOT_DIR / "lci_catalog"
         logger.info(f"Loading activities from {lci_catalog}")
-        activities = []
-        for lci_path in sorted(lci_catalog.glob("*/*.json")):
-            with open(lci_path, "r") as f:
-                activities.append(json.load(f))
+        activities = load_catalog(lci_catalog).activities
 
         bw_activities = []
         for activity in activities:
@@ -1,33 +1,43 @@
 #!/usr/bin/env python3
 
+import contextlib
 import multiprocessing
-from multiprocessing import Pool
+from enum import Enum
+from pathlib import Path
 from typing import Annotated
 
 import bw2data
 import orjson
 import typer
-from bw2data.project import projects
 
 from common import (
     get_normalization_weighting_factors,
 )
-from common.export import IMPACTS_JSON
+from common.export import get_impacts_json
 from common.impacts import impacts as impacts_py
 from common.impacts import main_method
 from config import settings
-from ecobalyse_data.computation import compute_process_for_bw_activity
+from ecobalyse_data.bw.daemon import DaemonClient, get_client
+from ecobalyse_data.bw.project import activate_project
+from ecobalyse_data.computation import iter_processes_for_bw_activities
 from ecobalyse_data.logging import logger
+from models.process import Process, dump_all
 
-# Init BW project
-projects.set_current(settings.bw.project)
-available_bw_databases = ", ".join(bw2data.databases)
+# Not exported with the processes, see also `ecobalyse_data.bw.daemon.dump_process`
+EXCLUDED_FIELDS = {"bw_activity", "land_occupation"}
+# Activities sent to the Brightway daemon per request
+DAEMON_CHUNK_SIZE = 1000
+
+
+class OutputFormat(str, Enum):
+    json = "json"
+    ndjson = "ndjson"
 
 
 def main(
     output_file: Annotated[
-        typer.FileBinaryWrite,
-        typer.Argument(help="The output json file."),
+        Path,
+        typer.Argument(help="The output json (or ndjson) file."),
     ],
     # Use half the cores to avoid locking the system. Also look at the the .env.sample file
     # where environment variables are used to change the behaviour of some computing libs
@@ -71,6 +81,19 @@ def main(
         bool,
         typer.Option(help="Use multiprocessing for faster computation."),
     ] = True,
+    output_format: Annotated[
+        OutputFormat,
+        typer.Option(
+            "--format",
+            help="`json` writes everything at the end, `ndjson` writes one line per process as soon as it is computed.",
+        ),
+    ] = OutputFormat.json,
+    resume: Annotated[
+        bool,
+        typer.Option(
+            help="With `--format ndjson`, keep the processes already in the output file and only compute the missing ones."
+        ),
+    ] = False,
 ):
     """
     Compute the detailed impacts for all the databases in the default Brightway project.
@@ -78,10 +101,15 @@ def main(
     You can specify the number of CPUs to be used for computation by specifying CPU_COUNT argument.
     """
 
+    if resume and output_format != OutputFormat.ndjson:
+        raise typer.BadParameter(
+            "only the `--format ndjson` output can be resumed", param_hint="--resume"
+        )
+
     # Init BW project
     if db is None:
         db = []
-    projects.set_current(project)
+    activate_project(project)
 
     all_impacts = {}
 
@@ -90,65 +118,75 @@ def main(
 
     nb_processes = 0
 
-    factors = get_normalization_weighting_factors(IMPACTS_JSON)
+    impacts_json = get_impacts_json()
+    factors = get_normalization_weighting_factors(impacts_json)
 
-    for database_name in databases:
-        logger.info(f"-> Exploring DB '{database_name}'")
+    client = get_client()
+    if client is not None:
+        logger.info("-> Using the Brightway daemon (see `bin/bw_daemon.py`)")
 
-        db = bw2data.Database(database_name)
+    already_computed = set()
+    if resume:
+        already_computed = load_ndjson_keys(output_file)
+        logger.info(
+            f"-> Resuming, {len(already_computed)} processes already in {output_file}"
+        )
 
-        with Pool(cpu_count) as pool:
-            activities_parameters = []
-            nb_activity = 0
+    with (
+        open(output_file, "ab" if resume else "wb")
+        if output_format == OutputFormat.ndjson
+        else contextlib.nullcontext()
+    ) as ndjson_file:
+        for database_name in databases:
+            logger.info(f"-> Exploring DB '{database_name}'")
 
-            logger.info(
-                f"-> Computing impacts for {len(db)} activities, using {cpu_count} cores, hold on, it will take a while…"
-            )
+            db = bw2data.Database(database_name)
+
+            activities = []
             for activity in db:
                 if (
                     "process" in activity.get("type")
-                    and (max < 0 or nb_activity < max)
+                    and (max < 0 or len(activities) < max)
                     and activity_name is None
                     or (
                         activity_name is not None
                         and activity_name == activity.get("name")
                     )
                 ):
-                    activities_parameters.append(
-                        # Parameters of the `get_process_with_impacts` function
-                        (
-                            activity,
-                            main_method,
-                            impacts_py,
-                            IMPACTS_JSON,
-                            factors,
-                        )
-                    )
-                    nb_activity += 1
+                    activities.append(activity)
+
+            activities = [
+                a
+                for a in activities
+                if (a["database"], a["code"]) not in already_computed
+            ]
+
+            nb_cpus = cpu_count if multiprocessing else 1
+            logger.info(
+                f"-> Computing impacts for {len(activities)} activities, using {'the daemon' if client else f'{nb_cpus} cores'}, hold on, it will take a while…"
+            )
 
             processes_with_impacts = []
-            if multiprocessing:
-                processes_with_impacts = pool.starmap(
-                    compute_process_for_bw_activity, activities_parameters
-                )
-                processes_with_impacts = [
-                    p.model_dump(by_alias=True, exclude={"bw_activity"})
-                    for p in processes_with_impacts
-                ]
-            else:
-                for activity_parameters in activities_parameters:
-                    processes_with_impacts.append(
-                        compute_process_for_bw_activity(
-                            *activity_parameters
-                        ).model_dump(by_alias=True, exclude={"bw_activity"})
+            for chunk_activities, dumped in iter_dumped_processes(
+                client, activities, impacts_json, factors, cpu_count=nb_cpus
+            ):
+                if ndjson_file is not None:
+                    ndjson_file.writelines(
+                        ndjson_line(activity, process_dict)
+                        for activity, process_dict in zip(chunk_activities, dumped)
                     )
+                    # Everything written so far survives a crash and can be resumed
+                    ndjson_file.flush()
+                else:
+                    processes_with_impacts.extend(dumped)
+                nb_processes += len(dumped)
 
             logger.info(
-                f"-> Computed impacts for {len(processes_with_impacts)} processes in '{database_name}'"
+                f"-> Computed impacts for {len(activities)} processes in '{database_name}'"
             )
 
-            all_impacts[database_name] = processes_with_impacts
-            nb_processes += len(processes_with_impacts)
+            if ndjson_file is None:
+                all_impacts[database_name] = processes_with_impacts
 
     db_names = ", ".join([f"'{db}'" for db in databases])
 
@@ -156,10 +194,84 @@ def main(
         f"-> Finished computing impacts for {nb_processes} processes in {len(databases)} databases: {db_names}"
     )
 
-    output_file.write(
-        orjson.dumps(all_impacts, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+    if output_format == OutputFormat.ndjson:
+        return
+
+    with open(output_file, "wb") as f:
+        f.write(
+            orjson.dumps(all_impacts, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+        )
+
+
+def iter_dumped_processes(
+    client: DaemonClient | None,
+    activities: list,
+    impacts_json,
+    factors,
+    cpu_count: int = 1,
+):
+    """Yield the activities and their dumped processes chunk by chunk, computed by
+    the Brightway daemon `client` when it is running, in this process otherwise"""
+    if client is not None:
+        for start in range(0, len(activities), DAEMON_CHUNK_SIZE):
+            chunk = activities[start : start + DAEMON_CHUNK_SIZE]
+            yield (
+                chunk,
+                client.request(
+                    "processes", activities=[[a["database"], a["code"]] for a in chunk]
+                ),
+            )
+        return
+
+    for chunk_processes in iter_processes_for_bw_activities(
+        activities,
+        main_method,
+        impacts_py,
+        impacts_json,
+        factors,
+        cpu_count=cpu_count,
+    ):
+        yield (
+            [process.bw_activity for process in chunk_processes],
+            dump_all(Process, chunk_processes, exclude=EXCLUDED_FIELDS),
+        )
+
+
+def ndjson_line(bw_activity, process_dict: dict) -> bytes:
+    """One line of the ndjson output: the process, its database and its activity code"""
+    return orjson.dumps(
+        {
+            "database": bw_activity["database"],
+            "code": bw_activity["code"],
+            "process": process_dict,
+        },
+        option=orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE,
     )
 
 
+def load_ndjson_keys(path: Path) -> set[tuple[str, str]]:
+    """Return the (database, code) of the processes in an ndjson output.
+
+    A last line truncated by a crash is removed from the file, so that new
+    lines can be appended to it."""
+    if not path.exists():
+        return set()
+
+    with open(path, "rb") as f:
+        content = f.read()
+
+    complete = content[: content.rfind(b"\n") + 1]
+    if len(complete) != len(content):
+        logger.warning(f"-> Removing a truncated last line from {path}")
+        with open(path, "r+b") as f:
+            f.truncate(len(complete))
+
+    keys = set()
+    for line in complete.splitlines():
+        record = orjson.loads(line)
+        keys.add((record["database"], record["code"]))
+    return keys
+
+
 if __name__ == "__main__":
     typer.run(main)
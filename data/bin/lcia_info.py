@@ -1,24 +1,27 @@
 #!/usr/bin/env python3
 
 
-import json
+import sys
+from enum import Enum
+from pathlib import Path
 from typing import Annotated
 
-import bw2data
+import orjson
 import typer
-from bw2data.project import projects
 
 from common import get_normalization_weighting_factors
 from common.export import (
-    IMPACTS_JSON,
-    display_changes,
+    diff_processes,
     display_changes_table,
-    get_changes,
+    get_impacts_json,
+    write_changes_csv,
+    write_changes_json,
 )
 from common.impacts import impacts as impacts_py
 from common.impacts import main_method
-from config import settings
-from ecobalyse_data.bw.analyzer import print_recursive_calculation
+from ecobalyse_data.bw.analyzer import contribution_tree, print_contribution_tree
+from ecobalyse_data.bw.daemon import dump_process, get_client
+from ecobalyse_data.bw.project import activate_project
 from ecobalyse_data.bw.search import search_one
 from ecobalyse_data.computation import compute_impacts, compute_process_for_bw_activity
 from ecobalyse_data.logging import logger
@@ -27,13 +30,55 @@ from ecobalyse_data.typer import (
     ecobalyse_impact_validation,
     method_impact_validation,
 )
+from models.process import ComputedBy, Impacts
 
 app = typer.Typer()
 
 
-# Init BW project
-projects.set_current(settings.bw.project)
-available_bw_databases = ", ".join(bw2data.databases)
+class ChangesFormat(str, Enum):
+    table = "table"
+    csv = "csv"
+    json = "json"
+
+
+@app.callback()
+def init():
+    # Init BW project, only when a command is run
+    activate_project()
+
+
+def process_impacts(activity) -> dict:
+    """`dump_process(compute_process_for_bw_activity(activity))`, asked to the
+    Brightway daemon (see `bin/bw_daemon.py`) when it is running"""
+    client = get_client()
+    if client is not None:
+        logger.debug(f"-> Using the Brightway daemon for {activity}")
+        return client.request(
+            "impacts", database=activity["database"], code=activity["code"]
+        )
+
+    impacts_json = get_impacts_json()
+    factors = get_normalization_weighting_factors(impacts_json)
+    return dump_process(
+        compute_process_for_bw_activity(
+            activity, main_method, impacts_py, impacts_json, factors
+        )
+    )
+
+
+def contributions(activity, max_level: int) -> dict:
+    """`contribution_tree` of `activity` for all the impacts, asked to the Brightway
+    daemon when it is running"""
+    client = get_client()
+    if client is not None:
+        return client.request(
+            "contribution",
+            database=activity["database"],
+            code=activity["code"],
+            options={"max_level": max_level},
+        )
+
+    return contribution_tree(activity, impacts_py, max_level=max_level)
 
 
 @app.command()
@@ -46,7 +91,7 @@ def lcia_impacts(
         str,
         typer.Argument(
             callback=bw_database_validation,
-            help=f"Brightway database containing the activity.\n\nAvailable databases are: {available_bw_databases}.",
+            help="Brightway database containing the activity.",
         ),
     ],
 ):
@@ -56,14 +101,25 @@ def lcia_impacts(
 
     activity = search_one(database_name, activity_name)
 
-    factors = get_normalization_weighting_factors(IMPACTS_JSON)
-    (computed_by, impacts) = compute_impacts(
-        activity,
-        main_method,
-        impacts_py,
-        IMPACTS_JSON,
-        factors,
-    )
+    client = get_client()
+    if client is not None:
+        process = client.request(
+            "impacts", database=activity["database"], code=activity["code"]
+        )
+        (computed_by, impacts) = (
+            ComputedBy(process["computedBy"]),
+            Impacts(**process["impacts"]),
+        )
+    else:
+        impacts_json = get_impacts_json()
+        factors = get_normalization_weighting_factors(impacts_json)
+        (computed_by, impacts) = compute_impacts(
+            activity,
+            main_method,
+            impacts_py,
+            impacts_json,
+            factors,
+        )
 
     logger.info(impacts.model_dump(by_alias=True))
 
@@ -80,7 +136,7 @@ def lcia_details(
         str,
         typer.Argument(
             callback=bw_database_validation,
-            help=f"Brightway database containing the activity.\n\nAvailable databases are: {available_bw_databases}.",
+            help="Brightway database containing the activity.",
         ),
     ],
     impact: Annotated[
@@ -90,6 +146,17 @@ def lcia_details(
             help="The trigram name from the method ('acd', 'cch', …) of the impact you want to get information for.",
         ),
     ],
+    max_level: Annotated[
+        int,
+        typer.Option(help="Maximum depth of the supply chain to display."),
+    ] = 3,
+    json_output: Annotated[
+        Path | None,
+        typer.Option(
+            "--json",
+            help="Also write the contribution tree, for all the impacts, to this json file.",
+        ),
+    ] = None,
 ):
     """
     Get detailed information about an LCIA
@@ -100,12 +167,14 @@ def lcia_details(
     logger.info(activity)
     logger.info(method)
 
-    print_recursive_calculation(activity, method, max_level=3)
+    tree = contributions(activity, max_level=max_level)
+    print_contribution_tree(tree, [impact])
 
-    factors = get_normalization_weighting_factors(IMPACTS_JSON)
-    impacts = compute_process_for_bw_activity(
-        activity, main_method, impacts_py, IMPACTS_JSON, factors
-    ).model_dump(by_alias=True)
+    if json_output is not None:
+        with open(json_output, "wb") as f:
+            f.write(orjson.dumps(tree, option=orjson.OPT_INDENT_2))
+
+    impacts = process_impacts(activity)
 
     logger.info(impacts)
 
@@ -137,6 +206,19 @@ def compare_processes(
         bool,
         typer.Option(help="Also print the process names (before and after)."),
     ] = False,
+    output_format: Annotated[
+        ChangesFormat,
+        typer.Option(
+            "--format",
+            help="`table` displays the changes, `csv` and `json` write them for automated reviews.",
+        ),
+    ] = ChangesFormat.table,
+    output: Annotated[
+        Path | None,
+        typer.Option(
+            help="Write the `csv` or `json` changes to this file instead of the standard output."
+        ),
+    ] = None,
 ):
     """
     Compare two `processes_impacts.json` files
@@ -144,18 +226,33 @@ def compare_processes(
 
     if impact is None:
         impact = []
-    first_processes = json.load(first_file)
-    second_processes = json.load(second_file)
+    first_processes = orjson.loads(first_file.read())
+    second_processes = orjson.loads(second_file.read())
 
-    display_changes(
-        "displayName",
+    changes = diff_processes(
         first_processes,
         second_processes,
+        key="displayName",
         only_impacts=impact,
         min_change=min,
         with_names=with_names,
     )
 
+    if output_format == ChangesFormat.table:
+        if changes:
+            display_changes_table(changes, with_names=with_names)
+        return
+
+    write_changes = (
+        write_changes_csv if output_format == ChangesFormat.csv else write_changes_json
+    )
+    if output is None:
+        write_changes(changes, sys.stdout)
+    else:
+        with open(output, "w", newline="") as f:
+            write_changes(changes, f)
+        logger.info(f"-> Exported {len(changes)} changes to {output}")
+
 
 @app.command()
 def compare_activity(
@@ -167,14 +264,14 @@ def compare_activity(
         str,
         typer.Argument(
             callback=bw_database_validation,
-            help=f"First Brightway database name you want to search for the activity name.\n\nAvailable databases are: {available_bw_databases}.",
+            help="First Brightway database name you want to search for the activity name.",
         ),
     ],
     second_db: Annotated[
         str,
         typer.Argument(
             callback=bw_database_validation,
-            help=f"Second Brightway database name you want to search for the activity name.\n\nAvailable databases are: {available_bw_databases}.",
+            help="Second Brightway database name you want to search for the activity name.",
         ),
     ],
     impact: Annotated[
@@ -193,26 +290,16 @@ def compare_activity(
     Look for an activity in 2 different BW db and display the differences
     """
 
-    factors = get_normalization_weighting_factors(IMPACTS_JSON)
-
     first_activity = search_one(first_db, activity_name)
     second_activity = search_one(second_db, activity_name)
 
     logger.info("")
     logger.info(f"### '{first_db}'")
 
-    method = impacts_py[impact]
-
     if recursive_calculation:
-        print_recursive_calculation(first_activity, method, max_level=5)
+        print_contribution_tree(contributions(first_activity, max_level=5), [impact])
 
-    first_simapro_process = compute_process_for_bw_activity(
-        first_activity,
-        main_method,
-        impacts_py,
-        IMPACTS_JSON,
-        factors,
-    ).model_dump()
+    first_simapro_process = process_impacts(first_activity)
 
     logger.info(first_simapro_process)
 
@@ -222,22 +309,17 @@ def compare_activity(
     logger.info(second_activity)
 
     if recursive_calculation:
-        print_recursive_calculation(second_activity, method, max_level=5)
+        print_contribution_tree(contributions(second_activity, max_level=5), [impact])
 
-    second_simapro_process = compute_process_for_bw_activity(
-        second_activity,
-        main_method,
-        impacts_py,
-        IMPACTS_JSON,
-        factors,
-    ).model_dump()
+    second_simapro_process = process_impacts(second_activity)
 
     logger.info(second_simapro_process)
 
-    changes = get_changes(
-        first_simapro_process["impacts"],
-        second_simapro_process["impacts"],
-        first_activity["name"],
+    # Compared as processes of the same name
+    changes = diff_processes(
+        [{**first_simapro_process, "displayName": first_activity["name"]}],
+        [{**second_simapro_process, "displayName": first_activity["name"]}],
+        key="displayName",
     )
 
     if len(changes) > 0:
@@ -1,9 +1,10 @@
 # Please only pure functions here
 import functools
 import json
-from subprocess import call
 from uuid import UUID
 
+import numpy as np
+import orjson
 from frozendict import frozendict
 
 from config import settings
@@ -33,15 +34,6 @@ def get_normalization_weighting_factors(impact_defs):
     )
 
 
-def patch_agb3(path: str):
-    # `yield` is used as a variable in some Simapro parameters. bw2parameters cannot handle it:
-    # (sed is faster than Python)
-    call("sed -i 's/yield/Yield_/g' " + path, shell=True)
-    # Fix some errors in Agribalyse:
-    call("sed -i 's/01\\/03\\/2005/1\\/3\\/5/g' " + path, shell=True)
-    call("sed -i 's/\"0;001172\"/0,001172/' " + path, shell=True)
-
-
 class DatabaseException(Exception):
     pass
 
@@ -72,11 +64,8 @@ def spproject(activity):
             raise DatabaseException("Unknown database")
 
 
-def remove_detailed_impacts(processes):
-    return [
-        {**process, "impacts": {"ecs": process["impacts"]["ecs"]}}
-        for process in processes
-    ]
+def without_detailed_impacts(process):
+    return {**process, "impacts": {"ecs": process["impacts"]["ecs"]}}
 
 
 def correct_process_impacts(impacts, corrections):
@@ -144,27 +133,109 @@ def fix_unit(unit):
             return unit
 
 
+def _collect_numbers(obj, containers: list, keys: list, numbers: list):
+    """Copy `obj`, collecting the numbers of the copy along with where they are"""
+    if isinstance(obj, dict):
+        items = obj.items()
+        copy = {}
+    # it looks like we are using tuples as lists, so treat them the same way
+    elif isinstance(obj, (list, tuple)):
+        items = enumerate(obj)
+        copy = [None] * len(obj)
+    else:
+        return str(obj) if isinstance(obj, UUID) else obj
+
+    for key, value in items:
+        # in python, bools are a subclass of int, so we should check explicitly
+        # if value is not a bool, otherwise it will be converted to a float…
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            containers.append(copy)
+            keys.append(key)
+            numbers.append(value)
+        elif isinstance(value, (dict, list, tuple, UUID)):
+            copy[key] = _collect_numbers(value, containers, keys, numbers)
+        else:
+            copy[key] = value
+    return copy
+
+
+def _round_significant(numbers: list, precision: int) -> np.ndarray:
+    """`float(f"{n:.{precision}g}")` for all the numbers at once.
+
+    `m / 10**k` (or `m * 10**-k`) is the correctly rounded value of the decimal
+    `m × 10**-k` when the power of ten is exact, so the result is the same as
+    parsing the formatted number, provided that the significand `m` is right.
+    The few numbers for which that can't be guaranteed (rounding ties, extreme
+    exponents…) are formatted one by one."""
+    values = np.array(numbers, dtype=np.float64)
+    magnitudes = np.abs(values)
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        exponents = precision - 1 - np.floor(np.log10(magnitudes))
+        # Powers of ten are exact up to 10**22
+        vectorized = np.isfinite(exponents) & (np.abs(exponents) <= 22)
+        exponents = np.where(vectorized, exponents, 0)
+        powers = 10.0 ** np.abs(exponents)
+        positive = exponents >= 0
+        scaled = np.where(positive, magnitudes * powers, magnitudes / powers)
+        significands = np.rint(scaled)
+        rounded = np.where(
+            positive, significands / powers, significands * powers
+        ) * np.sign(values)
+        fractions = scaled - np.floor(scaled)
+
+    vectorized &= (
+        # The error of `scaled` is below 1e-12: far enough from a rounding tie
+        (np.abs(fractions - 0.5) > 1e-9)
+        # `log10` is off by one near powers of ten
+        & (significands >= 10 ** (precision - 1))
+        & (significands <= 10**precision)
+    )
+    for i in np.flatnonzero(~vectorized):
+        rounded[i] = float(f"{numbers[i]:.{precision}g}")
+
+    return rounded
+
+
+def round_numbers(obj, precision: int | None = None, json_fragments=False):
+    """Copy of `obj` with every number rounded to `precision` significant digits
+    (`settings.number_precision` by default), as floats, except zeros that are
+    kept as ints. UUIDs are converted to strings.
+
+    With `json_fragments`, the numbers that orjson would format differently from
+    the standard library (exponents, non finite numbers) are replaced by
+    `orjson.Fragment`s of their standard representation."""
+    if precision is None:
+        precision = settings.number_precision
+
+    containers, keys, numbers = [], [], []
+    holder = _collect_numbers([obj], containers, keys, numbers)
+    if not numbers:
+        return holder[0]
+
+    rounded = _round_significant(numbers, precision)
+    values = rounded.tolist()
+
+    if json_fragments:
+        magnitudes = np.abs(rounded)
+        # `repr` only uses exponents outside of [1e-4, 1e16)
+        with np.errstate(invalid="ignore"):
+            standard = (magnitudes >= 1e-4) & (magnitudes < 1e16)
+        for i in np.flatnonzero(~standard & (rounded != 0)):
+            values[i] = orjson.Fragment(json.dumps(values[i]))
+
+    for i in np.flatnonzero(rounded == 0):
+        values[i] = 0
+
+    for container, key, value in zip(containers, keys, values):
+        container[key] = value
+
+    return holder[0]
+
+
 class FormatNumberJsonEncoder(json.JSONEncoder):
     def encode(self, obj):
-        def recursive_format_number(obj):
-            # in python, bools are a subclass of int, so we should check explicitly
-            # if obj is not a bool, otherwise it will be converted to a float…
-            if isinstance(obj, (int, float)) and not isinstance(obj, bool):
-                if obj == 0:
-                    return 0
-                else:
-                    return float(f"{obj:.{settings.number_precision}g}")
-            elif isinstance(obj, dict):
-                return {k: recursive_format_number(v) for k, v in obj.items()}
-            # it looks like we are using tuples as lists, so treat them the same way
-            elif isinstance(obj, (list, tuple)):
-                return [recursive_format_number(v) for v in obj]
-            elif isinstance(obj, UUID):
-                return str(obj)
-            else:
-                return obj
-
-        return super().encode(recursive_format_number(obj))
+        return super().encode(round_numbers(obj))
 
 
 def activities_processes_sort_key(entry):
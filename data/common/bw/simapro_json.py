@@ -1,11 +1,19 @@
+import codecs
+import csv
 import functools
-import tempfile
+import io
 import zipfile
 from pathlib import Path
 
 import orjson
 from bw2data import Database, config
-from bw2io.extractors.simapro_csv import SimaProCSVExtractor
+from bw2data.logs import close_log, get_io_logger
+from bw2io.extractors.simapro_csv import (
+    INTRODUCTION,
+    EndOfDatasets,
+    SimaProCSVExtractor,
+    strip_whitespace_and_delete,
+)
 from bw2io.importers.base_lci import LCIImporter
 from bw2io.strategies import (
     assign_only_product_as_production,
@@ -31,24 +39,97 @@ from bw2io.strategies import (
 )
 from bw2io.strategies.simapro import set_lognormal_loc_value_uncertainty_safe
 
-from common import patch_agb3
+from ecobalyse_data import tracing
 from ecobalyse_data.logging import logger
 
-_CP1252_UNDEFINED = bytes([0x81, 0x8D, 0x8F, 0x90, 0x9D])
-_CP1252_SANITIZE = bytes.maketrans(_CP1252_UNDEFINED, b"?" * len(_CP1252_UNDEFINED))
-
 
-def _sanitize_undefined_cp1252_bytes(filepath):
+def _replace_undefined_cp1252(error: UnicodeDecodeError) -> tuple[str, int]:
     """Replace bytes undefined in CP1252 with '?'.
 
     SimaPro CSV files are CP1252 but may contain stray bytes (0x81, 0x8D,
     0x8F, 0x90, 0x9D) that are undefined in CP1252 and meaningless control
     characters in Latin-1.
     """
-    p = Path(filepath)
-    p.write_bytes(p.read_bytes().translate(_CP1252_SANITIZE))
+    return "?" * (error.end - error.start), error.end
+
+
+codecs.register_error("simapro_cp1252", _replace_undefined_cp1252)
+
+
+def patch_agb3(line: str) -> str:
+    """Patch a line of the official AGB3 release file"""
+    # `yield` is used as a variable in some Simapro parameters. bw2parameters cannot handle it:
+    line = line.replace("yield", "Yield_")
+    # Fix some errors in Agribalyse:
+    line = line.replace("01/03/2005", "1/3/5")
+    return line.replace('"0;001172"', "0,001172", 1)
 
 
+def read_zipped_csv_lines(input_path: Path, patch=None):
+    """Yield the lines of the CSV file of the `input_path` zip, decompressed and
+    decoded on the fly, patched by `patch(line)` if any"""
+    with zipfile.ZipFile(input_path) as zf:
+        member = zf.namelist()[0]
+        assert Path(member).name == input_path.stem
+        with (
+            zf.open(member) as raw,
+            io.TextIOWrapper(raw, encoding="cp1252", errors="simapro_cp1252") as f,
+        ):
+            for line in f:
+                yield patch(line) if patch else line
+
+
+class StreamingSimaProCSVExtractor(SimaProCSVExtractor):
+    """`SimaProCSVExtractor` reading the lines of the CSV from an iterable
+    instead of a file, so that they don't have to be written on disk first"""
+
+    @classmethod
+    def extract_lines(cls, lines, filepath: str, delimiter=";", name=None):
+        """Same as `SimaProCSVExtractor.extract`, from the `lines` of `filepath`"""
+        log, _ = get_io_logger("SimaPro-extractor")
+
+        log.info(INTRODUCTION % (filepath, repr(delimiter), name))
+        data = [
+            [strip_whitespace_and_delete(obj) for obj in line]
+            for line in csv.reader(lines, delimiter=delimiter)
+        ]
+
+        # Check if valid SimaPro file
+        assert "SimaPro" in data[0][0] or "CSV separator" in data[0][0], (
+            "File is not valid SimaPro export"
+        )
+
+        project_name = name or cls.get_project_name(data)
+        datasets = []
+
+        project_metadata = cls.get_project_metadata(data)
+        global_parameters, global_precompiled = cls.get_global_parameters(
+            data, project_metadata
+        )
+
+        index = cls.get_next_process_index(data, 0)
+
+        while True:
+            try:
+                ds, index = cls.read_data_set(
+                    data,
+                    index,
+                    project_name,
+                    filepath,
+                    global_parameters,
+                    project_metadata,
+                    global_precompiled,
+                )
+                datasets.append(ds)
+                index = cls.get_next_process_index(data, index)
+            except EndOfDatasets:
+                break
+
+        close_log(log)
+        return datasets, global_parameters, project_metadata
+
+
+@tracing.traced("export zipped csv to json")
 def export_zipped_csv_to_json(
     input_path: Path,
     output_path: Path,
@@ -57,44 +138,35 @@ def export_zipped_csv_to_json(
     logger.debug(f"Start json creation for input file '{input_path}'")
 
     logger.debug(f"-> JSON output to '{output_path}'")
-    with tempfile.TemporaryDirectory() as tempdir:
-        assert input_path.suffix.lower() == ".zip"
-        with zipfile.ZipFile(input_path) as zf:
-            logger.debug(f"-> Extracting the zip file in {tempdir}")
-            csv_file = zf.extract(zf.namelist()[0], tempdir)
-            assert Path(csv_file).name == input_path.stem
-
-            logger.debug(f"-> Reading from CSV file '{csv_file}'")
-            data = []
-            global_parameters = []
-            metadata = []
-
-            if "AGB3" in input_path.name:
-                # Path the official AGB3 release file
-                patch_agb3(csv_file)
-
-            _sanitize_undefined_cp1252_bytes(csv_file)
-
-            data, global_parameters, metadata = SimaProCSVExtractor.extract(
-                filepath=csv_file,
-                name=db_name,
-                delimiter=";",
-                encoding="cp1252",
-            )
+    assert input_path.suffix.lower() == ".zip"
+    # The CSV is read from the zip, and patched, line by line
+    lines = read_zipped_csv_lines(
+        input_path,
+        # Patch the official AGB3 release file
+        patch=patch_agb3 if "AGB3" in input_path.name else None,
+    )
+
+    logger.debug(f"-> Reading from CSV file '{input_path}'")
+    data, global_parameters, metadata = StreamingSimaProCSVExtractor.extract_lines(
+        lines,
+        filepath=str(input_path),
+        name=db_name,
+        delimiter=";",
+    )
 
-            logger.debug(f"-> Writing to json file '{output_path}'")
+    logger.debug(f"-> Writing to json file '{output_path}'")
 
-            with open(output_path, "wb") as fp:
-                if db_name:
-                    for ds in data:
-                        ds["database"] = db_name
+    with open(output_path, "wb") as fp:
+        if db_name:
+            for ds in data:
+                ds["database"] = db_name
 
-                extracted_data = {
-                    "data": data,
-                    "global_parameters": global_parameters,
-                    "metadata": metadata,
-                }
-                fp.write(orjson.dumps(extracted_data))
+        extracted_data = {
+            "data": data,
+            "global_parameters": global_parameters,
+            "metadata": metadata,
+        }
+        fp.write(orjson.dumps(extracted_data))
 
 
 class SimaProJsonImporter(LCIImporter):
@@ -109,18 +181,21 @@ class SimaProJsonImporter(LCIImporter):
         normalize_biosphere=True,
         biosphere_db=None,
         extractor=SimaProCSVExtractor,
+        json_data=None,
     ):
-        logger.debug(f"Importing JSON from {filepath}")
-        with open(filepath, "rb") as f:
-            json_data = orjson.loads(f.read())
-            self.data = json_data["data"]
-
-            if name is not None:
-                for ds in self.data:
-                    ds["database"] = name
-
-            self.global_parameters = json_data["global_parameters"]
-            self.metadata = json_data["metadata"]
+        # `json_data` is the already loaded content of a JSON export
+        if json_data is None:
+            logger.debug(f"Importing JSON from {filepath}")
+            with open(filepath, "rb") as f:
+                json_data = orjson.loads(f.read())
+        self.data = json_data["data"]
+
+        if name is not None:
+            for ds in self.data:
+                ds["database"] = name
+
+        self.global_parameters = json_data["global_parameters"]
+        self.metadata = json_data["metadata"]
 
         self.db_name = name
 
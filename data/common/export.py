@@ -1,23 +1,40 @@
+import contextlib
+import csv
+import functools
 import json
-import math
 import os
+from collections.abc import Callable
 from pathlib import Path
 
+import numpy as np
+import orjson
 from frozendict import deepfreeze
 from rich.console import Console
 from rich.table import Table
 
 from config import DATA_ROOT_DIR, settings
+from ecobalyse_data import tracing
 from ecobalyse_data.logging import logger
 
 from . import (
-    FormatNumberJsonEncoder,
     activities_processes_sort_key,
-    remove_detailed_impacts,
+    round_numbers,
+    without_detailed_impacts,
 )
 
-with open(DATA_ROOT_DIR / settings.impacts_file) as f:
-    IMPACTS_JSON = deepfreeze(json.load(f))
+
+@functools.cache
+def get_impacts_json():
+    """The impacts definitions of `impacts.json`, parsed and frozen on first use"""
+    with open(DATA_ROOT_DIR / settings.impacts_file) as f:
+        return deepfreeze(json.load(f))
+
+
+def __getattr__(name):
+    # `IMPACTS_JSON` is kept as a (lazy) module attribute for backward compatibility
+    if name == "IMPACTS_JSON":
+        return get_impacts_json()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def validate_id(id: str) -> str:
@@ -31,52 +48,92 @@ def show_change(old: str, new: str) -> str:
     return (old + "\n-> " + new) if old != new else "(unchanged) " + old
 
 
-def get_changes(old, new, name, only_impacts=None, min_change=0.1, with_names=False):
-    if only_impacts is None:
-        only_impacts = []
+def _impacts_matrix(processes: list[dict], trigrams: list[str]) -> np.ndarray:
+    """processes × trigrams impacts, NaN where an impact is missing"""
+    return np.array(
+        [[p["impacts"].get(t, np.nan) for t in trigrams] for p in processes],
+        dtype=np.float64,
+    ).reshape(len(processes), len(trigrams))
+
+
+def diff_processes(
+    old_processes,
+    new_processes,
+    key="id",
+    only_impacts=None,
+    min_change=0.1,
+    with_names=False,
+) -> list[dict]:
+    """Changes of the impacts of the processes found in both lists (by `key`), more
+    than `min_change` percent, sorted by percent change.
+
+    Processes are aligned as processes × impacts arrays, so that the percent
+    changes and the threshold are computed for all the impacts at once. Impacts
+    that are missing or zero in the old processes are not compared."""
+    old_by_key = {str(p[key]): p for p in old_processes if key in p}
+    if type(new_processes) is list:
+        # Be sure to convert to str if we have an UUID for the key
+        new_processes = {str(p[key]): p for p in new_processes if key in p}
+
+    keys = [k for k in new_processes if k in old_by_key]
+    old = [old_by_key[k] for k in keys]
+    new = [new_processes[k] for k in keys]
+
+    trigrams = list(dict.fromkeys(t for p in new for t in p["impacts"]))
+    if only_impacts:
+        trigrams = [t for t in trigrams if t in only_impacts]
+
+    old_values = _impacts_matrix(old, trigrams)
+    new_values = _impacts_matrix(new, trigrams)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percent_changes = 100 * (new_values - old_values) / old_values
+
+    # Percent changes are rounded to one decimal before being compared to
+    # `min_change`: keep a margin here, the exact check is done on the candidates
+    compared = (old_values != 0) & ~np.isnan(old_values) & ~np.isnan(new_values)
+    rows, columns = np.nonzero(compared & (np.abs(percent_changes) > min_change - 0.06))
+    rounded = [round(c, 1) for c in percent_changes[rows, columns].tolist()]
+    selected = [i for i, c in enumerate(rounded) if abs(c) > min_change]
+    selected.sort(key=lambda i: rounded[i])
+
     changes = []
-    for trigram in new["impacts"]:
-        if only_impacts and trigram not in only_impacts:
-            continue
-
-        if old["impacts"].get(trigram, {}):
-            # Convert values to float before calculation
-            old_value = float(old["impacts"][trigram])
-            new_value = float(new["impacts"][trigram])
-
-            if old_value == 0 and new_value == 0:
-                percent_change = 0
-            elif old_value == 0:
-                percent_change = math.inf
-            else:
-                percent_change = 100 * (new_value - old_value) / old_value
-
-            percent_change = round(percent_change, 1)
-
-            if abs(percent_change) > min_change:
-                changes.append(
+    for i in selected:
+        old_process, new_process = old[rows[i]], new[rows[i]]
+        changes.append(
+            {
+                "trg": trigrams[columns[i]],
+                "name": new_process["displayName"],
+                "%diff": rounded[i],
+                "from": float(old_values[rows[i], columns[i]]),
+                "to": float(new_values[rows[i], columns[i]]),
+                "DB change": show_change(old_process["source"], new_process["source"]),
+                **(
                     {
-                        "trg": trigram,
-                        "name": name,
-                        "%diff": percent_change,
-                        "from": old_value,
-                        "to": new_value,
-                        "DB change": show_change(old["source"], new["source"]),
-                        **(
-                            {
-                                "Process change": show_change(
-                                    old["sourceId"], new["sourceId"]
-                                )
-                            }
-                            if with_names
-                            else {}
-                        ),
+                        "Process change": show_change(
+                            old_process["sourceId"], new_process["sourceId"]
+                        )
                     }
-                )
+                    if with_names
+                    else {}
+                ),
+            }
+        )
 
     return changes
 
 
+def write_changes_csv(changes: list[dict], file) -> None:
+    writer = csv.writer(file)
+    if changes:
+        writer.writerow(changes[0])
+    writer.writerows(change.values() for change in changes)
+
+
+def write_changes_json(changes: list[dict], file) -> None:
+    file.write(orjson.dumps(changes, option=orjson.OPT_INDENT_2).decode())
+    file.write("\n")
+
+
 def display_changes_table(changes, sort_by_key="%diff", with_names=False):
     changes.sort(key=lambda c: c[sort_by_key])
     table = Table(title="Review changes", show_header=True, show_footer=True)
@@ -107,55 +164,121 @@ def display_changes(
 ):
     """Display a nice sorted table of impact changes to review
     key is the field to display (id for food, uuid for textile)"""
-    if only_impacts is None:
-        only_impacts = []
-    old = {str(p[key]): p for p in oldprocesses if key in p}
+    changes = diff_processes(
+        oldprocesses,
+        processes,
+        key=key,
+        only_impacts=only_impacts,
+        min_change=min_change,
+        with_names=with_names,
+    )
 
-    if type(processes) is list:
-        # Be sure to convert to str if we have an UUID for the key
-        processes = {str(p[key]): p for p in processes if key in p}
+    if changes:
+        display_changes_table(changes, with_names=with_names)
 
-    review = False
-    changes = []
-    for id_, p in processes.items():
-        # Skip if the id doesn't exist in old processes
-        if id_ not in old:
-            continue
-        impact_changes = get_changes(
-            old=old[id_],
-            new=p,
-            name=p["displayName"],
-            only_impacts=only_impacts,
-            min_change=min_change,
-            with_names=with_names,
+
+# Same output as `json.dumps(…, indent=2, ensure_ascii=False, sort_keys=True)`
+JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+# Elements of the top-level lists rounded and written at a time
+EXPORT_CHUNK_SIZE = 1000
+
+
+def write_json(json_data, file, dump: Callable | None = None) -> None:
+    """Write `json_data` to the binary `file`, with rounded numbers (see
+    `round_numbers`): the same bytes as with `FormatNumberJsonEncoder`.
+
+    Top-level lists are written by chunks, so that only a chunk of rounded
+    elements is in memory at a time. `dump`, see `write_json_variants`."""
+    if isinstance(json_data, (list, tuple)):
+        write_json_variants(json_data, [(file, None)], dump=dump)
+        return
+
+    file.write(
+        orjson.dumps(
+            round_numbers(json_data, json_fragments=True),
+            option=JSON_OPTIONS | orjson.OPT_APPEND_NEWLINE,
         )
+    )
 
-        if len(impact_changes) > 0:
-            changes = changes + impact_changes
-            review = True
 
-    changes.sort(key=lambda c: abs(c["%diff"]))
+def write_json_variants(
+    json_data: list, variants: list[tuple], dump: Callable | None = None
+) -> list[int]:
+    """Write variants of the list `json_data` in a single pass, like `write_json`.
 
-    if review:
-        display_changes_table(changes, with_names=with_names)
+    `variants` are `(binary file, variant)` pairs, `variant(element)` returning
+    what to write for an element (None to skip it), or None to write the
+    elements as is. Each element is rounded once, and encoded once for all the
+    variants returning it unchanged.
 
+    With `dump`, `json_data` holds objects (e.g. pydantic models) that
+    `dump(chunk)` converts to JSON data a chunk at a time, see
+    `models.process.dump_all`: their dicts are never all in memory.
 
-def export_json(json_data, filename):
+    Returns the number of elements written to each file."""
+    counts = [0] * len(variants)
+    for start in range(0, len(json_data), EXPORT_CHUNK_SIZE):
+        chunk = json_data[start : start + EXPORT_CHUNK_SIZE]
+        chunk = round_numbers(
+            dump(chunk) if dump is not None else chunk, json_fragments=True
+        )
+        for element in chunk:
+            # {id: (output, encoded output)}, outputs are kept alive so that
+            # their ids aren't reused
+            encoded = {}
+            for i, (file, variant) in enumerate(variants):
+                output = element if variant is None else variant(element)
+                if output is None:
+                    continue
+                if id(output) not in encoded:
+                    # Elements are indented one level deeper than on their
+                    # own. Strings can't contain line breaks (they are escaped)
+                    encoded[id(output)] = (
+                        output,
+                        orjson.dumps(output, option=JSON_OPTIONS).replace(
+                            b"\n", b"\n  "
+                        ),
+                    )
+                file.write(b",\n  " if counts[i] else b"[\n  ")
+                file.write(encoded[id(output)][1])
+                counts[i] += 1
+
+    for (file, _), count in zip(variants, counts):
+        file.write(b"\n]\n" if count else b"[]\n")
+    return counts
+
+
+def export_json(json_data, filename, dump: Callable | None = None):
     logger.info(f"Exporting {filename}")
-    json_string = json.dumps(
-        json_data,
-        indent=2,
-        ensure_ascii=False,
-        cls=FormatNumberJsonEncoder,
-        sort_keys=True,
-    )
-    with open(filename, "w", encoding="utf-8") as file:
-        file.write(json_string)
-        file.write("\n")  # Add a newline at the end of the file
+    with (
+        tracing.span("serialize json", file=str(filename)),
+        open(filename, "wb") as file,
+    ):
+        write_json(json_data, file, dump=dump)
 
     logger.info(f"Exported {len(json_data)} elements to {filename}")
 
 
+def export_json_variants(json_data: list, variants: dict[Path, Callable | None]):
+    """Export variants of `json_data` ({filename: variant}, see
+    `write_json_variants`) while walking it once"""
+    logger.info(f"Exporting {', '.join(str(f) for f in variants)}")
+    with (
+        tracing.span("serialize json", files=[str(f) for f in variants]),
+        contextlib.ExitStack() as stack,
+    ):
+        counts = write_json_variants(
+            json_data,
+            [
+                (stack.enter_context(open(filename, "wb")), variant)
+                for filename, variant in variants.items()
+            ],
+        )
+
+    for filename, count in zip(variants, counts):
+        logger.info(f"Exported {count} elements to {filename}")
+
+
 def display_changes_from_json(
     processes_impacts_path,
     processes_corrected_impacts,
@@ -226,31 +349,38 @@ def export_processes_to_dir(
         GENERIC_SCOPES,  # local import to avoid circular dependency
     )
 
-    filtered = []
-    for p in to_export:
+    def filtered(p):
         proc_scopes = set(p.get("scopes", []))
         if proc_scopes <= GENERIC_SCOPES:
-            continue
+            return None
         if proc_scopes & GENERIC_SCOPES:
-            p = {
+            return {
                 **p,
                 "scopes": [s for s in p["scopes"] if s not in GENERIC_SCOPES],
             }
-        filtered.append(p)
-
-    export_json(filtered, processes_impacts_absolute_path)
-    exported_files.append(processes_impacts_absolute_path)
+        return p
 
-    # Also update the aggregated file
-    export_json(remove_detailed_impacts(filtered), processes_ecs_absolute_path)
-    exported_files.append(processes_ecs_absolute_path)
+    def filtered_ecs(p):
+        p = filtered(p)
+        # Also update the aggregated file
+        return without_detailed_impacts(p) if p is not None else None
 
     # Write unfiltered data to last dir (local) for generic export to read later
-
     full_impacts_path = (
         DATA_ROOT_DIR / settings.export_dir / full_impacts_relative_file_path
     )
-    export_json(to_export, full_impacts_path)
+
+    # The three files are written in a single pass over the processes
+    export_json_variants(
+        to_export,
+        {
+            processes_impacts_absolute_path: filtered,
+            processes_ecs_absolute_path: filtered_ecs,
+            full_impacts_path: None,
+        },
+    )
+    exported_files.append(processes_impacts_absolute_path)
+    exported_files.append(processes_ecs_absolute_path)
 
     return exported_files
 
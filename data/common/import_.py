@@ -1,19 +1,31 @@
 import functools
+import hashlib
+import importlib.metadata
+import inspect
 import json
+import os
+import pickle
 import sys
 from enum import StrEnum
 from pathlib import Path, PurePosixPath
 
 import bw2data
 import bw2io
-from bw2io.strategies.generic import link_iterable_by_fields
+import orjson
+from bw2io.errors import StrategyError
+from bw2io.strategies.generic import (
+    format_nonunique_key_error,
+    link_iterable_by_fields,
+)
 from bw2io.utils import activity_hash
 
 from common import biosphere
 from common.bw.simapro_json import SimaProJsonImporter, export_zipped_csv_to_json
 from config import settings
 from ecobalyse_data import s3
+from ecobalyse_data.bw.fingerprint import database_fingerprint
 from ecobalyse_data.bw.search import cached_search_one
+from ecobalyse_data.bw.strategy import apply_strategies
 from ecobalyse_data.logging import logger
 
 
@@ -59,31 +71,95 @@ def setup_project(
     bw2io.create_core_migrations()
 
 
-def link_technosphere_by_activity_hash_ref_product(
-    db, external_db_name: str | None = None, fields: list[str] | None = None
+TECHNOSPHERE_TYPES = {"technosphere", "substitution", "production"}
+# The fields used to link the technosphere exchanges, by order of preference
+TECHNOSPHERE_LINK_FIELDS = (("name", "unit", "location"), ("name", "unit"))
+
+# Link indexes of the external databases, by (name, last write, fields)
+_external_link_indexes = {}
+
+
+def build_link_indexes(activities, fields_list) -> list[tuple[dict, dict]]:
+    """For each `fields` of `fields_list`, the `(database, code)` of the
+    `activities` by `activity_hash` of these fields, and the activities sharing
+    the same hash, in a single iteration of `activities`.
+
+    Same indexes as `bw2io.strategies.generic.link_iterable_by_fields`."""
+    indexes = [({}, {}) for _ in fields_list]
+    try:
+        for ds in activities:
+            for fields, (candidates, duplicates) in zip(fields_list, indexes):
+                key = activity_hash(ds, fields)
+                if key in candidates:
+                    duplicates.setdefault(key, []).append(ds)
+                else:
+                    candidates[key] = (ds["database"], ds["code"])
+    except KeyError:
+        raise StrategyError(
+            "Not all datasets in database to be linked have "
+            "``database`` or ``code`` attributes"
+        )
+    return indexes
+
+
+def _external_indexes(external_db_name: str, fields_list) -> list[tuple[dict, dict]]:
+    key = (
+        external_db_name,
+        database_fingerprint(external_db_name),
+        tuple(fields_list),
+    )
+    if key not in _external_link_indexes:
+        logger.debug(f"-> Indexing {external_db_name} for the technosphere linking")
+        _external_link_indexes[key] = build_link_indexes(
+            (
+                obj
+                for obj in bw2data.Database(external_db_name)
+                if obj.get("type", "process") == "process"
+                or obj.get("type") == "processwithreferenceproduct"
+            ),
+            fields_list,
+        )
+    return _external_link_indexes[key]
+
+
+def link_technosphere_cascade(
+    db,
+    external_db_name: str | None = None,
+    fields_list=TECHNOSPHERE_LINK_FIELDS,
 ):
     """
-    This is a custom version of `bw2io.strategies.generic.link_technosphere_by_activity_hash`
+    Link the unlinked technosphere exchanges of `db` to the activities of `db`,
+    then to the ones of `external_db_name`, by each of the `fields_list` in turn.
 
-    It adds the check for "processwithreferenceproduct" that was added in https://github.com/brightway-lca/brightway2-data/blob/main/CHANGES.md#40dev57-2024-10-03
-    and avoid breaking the linking as processes are now imported with the default type "processwithreferenceproduct"
-    """
+    The result is the same as a `link_iterable_by_fields` pass for each
+    (database, fields), but the databases are indexed once (the external ones
+    are kept for the following imports) and the exchanges are iterated once.
 
-    TECHNOSPHERE_TYPES = {"technosphere", "substitution", "production"}
+    The activities of the external database can also be of the
+    "processwithreferenceproduct" type added in https://github.com/brightway-lca/brightway2-data/blob/main/CHANGES.md#40dev57-2024-10-03
+    as processes are now imported with this default type
+    """
+    levels = list(zip(fields_list, build_link_indexes(db, fields_list)))
     if external_db_name is not None:
-        other = (
-            obj
-            for obj in bw2data.Database(external_db_name)
-            if obj.get("type", "process") == "process"
-            or obj.get("type") == "processwithreferenceproduct"
-        )
-        internal = False
-    else:
-        other = None
-        internal = True
-    return link_iterable_by_fields(
-        db, other, internal=internal, kind=TECHNOSPHERE_TYPES, fields=fields
-    )
+        levels += zip(fields_list, _external_indexes(external_db_name, fields_list))
+
+    for ds in db:
+        for exc in ds.get("exchanges", []):
+            if exc.get("type") not in TECHNOSPHERE_TYPES or exc.get("input"):
+                continue
+            keys = {}
+            for fields, (candidates, duplicates) in levels:
+                if fields not in keys:
+                    keys[fields] = activity_hash(exc, fields)
+                key = keys[fields]
+                if key in duplicates:
+                    raise StrategyError(
+                        format_nonunique_key_error(exc, fields, duplicates[key])
+                    )
+                elif key in candidates:
+                    exc["input"] = candidates[key]
+                    break
+    return db
 
 
 def search_activity(activity_dict: dict, default_db: str | None = None):
@@ -446,31 +522,131 @@ def add_unlinked_flows_to_biosphere_database(
     )
 
 
-def import_simapro_csv(
-    database_s3_key: str,
-    database_md5: str,
-    dbname,
-    external_db=None,
-    biosphere="biosphere3",
-    migrations=None,
-    strategies=None,
-):
-    """
-    Import the s3 file `database_s3_key` into a database named `dbname` and apply the provided brightway `migrations`.
-    """
-    if strategies is None:
-        strategies = []
-    if migrations is None:
-        migrations = []
-    logger.info(f"🟢 Importing {database_s3_key} into {dbname}")
-    assert PurePosixPath(database_s3_key).suffixes[-2:] in [
-        [".CSV", ".zip"],
-        [".csv", ".zip"],
-    ], (
-        "⛔ the LCA databases should be zipped CSV files, and have a `.csv.zip` extension"
+# Bump when the linked snapshots of the previous versions must not be reused
+LINKED_SNAPSHOT_VERSION = 2
+
+# Modules under this directory are hashed, the others are identified by the
+# version of their distribution
+_LOCAL_SOURCES = Path(__file__).resolve().parents[1]
+
+
+@functools.cache
+def _module_key(module_name: str) -> str | None:
+    """Source hash of a module of the repository, version of the distribution of
+    an installed module, None for the standard library"""
+    module = sys.modules[module_name]
+    if getattr(module, "__file__", None) is None:
+        return None
+
+    path = Path(module.__file__).resolve()
+    if path.is_relative_to(_LOCAL_SOURCES) and "site-packages" not in path.parts:
+        return f"{module_name}:{hashlib.sha256(path.read_bytes()).hexdigest()}"
+
+    top_level = module_name.partition(".")[0]
+    distributions = importlib.metadata.packages_distributions().get(top_level)
+    if not distributions:
+        return None
+    return f"{module_name}:" + ",".join(
+        f"{d}=={importlib.metadata.version(d)}" for d in sorted(distributions)
     )
 
-    local_path = s3.get_file(database_s3_key, database_md5)
+
+def _callable_key(func) -> list:
+    """Name and arguments of a strategy (or of a partial of it), and the keys of
+    its module and of the modules this module imports: the strategies depend on
+    the helpers, constants and imported lists of their module"""
+    args, keywords = [], {}
+    while isinstance(func, functools.partial):
+        args, keywords = [*func.args, *args], {**func.keywords, **keywords}
+        func = func.func
+    module = sys.modules[func.__module__]
+    modules = [module] + [m for m in vars(module).values() if inspect.ismodule(m)]
+    return [
+        f"{func.__module__}.{func.__qualname__}",
+        repr(args),
+        repr(sorted(keywords.items())),
+        sorted({_module_key(m.__name__) for m in modules} - {None}),
+    ]
+
+
+def linked_snapshot_key(
+    database_md5: str,
+    dbname: str,
+    migrations: list[dict],
+    strategies: list,
+    external_db: str | None,
+) -> str:
+    """Hash of everything the migrated and linked datasets of an import depend
+    on: the source file, the migrations, the strategies (and their code), the
+    importer code and the last write of the external database"""
+    return hashlib.sha256(
+        orjson.dumps(
+            [
+                LINKED_SNAPSHOT_VERSION,
+                database_md5,
+                dbname,
+                migrations,
+                [
+                    _callable_key(strategy)
+                    for strategy in [
+                        *strategies,
+                        link_technosphere_cascade,
+                    ]
+                ],
+                [
+                    _module_key(module_name)
+                    for module_name in (
+                        "bw2data",
+                        "bw2io",
+                        SimaProJsonImporter.__module__,
+                    )
+                ],
+                [external_db, database_fingerprint(external_db)]
+                if external_db
+                else None,
+            ]
+        )
+    ).hexdigest()
+
+
+def _write_linked_snapshot(database, snapshot_path: Path) -> None:
+    logger.debug(f"-> Writing the migrated and linked datasets to {snapshot_path}")
+    # Pickled, the exchanges keep their tuples (`input`, `categories`…)
+    tmp_path = snapshot_path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump(
+            {
+                "data": database.data,
+                "global_parameters": database.global_parameters,
+                "metadata": database.metadata,
+            },
+            f,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(tmp_path, snapshot_path)
+
+
+def register_migrations(migrations: list[dict]) -> None:
+    """Write the `migrations` to the project, whether the import applies them or
+    reuses a linked snapshot: later imports and scripts may look them up"""
+    for migration in migrations:
+        bw2io.Migration(migration["name"]).write(
+            migration["data"],
+            description=migration["description"],
+        )
+
+
+def _migrate_and_link_technosphere(
+    local_path: Path,
+    database_md5: str,
+    dbname: str,
+    external_db: str | None,
+    migrations: list[dict],
+    strategies: list,
+):
+    """Read the `local_path` zipped CSV, apply the `migrations` and
+    `strategies`, then link its technosphere exchanges, internally and to
+    `external_db`"""
     json_datapath = local_path.parent / Path(local_path.stem).with_suffix(
         f".{database_md5}.json"
     )
@@ -485,48 +661,74 @@ def import_simapro_csv(
     database = SimaProJsonImporter(str(json_datapath), dbname, normalize_biosphere=True)
 
     logger.debug("Applying migrations")
-    # Apply provided migrations
+    # Apply provided migrations, registered by `register_migrations`
     for migration in migrations:
         logger.debug(f"-> Applying custom migration: {migration['description']}")
-        bw2io.Migration(migration["name"]).write(
-            migration["data"],
-            description=migration["description"],
-        )
         database.migrate(migration["name"])
     database.statistics()
 
     logger.debug("Applying strategies")
-    database.strategies = strategies
-
-    database.apply_strategies()
+    apply_strategies(database, strategies)
     database.statistics()
 
-    # try to link remaining unlinked technosphere activities
+    # try to link remaining unlinked technosphere activities, internally then to
+    # the external database
     database.apply_strategy(
-        functools.partial(
-            link_technosphere_by_activity_hash_ref_product,
-            fields=("name", "unit", "location"),
-        )
+        functools.partial(link_technosphere_cascade, external_db_name=external_db)
     )
-    database.apply_strategy(
-        functools.partial(
-            link_technosphere_by_activity_hash_ref_product, fields=("name", "unit")
-        )
+
+    return database
+
+
+def import_simapro_csv(
+    database_s3_key: str,
+    database_md5: str,
+    dbname,
+    external_db=None,
+    biosphere="biosphere3",
+    migrations=None,
+    strategies=None,
+    cache=True,
+):
+    """
+    Import the s3 file `database_s3_key` into a database named `dbname` and apply the provided brightway `migrations`.
+
+    The datasets obtained after the migrations, the strategies and the linking
+    of the technosphere are cached next to the file (see `linked_snapshot_key`),
+    unless `cache` is False.
+    """
+    if strategies is None:
+        strategies = []
+    if migrations is None:
+        migrations = []
+    logger.info(f"🟢 Importing {database_s3_key} into {dbname}")
+    assert PurePosixPath(database_s3_key).suffixes[-2:] in [
+        [".CSV", ".zip"],
+        [".csv", ".zip"],
+    ], (
+        "⛔ the LCA databases should be zipped CSV files, and have a `.csv.zip` extension"
     )
-    database.apply_strategy(
-        functools.partial(
-            link_technosphere_by_activity_hash_ref_product,
-            external_db_name=external_db,
-            fields=("name", "unit", "location"),
-        )
+
+    local_path = s3.get_file(database_s3_key, database_md5)
+    register_migrations(migrations)
+    key = linked_snapshot_key(database_md5, dbname, migrations, strategies, external_db)
+    snapshot_path = local_path.parent / Path(local_path.stem).with_suffix(
+        f".{key[:16]}.linked.pickle"
     )
-    database.apply_strategy(
-        functools.partial(
-            link_technosphere_by_activity_hash_ref_product,
-            external_db_name=external_db,
-            fields=("name", "unit"),
+
+    if cache and snapshot_path.is_file():
+        logger.info(f"🟠 Reusing the migrated and linked datasets => {snapshot_path}")
+        with open(snapshot_path, "rb") as f:
+            database = SimaProJsonImporter(
+                None, dbname, normalize_biosphere=True, json_data=pickle.load(f)
+            )
+    else:
+        database = _migrate_and_link_technosphere(
+            local_path, database_md5, dbname, external_db, migrations, strategies
         )
-    )
+        if cache:
+            _write_linked_snapshot(database, snapshot_path)
+
     database.apply_strategy(
         functools.partial(
             link_iterable_by_fields,
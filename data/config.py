@@ -35,6 +35,26 @@ settings = Dynaconf(
             default=user_cache_path("ecobalyse") / "db-cache",
             apply_default_on_none=True,
         ),
+        Validator(
+            "SEARCH_INDEX_DIR",
+            default=user_cache_path("ecobalyse") / "search-index",
+            apply_default_on_none=True,
+        ),
+        Validator(
+            "IMPACTS_CACHE_DIR",
+            default=user_cache_path("ecobalyse") / "impacts-cache",
+            apply_default_on_none=True,
+        ),
+        Validator(
+            "CATALOG_CACHE_DIR",
+            default=user_cache_path("ecobalyse") / "lci-catalog",
+            apply_default_on_none=True,
+        ),
+        Validator(
+            "DAEMON_SOCKET",
+            default=user_cache_path("ecobalyse") / "bw-daemon.sock",
+            apply_default_on_none=True,
+        ),
     ],
 )
 
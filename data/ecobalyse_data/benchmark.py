@@ -0,0 +1,270 @@
+"""Benchmarks of the computation path on synthetic Brightway databases.
+
+The real databases are downloaded from S3 and take a while to import, the
+synthetic ones are generated locally in a few seconds, with a configurable
+size, so that the performance of search, LCI, LCIA, corrections and export
+can be measured on demand and compared between commits (see `bin/benchmark.py`).
+"""
+
+import random
+import statistics
+import time
+import uuid
+from pathlib import Path
+
+import bw2data
+
+from common import get_normalization_weighting_factors
+from common.export import export_json, get_impacts_json
+from common.impacts import impacts as impacts_py
+from common.impacts import main_method
+from ecobalyse_data.bw import engine
+from ecobalyse_data.bw.search import search_one
+from ecobalyse_data.computation import (
+    compute_brightway_impacts,
+    compute_brightway_impacts_batch,
+    compute_processes_for_activities,
+)
+from ecobalyse_data.export.export_generic import compute_processes_generic
+from ecobalyse_data.export.land_occupation import (
+    LAND_OCCUPATION_METHOD,
+    compute_land_occupation_batch,
+)
+from ecobalyse_data.impacts_matrix import raw_impacts_to_impacts
+from ecobalyse_data.logging import logger
+from models.process import Process, dump_all
+
+SYNTHETIC_DATABASE = "synthetic"
+SYNTHETIC_BIOSPHERE = "synthetic-biosphere"
+
+
+def create_synthetic_databases(
+    activities: int = 1000,
+    exchanges: int = 5,
+    flows: int = 200,
+    characterization_factors: int = 50,
+    seed: int = 0,
+) -> list[dict]:
+    """Write a synthetic technosphere and biosphere, and the methods of `impacts_py`
+    (plus the land occupation), in the current Brightway project.
+
+    Each activity has `exchanges` technosphere inputs and `exchanges` emissions,
+    each method `characterization_factors` factors. Inputs sum to less than the
+    production so that the technosphere matrix is always invertible.
+
+    Returns the lci_catalog entries of the synthetic activities."""
+    rng = random.Random(seed)
+
+    logger.info(
+        f"-> Creating a synthetic database: {activities} activities, {exchanges} exchanges each, {flows} flows"
+    )
+    bw2data.Database(SYNTHETIC_BIOSPHERE).write(
+        {
+            (SYNTHETIC_BIOSPHERE, f"flow-{i}"): {
+                "name": f"synthetic flow {i}",
+                "categories": ("air",),
+                "unit": "kilogram",
+                "type": "emission",
+            }
+            for i in range(flows)
+        }
+    )
+
+    data = {}
+    for i in range(activities):
+        # Any other activity: indexes after `i` are shifted to skip it
+        inputs = [
+            j + (j >= i)
+            for j in rng.sample(range(activities - 1), min(exchanges, activities - 1))
+        ]
+        data[(SYNTHETIC_DATABASE, f"activity-{i}")] = {
+            "name": f"synthetic activity {i}",
+            "location": "GLO",
+            "unit": "kilogram",
+            "type": "process",
+            "production amount": 1,
+            "exchanges": [
+                {
+                    "input": (SYNTHETIC_DATABASE, f"activity-{i}"),
+                    "amount": 1,
+                    "type": "production",
+                },
+                *[
+                    {
+                        "input": (SYNTHETIC_DATABASE, f"activity-{j}"),
+                        "amount": rng.uniform(0, 0.5 / exchanges),
+                        "type": "technosphere",
+                    }
+                    for j in inputs
+                ],
+                *[
+                    {
+                        "input": (SYNTHETIC_BIOSPHERE, f"flow-{k}"),
+                        "amount": rng.uniform(0, 1),
+                        "type": "biosphere",
+                    }
+                    for k in rng.sample(range(flows), min(exchanges, flows))
+                ],
+            ],
+        }
+    bw2data.Database(SYNTHETIC_DATABASE).write(data)
+
+    for method_name in [*impacts_py.values(), LAND_OCCUPATION_METHOD]:
+        method = bw2data.Method(tuple(method_name))
+        method.register(unit="synthetic")
+        method.write(
+            [
+                ((SYNTHETIC_BIOSPHERE, f"flow-{k}"), rng.uniform(0, 10))
+                for k in rng.sample(range(flows), min(characterization_factors, flows))
+            ]
+        )
+
+    return [
+        {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "activityName": f"synthetic activity {i}",
+            "categories": ["material"],
+            "displayName": f"Synthetic activity {i}",
+            "location": "GLO",
+            "metadata": [
+                {
+                    "alias": f"synthetic-activity-{i}",
+                    "forestManagement": "intensivePlantation",
+                    "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                    "scopes": ["object"],
+                }
+            ],
+            "scopes": ["object"],
+            "source": SYNTHETIC_DATABASE,
+            "unit": "kg",
+        }
+        for i in range(activities)
+    ]
+
+
+def _time(func, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return {"min": min(runs), "median": statistics.median(runs), "runs": runs}
+
+
+def _cold(func):
+    """`func` without the LCI engines built by previous runs"""
+
+    def run():
+        engine._engines.clear()
+        return func()
+
+    return run
+
+
+def run_benchmarks(
+    eco_activities: list[dict], work_dir: Path, repeat: int = 3, sample: int = 20
+) -> dict:
+    """Time each stage of the computation path, `repeat` times.
+
+    `sample` activities are also computed one LCA at a time, to measure the
+    speedup of the batched computation. Returns {stage: timings}, timings in
+    seconds."""
+    impacts_json = get_impacts_json()
+    factors = get_normalization_weighting_factors(impacts_json)
+    bw_activities = [
+        search_one(SYNTHETIC_DATABASE, a["activityName"], location=a["location"])
+        for a in eco_activities
+    ]
+    demand_amounts = [1] * len(bw_activities)
+    impact_keys = list(impacts_py)
+
+    results = {}
+
+    def search():
+        for a in eco_activities:
+            search_one(SYNTHETIC_DATABASE, a["activityName"], location=a["location"])
+
+    results["search"] = _time(search, repeat)
+
+    results["lci"] = _time(
+        lambda: engine.LCIEngine(bw_activities, impacts_py.values()), repeat
+    )
+
+    lci_engine = engine.LCIEngine(bw_activities, impacts_py.values())
+    method_to_key = {tuple(m): k for k, m in impacts_py.items()}
+    results["lcia"] = _time(
+        lambda: lci_engine.scores_by_id([a.id for a in bw_activities], demand_amounts),
+        repeat,
+    )
+
+    raw_impacts = [
+        {method_to_key[m]: score for m, score in scores.items()}
+        for scores in lci_engine.scores_by_id(
+            [a.id for a in bw_activities], demand_amounts
+        ).values()
+    ]
+    results["corrections"] = _time(
+        lambda: raw_impacts_to_impacts(raw_impacts, impact_keys, impacts_json, factors),
+        repeat,
+    )
+
+    processes = []
+
+    def compute_processes():
+        processes[:] = compute_processes_for_activities(
+            eco_activities, main_method, impacts_py, impacts_json, factors
+        )
+
+    results["compute_processes_for_activities"] = _time(
+        _cold(compute_processes), repeat
+    )
+
+    results["compute_land_occupation_batch"] = _time(
+        _cold(lambda: compute_land_occupation_batch(bw_activities)), repeat
+    )
+
+    processes_impacts_path = work_dir / "processes_impacts.json"
+
+    def export():
+        export_json(
+            dump_all(Process, processes, exclude={"bw_activity", "land_occupation"}),
+            processes_impacts_path,
+        )
+
+    results["export"] = _time(export, repeat)
+
+    results["compute_processes_generic"] = _time(
+        _cold(
+            lambda: compute_processes_generic(
+                [
+                    {**a, "metadata": [dict(m) for m in a["metadata"]]}
+                    for a in eco_activities
+                ],
+                processes_impacts_path,
+            )
+        ),
+        repeat,
+    )
+
+    # One LCA per activity, the way it was done before the LCI engine
+    sampled = bw_activities[:sample]
+    per_activity = _time(
+        lambda: [compute_brightway_impacts(a, impacts_py) for a in sampled], repeat
+    )
+    batched = _time(
+        _cold(
+            lambda: compute_brightway_impacts_batch(
+                sampled, [1] * len(sampled), main_method, impacts_py
+            )
+        ),
+        repeat,
+    )
+    results["per_activity_lca"] = per_activity
+    results["batched_lca"] = batched
+    results["batched_speedup"] = {
+        "min": per_activity["min"] / batched["min"],
+        "median": per_activity["median"] / batched["median"],
+        "runs": [],
+    }
+
+    return results
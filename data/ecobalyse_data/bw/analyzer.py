@@ -1,112 +1,146 @@
-import bw2calc
-from bw2data import get_activity
+import bw2data
+from bw2data.backends import ActivityDataset
+from rich.console import Console
+from rich.table import Table
 
-from ecobalyse_data.logging import logger
+from ecobalyse_data.bw.engine import get_lci_engine
 
 
-def print_recursive_calculation(
+def _node(activity_id, amount, scores, totals, children=None) -> dict:
+    return {
+        "id": activity_id,
+        "amount": amount,
+        "scores": scores,
+        "fractions": {
+            key: score / totals[key] if totals[key] else 0
+            for key, score in scores.items()
+        },
+        "children": children if children is not None else [],
+    }
+
+
+def _add_names(node: dict, names: dict) -> None:
+    database, code, name, location = names[node.pop("id")]
+    node.update(database=database, code=code, name=name, location=location)
+    for child in node["children"]:
+        _add_names(child, names)
+
+
+def _collect_ids(node: dict, ids: set) -> set:
+    ids.add(node["id"])
+    for child in node["children"]:
+        _collect_ids(child, ids)
+    return ids
+
+
+def contribution_tree(
     activity,
-    lcia_method,
+    impact_categories: dict,
     amount=1,
     max_level=3,
     cutoff=1e-2,
-    string_length=130,
-    tab_character="  ",
-    use_matrix_values=False,
-    _lca_obj=None,
-    _total_score=None,
-    __level=0,
-    __first=True,
-):
-    """Traverse a supply chain graph, and calculate the LCA scores of each component. Prints the result with the format:
-
-    {tab_character * level }{fraction of total score} ({absolute LCA score for this input} | {amount of input}) {input activity}
-
-    Args:
-        activity: ``Activity``. The starting point of the supply chain graph.
-        lcia_method: tuple. LCIA method to use when traversing supply chain graph.
-        amount: int. Amount of ``activity`` to assess.
-        max_level: int. Maximum depth to traverse.
-        cutoff: float. Fraction of total score to use as cutoff when deciding whether to traverse deeper.
-        string_length: int. Maximum length of printed string.
-        file_obj: File-like object (supports ``.write``), optional. Output will be written to this object if provided.
-        tab_character: str. Character to use to indicate indentation.
-        use_matrix_values: bool. Take exchange values from the matrix instead of the exchange instance ``amount``. Useful for Monte Carlo, but can be incorrect if there is more than one exchange from the same pair of nodes.
-
-    Normally internal args:
-        _lca_obj: ``LCA``. Can give an instance of the LCA class (e.g. when doing regionalized or Monte Carlo LCA)
-        _total_score: float. Needed if specifying ``_lca_obj``.
-
-    Internal args (used during recursion, do not touch);
-        __level: int.
-        __first: bool.
-
-    Returns:
-        Nothing. Prints to ``sys.stdout`` or ``file_obj``
-
-    """
-    activity = get_activity(activity)
-
-    if _lca_obj is None:
-        _lca_obj = bw2calc.LCA({activity: amount}, lcia_method)
-        _lca_obj.lci()
-        _lca_obj.lcia()
-        _total_score = _lca_obj.score
-    elif _total_score is None:
-        raise ValueError
-    else:
-        _lca_obj.redo_lcia({activity.id: amount})
-
-        if abs(_lca_obj.score) <= abs(_total_score * cutoff):
-            # logger.warning(f"->  {_lca_obj.score} below cutoff {abs(_total_score * cutoff)} for {activity}, returning.")
-            return
-    if __first:
-        logger.info("Fraction of score | Absolute score | Amount | Activity")
-    message = f"{tab_character * __level}{_lca_obj.score / _total_score:04.3g} | {_lca_obj.score:5.4n} | {float(amount):5.4n} | {activity!s}"
-    logger.info(message)
-    if __level < max_level:
-        prod_exchanges = list(activity.production())
-        if not prod_exchanges:
-            prod_amount = 1
-        elif len(prod_exchanges) > 1:
-            logger.warning("Hit multiple production exchanges; aborting in this branch")
-            return
-        else:
-            prod_amount = _lca_obj.technosphere_matrix[
-                _lca_obj.dicts.product[prod_exchanges[0].input.id],
-                _lca_obj.dicts.activity[prod_exchanges[0].output.id],
-            ]
-
-        for exc in activity.technosphere():
-            if exc.input.id == exc.output.id:
+) -> dict:
+    """Traverse the supply chain of `activity` and return the scores of each component,
+    for every impact category of `impact_categories` ({impact key: method}).
+
+    Each node is a dict with its activity (`database`, `code`, `name`, `location`),
+    the `amount` of its product, its `scores` and `fractions` of the total score by
+    impact key, and its `children`.
+
+    Same semantics as the former `print_recursive_calculation` with
+    `use_matrix_values=True`: inputs are read from the technosphere matrix,
+    `max_level` is the maximum depth, and a component is kept (and traversed) only
+    if its absolute score is above `cutoff` times the absolute total score, here
+    for at least one impact category.
+
+    The technosphere is solved once (for the score of one unit of every product,
+    see `LCIEngine.unit_scores`), the score of a component is then a lookup."""
+    activity = bw2data.get_activity(activity)
+    keys = list(impact_categories)
+    engine = get_lci_engine([activity], impact_categories.values())
+    unit_scores = engine.unit_scores()
+    matrix = engine.technosphere_matrix
+    product_ids = {row: product_id for product_id, row in engine.product_index.items()}
+
+    def scores_of(activity_id, node_amount) -> dict:
+        column = unit_scores[:, engine.product_index[activity_id]]
+        return {key: float(node_amount * column[i]) for i, key in enumerate(keys)}
+
+    totals = scores_of(activity.id, amount)
+
+    def above_cutoff(scores) -> bool:
+        return any(
+            abs(scores[key]) > abs(totals[key] * cutoff) for key in keys if totals[key]
+        )
+
+    def traverse(activity_id, node_amount, level) -> dict:
+        node = _node(
+            activity_id, node_amount, scores_of(activity_id, node_amount), totals
+        )
+        if level >= max_level:
+            return node
+
+        column = engine.activity_index[activity_id]
+        production_row = engine.product_index[activity_id]
+        production_amount = matrix[production_row, column]
+        start, end = matrix.indptr[column], matrix.indptr[column + 1]
+        for row, value in zip(matrix.indices[start:end], matrix.data[start:end]):
+            if row == production_row:
+                continue
+            # Inputs are negative in the technosphere matrix
+            input_amount = node_amount * -value / production_amount
+            input_id = product_ids[row]
+            if not above_cutoff(scores_of(input_id, input_amount)):
                 continue
+            node["children"].append(traverse(input_id, input_amount, level + 1))
 
-            if use_matrix_values:
-                sign = (
-                    -1
-                    if exc.get("type") in ("technosphere", "generic technosphere")
-                    else 1
-                )
-                tm_amount = (
-                    _lca_obj.technosphere_matrix[
-                        _lca_obj.dicts.product[exc.input.id],
-                        _lca_obj.dicts.activity[exc.output.id],
-                    ]
-                    * sign
+        return node
+
+    tree = traverse(activity.id, amount, 0)
+
+    ids = _collect_ids(tree, set())
+    names = {
+        row.id: (row.database, row.code, row.name, row.location)
+        for row in ActivityDataset.select(
+            ActivityDataset.id,
+            ActivityDataset.database,
+            ActivityDataset.code,
+            ActivityDataset.name,
+            ActivityDataset.location,
+        ).where(ActivityDataset.id.in_(list(ids)))
+    }
+    _add_names(tree, names)
+
+    return tree
+
+
+def print_contribution_tree(
+    tree: dict, impact_keys: list[str], tab_character="  ", string_length=130
+) -> None:
+    """Display a contribution tree as a table, with the fraction of the total score
+    and the absolute score of each component for `impact_keys`"""
+    table = Table(title="Contributions", show_header=True)
+    table.add_column("Activity", style="cyan", max_width=string_length)
+    table.add_column("Amount")
+    for key in impact_keys:
+        table.add_column(f"{key} (fraction)", style="magenta")
+        table.add_column(f"{key} (score)")
+
+    def add_rows(node, level):
+        table.add_row(
+            f"{tab_character * level}{node['name']} ({node['location']}, {node['database']})",
+            f"{node['amount']:5.4n}",
+            *[
+                value
+                for key in impact_keys
+                for value in (
+                    f"{node['fractions'][key]:04.3g}",
+                    f"{node['scores'][key]:5.4n}",
                 )
-            else:
-                tm_amount = exc["amount"]
-
-            print_recursive_calculation(
-                activity=exc.input,
-                lcia_method=lcia_method,
-                amount=amount * tm_amount / prod_amount,
-                max_level=max_level,
-                cutoff=cutoff,
-                string_length=string_length,
-                tab_character=tab_character,
-                __first=False,
-                _lca_obj=_lca_obj,
-                _total_score=_total_score,
-                __level=__level + 1,
-            )
+            ],
+        )
+        for child in node["children"]:
+            add_rows(child, level + 1)
+
+    add_rows(tree, 0)
+    Console().print(table)
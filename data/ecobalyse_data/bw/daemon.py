@@ -0,0 +1,201 @@
+import os
+import socket
+import socketserver
+from pathlib import Path
+
+import bw2data
+import orjson
+from bw2calc.errors import BW2CalcError
+from bw2data.errors import BW2Exception
+
+from common import get_normalization_weighting_factors
+from common.export import get_impacts_json
+from common.impacts import impacts as impacts_py
+from common.impacts import main_method
+from config import settings
+from ecobalyse_data.bw.analyzer import contribution_tree
+from ecobalyse_data.bw.search import search_one
+from ecobalyse_data.computation import iter_processes_for_bw_activities
+from ecobalyse_data.export.land_occupation import compute_land_occupation_batch
+from ecobalyse_data.logging import logger
+
+
+class DaemonError(Exception):
+    pass
+
+
+# Errors of a request answered to the client, anything else is a daemon bug
+REQUEST_ERRORS = (
+    DaemonError,
+    BW2Exception,
+    BW2CalcError,
+    KeyError,
+    TypeError,
+    ValueError,
+)
+
+
+def get_activity(params: dict):
+    """The Brightway activity of a request, by `code` or by `name` (+ `location`)"""
+    if params.get("code"):
+        return bw2data.get_activity((params["database"], params["code"]))
+
+    return search_one(
+        params["database"], params["name"], location=params.get("location")
+    )
+
+
+def dump_process(process) -> dict:
+    """The JSON payload of a computed process, the same with or without the daemon"""
+    return process.model_dump(
+        mode="json", by_alias=True, exclude={"bw_activity", "land_occupation"}
+    )
+
+
+def processes_impacts(bw_activities: list) -> list[dict]:
+    """`dump_process(compute_process_for_bw_activity(...))` of each activity, solved
+    together against the (cached) factorized technosphere of their databases"""
+    impacts_json = get_impacts_json()
+    factors = get_normalization_weighting_factors(impacts_json)
+    return [
+        dump_process(process)
+        for chunk_processes in iter_processes_for_bw_activities(
+            bw_activities, main_method, impacts_py, impacts_json, factors
+        )
+        for process in chunk_processes
+    ]
+
+
+def process_impacts(bw_activity) -> dict:
+    [process] = processes_impacts([bw_activity])
+    return process
+
+
+def land_occupation(bw_activity) -> float:
+    return compute_land_occupation_batch([bw_activity])[bw_activity.id]
+
+
+def contribution(bw_activity, max_level=3, cutoff=1e-2) -> dict:
+    return contribution_tree(
+        bw_activity, impacts_py, max_level=max_level, cutoff=cutoff
+    )
+
+
+# {command: handler(bw_activity, **options) -> json serializable result}
+COMMANDS = {
+    "contribution": contribution,
+    "impacts": process_impacts,
+    "land_occupation": land_occupation,
+}
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """One JSON request per line, answered by one JSON line:
+    `{"ok": true, "result": …}` or `{"ok": false, "error": "…"}`"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = {"ok": True, "result": self.server.dispatch(line)}
+            except REQUEST_ERRORS as e:
+                logger.exception(e)
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+            self.wfile.write(orjson.dumps(response, option=orjson.OPT_APPEND_NEWLINE))
+            self.wfile.flush()
+
+
+class BrightwayDaemon(socketserver.UnixStreamServer):
+    """Keep the Brightway project, its datapackages and the factorized
+    technospheres (see `get_lci_engine`) in memory between requests.
+
+    Requests are handled one at a time: the LCI engines are not thread-safe, and
+    a query against a warm engine is a single solve anyway."""
+
+    def __init__(self, socket_path: Path, project: str):
+        self.socket_path = Path(socket_path)
+        bw2data.projects.set_current(project)
+
+        if self.socket_path.exists():
+            if get_client(self.socket_path) is not None:
+                raise DaemonError(f"A daemon is already listening on {socket_path}")
+            # Left over by a daemon that was killed
+            self.socket_path.unlink()
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+
+        super().__init__(str(self.socket_path), RequestHandler)
+
+    def dispatch(self, line: bytes):
+        request = orjson.loads(line)
+        command = request.get("command")
+
+        if command == "ping":
+            return {"project": bw2data.projects.current, "pid": os.getpid()}
+        if command == "processes":
+            # Many activities at once, `[[database, code], …]`
+            bw_activities = [
+                bw2data.get_activity(tuple(key)) for key in request["activities"]
+            ]
+            logger.info(f"-> processes for {len(bw_activities)} activities")
+            return processes_impacts(bw_activities)
+        if command not in COMMANDS:
+            raise DaemonError(
+                f"Unknown command '{command}', available: ping, processes, {', '.join(COMMANDS)}"
+            )
+
+        bw_activity = get_activity(request)
+        logger.info(f"-> {command} for {bw_activity}")
+        return COMMANDS[command](bw_activity, **request.get("options", {}))
+
+    def server_close(self):
+        super().server_close()
+        self.socket_path.unlink(missing_ok=True)
+
+
+class DaemonClient:
+    def __init__(self, socket_path: Path, timeout: float | None = None):
+        self.socket_path = Path(socket_path)
+        self.timeout = timeout
+
+    def request(self, command: str, **params):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(str(self.socket_path))
+            sock.sendall(
+                orjson.dumps(
+                    {"command": command, **params}, option=orjson.OPT_APPEND_NEWLINE
+                )
+            )
+            with sock.makefile("rb") as f:
+                line = f.readline()
+
+        if not line:
+            raise DaemonError("The daemon closed the connection without answering")
+        response = orjson.loads(line)
+
+        if not response["ok"]:
+            raise DaemonError(response["error"])
+        return response["result"]
+
+
+def get_client(socket_path: Path | None = None) -> DaemonClient | None:
+    """A client of the daemon of the current project if one is running, else None"""
+    socket_path = Path(socket_path or settings.daemon_socket)
+    if not socket_path.exists():
+        return None
+
+    client = DaemonClient(socket_path, timeout=1)
+    try:
+        info = client.request("ping")
+    except (OSError, DaemonError):
+        return None
+
+    if info["project"] != bw2data.projects.current:
+        logger.warning(
+            f"-> Ignoring the daemon on {socket_path}, it serves the project '{info['project']}'"
+        )
+        return None
+
+    # Computations on a cold database can take a while
+    client.timeout = None
+    return client
@@ -0,0 +1,282 @@
+import functools
+from multiprocessing import Pool
+from typing import NamedTuple
+
+import bw2data
+import numpy as np
+from bw2calc import MultiLCA
+from bw2calc.errors import BW2CalcError
+from bw2data import get_multilca_data_objs
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+from ecobalyse_data import tracing
+from ecobalyse_data.bw.fingerprint import database_fingerprint
+from ecobalyse_data.logging import logger
+
+try:
+    from pypardiso import factorized as pardiso_factorized
+    from pypardiso.pardiso_wrapper import PyPardisoError
+
+    PYPARDISO = True
+except ImportError:
+    PYPARDISO = False
+
+# Errors of a chunk that can't be solved: Brightway while loading the matrices,
+# SuperLU on a singular technosphere, PARDISO, and non finite scores
+SOLVE_ERRORS = (BW2CalcError, RuntimeError, FloatingPointError) + (
+    (PyPardisoError,) if PYPARDISO else ()
+)
+
+# {databases: (fingerprint, engine)}, see `get_lci_engine`
+_engines: dict = {}
+
+
+class LCIEngine:
+    """Technosphere loaded and factorized once, then solved for many demands.
+
+    Each impact category is reduced to a row of `characterization @ biosphere`
+    so that the score of a demand is a single dot product with its supply
+    vector. Demands are solved as extra right-hand sides of the same
+    factorization: chunking only bounds the size of the supply matrix in memory.
+    """
+
+    def __init__(self, bw_activities, impact_categories):
+        self.impact_categories = [tuple(m) for m in impact_categories]
+
+        # One activity per database is enough for bw2data to resolve the
+        # datapackages of the databases (and their dependencies) to load
+        representatives = {a["database"]: a for a in bw_activities}.values()
+        demands = {str(a.id): {a.id: 1} for a in representatives}
+        method_config = {"impact_categories": self.impact_categories}
+
+        logger.info(
+            f"-> Loading and factorizing technosphere for {', '.join(sorted(a['database'] for a in representatives))}"
+        )
+        with tracing.span("load matrices"):
+            data_objs = get_multilca_data_objs(
+                functional_units=demands, method_config=method_config
+            )
+            mlca = MultiLCA(
+                demands=demands, method_config=method_config, data_objs=data_objs
+            )
+            mlca.load_lci_data()
+            mlca.load_lcia_data()
+
+        self.product_index = dict(mlca.dicts.product)
+        self.activity_index = dict(mlca.dicts.activity)
+        self.size = mlca.technosphere_matrix.shape[0]
+        self.technosphere_matrix = mlca.technosphere_matrix.tocsc()
+        self._unit_scores = None
+
+        # Row `i` holds the score of one unit of every technosphere activity
+        # for the impact category `i` (diagonal characterization, summed)
+        characterization_rows = sparse.vstack(
+            [
+                sparse.csr_matrix(
+                    mlca.characterization_mm_dict[method].matrix.sum(axis=0)
+                )
+                for method in self.impact_categories
+            ]
+        )
+        self.scores_matrix = (characterization_rows @ mlca.biosphere_matrix).tocsr()
+
+        with tracing.span("factorize technosphere", size=self.size):
+            if PYPARDISO:
+                self._solve = pardiso_factorized(mlca.technosphere_matrix.tocsr())
+                self._solve_transposed = None
+            else:
+                lu = splu(self.technosphere_matrix)
+                self._solve = lu.solve
+                self._solve_transposed = functools.partial(lu.solve, trans="T")
+
+    def supply(self, activity_ids, demand_amounts) -> np.ndarray:
+        """Supply vectors (one column per demand) for the given activities"""
+        demand_matrix = np.zeros((self.size, len(activity_ids)))
+        for column, (activity_id, amount) in enumerate(
+            zip(activity_ids, demand_amounts)
+        ):
+            demand_matrix[self.product_index[activity_id], column] = amount
+
+        supply = self._solve(demand_matrix)
+        return supply.reshape(self.size, len(activity_ids))
+
+    def unit_scores(self) -> np.ndarray:
+        """Score of one unit of every product (impact categories × products).
+
+        Solved once for all the products with the transposed system
+        `technosphereᵀ · x = scoresᵀ`: one right-hand side per impact category
+        instead of one per product."""
+        if self._unit_scores is None:
+            if self._solve_transposed is None:
+                self._solve_transposed = pardiso_factorized(
+                    self.technosphere_matrix.T.tocsr()
+                )
+            unit_scores = self._solve_transposed(self.scores_matrix.T.toarray())
+            self._unit_scores = unit_scores.reshape(
+                self.size, len(self.impact_categories)
+            ).T
+        return self._unit_scores
+
+    def scores_by_id(self, activity_ids, demand_amounts) -> dict:
+        """Return {activity_id: {impact_category: score}} solving all the demands at once.
+
+        Raises a FloatingPointError if a score isn't finite, as with an
+        ill-conditioned technosphere."""
+        chunk_scores = self.scores_matrix @ self.supply(activity_ids, demand_amounts)
+        if not np.isfinite(chunk_scores).all():
+            raise FloatingPointError(
+                f"Non finite scores for {len(activity_ids)} activities"
+            )
+        return {
+            activity_id: {
+                method: float(chunk_scores[row, column])
+                for row, method in enumerate(self.impact_categories)
+            }
+            for column, activity_id in enumerate(activity_ids)
+        }
+
+
+def _chunks(bw_activities, demand_amounts, chunk_size: int) -> list[tuple[list, list]]:
+    return [
+        (
+            [a.id for a in bw_activities[i : i + chunk_size]],
+            list(demand_amounts[i : i + chunk_size]),
+        )
+        for i in range(0, len(bw_activities), chunk_size)
+    ]
+
+
+def get_lci_engine(bw_activities, impact_categories) -> LCIEngine:
+    """Return the engine for the databases of `bw_activities`, building it only
+    when there is no up to date engine for them.
+
+    One engine is kept per set of databases: it is replaced when the project,
+    the impact categories or a database modification date change, so that an
+    engine is never reused after a database has been written to."""
+    databases = frozenset(a["database"] for a in bw_activities)
+    fingerprint = (
+        bw2data.projects.current,
+        frozenset((db, database_fingerprint(db)) for db in databases),
+        tuple(tuple(m) for m in impact_categories),
+    )
+    if _engines.get(databases, (None,))[0] != fingerprint:
+        # Dropped first so that the stale factorization is freed before the new one
+        _engines.pop(databases, None)
+        _engines[databases] = (fingerprint, LCIEngine(bw_activities, impact_categories))
+    return _engines[databases][1]
+
+
+class ChunkError(NamedTuple):
+    """Yielded by `iter_scores` instead of the scores of a chunk that could not
+    be solved, see `SOLVE_ERRORS`"""
+
+    activity_ids: list
+    error: Exception
+
+
+def _solve_or_error(engine, engine_error, chunk):
+    activity_ids, demand_amounts = chunk
+    if engine is None:
+        return ChunkError(activity_ids, engine_error)
+    try:
+        return engine.scores_by_id(activity_ids, demand_amounts)
+    except SOLVE_ERRORS as e:
+        return ChunkError(activity_ids, e)
+
+
+# Engine of a pool worker (or the error building it), built once by
+# `_init_worker` and reused for every chunk
+_worker_engine: LCIEngine | None = None
+_worker_error: Exception | None = None
+
+
+def _init_worker(project, activity_keys, impact_categories):
+    global _worker_engine, _worker_error
+    bw2data.projects.set_current(project)
+    try:
+        _worker_engine = LCIEngine(
+            [bw2data.get_activity(key) for key in activity_keys], impact_categories
+        )
+    except SOLVE_ERRORS as e:
+        # Raised, the pool would restart the worker over and over
+        _worker_error = e
+
+
+def _solve_chunk(chunk):
+    return _solve_or_error(_worker_engine, _worker_error, chunk)
+
+
+def iter_scores(
+    bw_activities,
+    demand_amounts,
+    impact_categories,
+    chunk_size: int = 100,
+    cpu_count: int = 1,
+):
+    """Yield {bw_activity.id: {impact_category: score}} chunk by chunk, in order,
+    or a `ChunkError` for a chunk that could not be solved.
+
+    With `cpu_count` > 1, chunks are dispatched to a pool of processes, each one
+    loading the project and factorizing the technosphere once. Chunks results
+    are yielded in order so the output doesn't depend on the scheduling."""
+    chunks = _chunks(bw_activities, demand_amounts, chunk_size)
+    if not chunks:
+        return
+
+    if cpu_count <= 1 or len(chunks) <= 1:
+        engine, engine_error = None, None
+        try:
+            engine = get_lci_engine(bw_activities, impact_categories)
+        except SOLVE_ERRORS as e:
+            engine_error = e
+        for index, chunk in enumerate(chunks):
+            logger.info(
+                f"-> solve technosphere: chunk {index + 1}/{len(chunks)} ({len(chunk[0])} activities)"
+            )
+            with tracing.span("solve chunk", activities=len(chunk[0])):
+                chunk_scores = _solve_or_error(engine, engine_error, chunk)
+            yield chunk_scores
+        return
+
+    nb_workers = min(cpu_count, len(chunks))
+    representatives = {a["database"]: a.key for a in bw_activities}
+    logger.info(
+        f"-> solve technosphere: {len(chunks)} chunks of {chunk_size} activities on {nb_workers} processes"
+    )
+
+    with Pool(
+        nb_workers,
+        initializer=_init_worker,
+        initargs=(
+            bw2data.projects.current,
+            list(representatives.values()),
+            [tuple(m) for m in impact_categories],
+        ),
+    ) as pool:
+        for index, chunk_scores in enumerate(pool.imap(_solve_chunk, chunks)):
+            logger.info(f"-> solve technosphere: chunk {index + 1}/{len(chunks)} done")
+            yield chunk_scores
+
+
+def compute_scores(
+    bw_activities,
+    demand_amounts,
+    impact_categories,
+    chunk_size: int = 100,
+    cpu_count: int = 1,
+) -> dict:
+    """Return {bw_activity.id: {impact_category: score}}, see `iter_scores`.
+    Raises the error of the first chunk that could not be solved."""
+    out = {}
+    for chunk_scores in iter_scores(
+        bw_activities,
+        demand_amounts,
+        impact_categories,
+        chunk_size=chunk_size,
+        cpu_count=cpu_count,
+    ):
+        if isinstance(chunk_scores, ChunkError):
+            raise chunk_scores.error
+        out.update(chunk_scores)
+    return out
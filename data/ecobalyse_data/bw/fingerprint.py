@@ -0,0 +1,49 @@
+import hashlib
+from pathlib import Path
+
+import bw2data
+import orjson
+
+
+def file_sha256(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def database_fingerprint(dbname: str) -> str | None:
+    """Last write of a database, None if there is no such database.
+
+    `modified` is updated by bw2data on every write to the database."""
+    if dbname not in bw2data.databases:
+        return None
+    return bw2data.databases[dbname].get("modified")
+
+
+def dependencies_fingerprint(dbname: str) -> str:
+    """Fingerprint of a database and of every database it depends on.
+
+    The impacts of an activity depend on the whole supply chain, so any write
+    to one of these databases changes it."""
+    dependents = sorted(bw2data.Database(dbname).find_graph_dependents())
+    return hashlib.sha256(
+        orjson.dumps([(db, database_fingerprint(db)) for db in dependents])
+    ).hexdigest()
+
+
+def method_fingerprint(method: tuple) -> list:
+    """Fingerprint of the characterization factors of a Brightway method.
+
+    bw2data doesn't date the writes of a method: its metadata is completed with
+    the hash of its processed datapackage, that is written again with the
+    factors (e.g. by `import_method.py`)."""
+    if method not in bw2data.methods:
+        return [list(method), None, None]
+    datapackage = bw2data.Method(method).filepath_processed()
+    return [
+        list(method),
+        {
+            key: bw2data.methods[method].get(key)
+            for key in ("abbreviation", "modified", "num_cfs")
+        },
+        file_sha256(datapackage) if datapackage.exists() else None,
+    ]
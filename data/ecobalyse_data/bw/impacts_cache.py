@@ -0,0 +1,85 @@
+import hashlib
+import os
+from pathlib import Path
+
+import orjson
+
+from config import DATA_ROOT_DIR, settings
+from ecobalyse_data.bw.fingerprint import (
+    dependencies_fingerprint,
+    file_sha256,
+    method_fingerprint,
+)
+from ecobalyse_data.logging import logger
+
+
+class ImpactsCache:
+    """On-disk cache of raw brightway impacts (before corrections and aggregation).
+
+    Entries are content-addressed: the file name is the hash of (database
+    fingerprint, activity code, demand amount, method definitions and
+    characterization factors), so that a stale entry is never read, it is
+    simply not found anymore.
+    """
+
+    def __init__(self, cache_dir: Path, impacts_py):
+        self.cache_dir = Path(cache_dir)
+        self.hits = 0
+        self.misses = 0
+        self._fingerprints: dict[str, str] = {}
+        self._method_hash = hashlib.sha256(
+            orjson.dumps(
+                [
+                    file_sha256(DATA_ROOT_DIR / settings.impacts_file),
+                    sorted(
+                        (k, method_fingerprint(tuple(m))) for k, m in impacts_py.items()
+                    ),
+                ]
+            )
+        ).hexdigest()
+
+    def _path(self, bw_activity, demand_amount) -> Path:
+        dbname = bw_activity["database"]
+        if dbname not in self._fingerprints:
+            self._fingerprints[dbname] = dependencies_fingerprint(dbname)
+
+        key = hashlib.sha256(
+            orjson.dumps(
+                [
+                    self._fingerprints[dbname],
+                    dbname,
+                    bw_activity["code"],
+                    float(demand_amount),
+                    self._method_hash,
+                ]
+            )
+        ).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, bw_activity, demand_amount) -> dict | None:
+        path = self._path(bw_activity, demand_amount)
+        try:
+            with open(path, "rb") as f:
+                impacts = orjson.loads(f.read())
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return impacts
+
+    def set(self, bw_activity, demand_amount, impacts: dict) -> None:
+        path = self._path(bw_activity, demand_amount)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write then rename so that an interrupted export never leaves a truncated entry
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps(impacts))
+        os.replace(tmp_path, path)
+
+    def log_stats(self) -> None:
+        total = self.hits + self.misses
+        logger.info(
+            f"-> Impacts cache {self.cache_dir}: {self.hits}/{total} hits, {self.misses} misses"
+        )
@@ -0,0 +1,124 @@
+import os
+
+import bw2data
+import orjson
+from bw2data.errors import UnknownObject
+
+from ecobalyse_data.bw.fingerprint import database_fingerprint
+from ecobalyse_data.bw.search import cached_search_one
+from ecobalyse_data.logging import logger
+
+# Fields of an lci_catalog entry used to resolve its Brightway activity
+RESOLUTION_FIELDS = ("source", "activityName", "location")
+
+
+def load_lock(lock_path) -> dict:
+    """Load the lci_catalog lock file, {catalog id: entry}. Empty if there is none."""
+    if lock_path is None or not os.path.exists(lock_path):
+        return {}
+
+    with open(lock_path, "rb") as f:
+        return orjson.loads(f.read())
+
+
+def write_lock(lock: dict, lock_path) -> None:
+    logger.info(f"Exporting {len(lock)} resolved activities to {lock_path}")
+    with open(lock_path, "wb") as f:
+        f.write(orjson.dumps(lock, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
+        f.write(b"\n")
+
+
+def lock_entry(eco_activity: dict, bw_activity) -> dict:
+    return {
+        **{field: eco_activity.get(field) for field in RESOLUTION_FIELDS},
+        "database": bw_activity["database"],
+        "code": bw_activity["code"],
+        "fingerprint": database_fingerprint(bw_activity["database"]),
+    }
+
+
+def _matches(entry: dict | None, eco_activity: dict) -> bool:
+    """Whether a lock entry was resolved from the current catalog fields"""
+    return entry is not None and all(
+        entry.get(field) == eco_activity.get(field) for field in RESOLUTION_FIELDS
+    )
+
+
+def _locked_activity(entry: dict, eco_activity: dict):
+    """The locked Brightway activity if it still exists and matches the catalog entry"""
+    try:
+        bw_activity = bw2data.get_activity((entry["database"], entry["code"]))
+    except UnknownObject:
+        return None
+
+    location = eco_activity.get("location")
+    if bw_activity["name"] != eco_activity.get("activityName") or (
+        location is not None and bw_activity.get("location") != location
+    ):
+        return None
+
+    return bw_activity
+
+
+def resolve_bw_activity(eco_activity: dict, lock: dict | None = None):
+    """Return the Brightway activity of an lci_catalog entry.
+
+    Goes straight to `bw2data.get_activity` when the entry is locked, and only
+    falls back to a search when it is not (or no longer) valid."""
+    entry = lock.get(eco_activity["id"]) if lock else None
+    if _matches(entry, eco_activity):
+        bw_activity = _locked_activity(entry, eco_activity)
+        if bw_activity is not None:
+            return bw_activity
+        logger.warning(
+            f"-> Stale lock entry for '{eco_activity.get('displayName')}', searching for it"
+        )
+
+    return cached_search_one(
+        eco_activity.get("source"),
+        eco_activity.get("activityName"),
+        location=eco_activity.get("location"),
+    )
+
+
+def update_lock(
+    activities: list[dict], lock: dict
+) -> tuple[dict, list[str], list[str]]:
+    """Return the lock of `activities`, the ids of the entries that were stale and
+    the ids of the entries that were refreshed.
+
+    An entry is stale when its catalog fields changed, or when its database
+    changed and the locked activity doesn't match anymore. Only stale entries
+    are searched again. An entry is refreshed when its database changed but the
+    locked activity still matches: only its fingerprint is updated."""
+    new_lock = {}
+    stale = []
+    refreshed = []
+    for eco_activity in activities:
+        # Hardcoded impacts don't reference a Brightway activity
+        if eco_activity.get("impacts"):
+            continue
+
+        entry = lock.get(eco_activity["id"])
+        if _matches(entry, eco_activity):
+            if entry["fingerprint"] == database_fingerprint(entry["database"]):
+                new_lock[eco_activity["id"]] = entry
+                continue
+
+            bw_activity = _locked_activity(entry, eco_activity)
+            if bw_activity is not None:
+                refreshed.append(eco_activity["id"])
+                new_lock[eco_activity["id"]] = lock_entry(eco_activity, bw_activity)
+                continue
+
+        stale.append(eco_activity["id"])
+        new_lock[eco_activity["id"]] = lock_entry(
+            eco_activity,
+            cached_search_one(
+                eco_activity.get("source"),
+                eco_activity.get("activityName"),
+                location=eco_activity.get("location"),
+            ),
+        )
+
+    return (new_lock, stale, refreshed)
@@ -0,0 +1,13 @@
+import bw2data
+
+from config import settings
+
+
+def activate_project(project: str | None = None) -> None:
+    """Make `project` (default to `settings.bw.project`) the current Brightway project.
+
+    Called by the commands that need Brightway, rather than at import time, so
+    that importing a module (or asking a script for its `--help`) stays cheap."""
+    project = project or settings.bw.project
+    if bw2data.projects.current != project:
+        bw2data.projects.set_current(project)
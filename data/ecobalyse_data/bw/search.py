@@ -1,6 +1,79 @@
 import functools
+import hashlib
+import os
+from collections import defaultdict
+from pathlib import Path
 
 import bw2data
+import orjson
+from bw2data.backends import ActivityDataset
+
+from config import settings
+from ecobalyse_data.bw.fingerprint import database_fingerprint
+from ecobalyse_data.logging import logger
+
+# {dbname: (database fingerprint, {name: [(location, unit, categories, code), …]})}
+_indexes: dict = {}
+
+
+def _index_path(dbname):
+    key = hashlib.sha256(orjson.dumps([str(bw2data.projects.dir), dbname])).hexdigest()
+    return Path(settings.search_index_dir) / f"{key}.json"
+
+
+def _build_index(dbname) -> list:
+    logger.info(f"-> Building the exact match search index for `{dbname}`")
+    query = ActivityDataset.select(
+        ActivityDataset.code,
+        ActivityDataset.name,
+        ActivityDataset.location,
+        ActivityDataset.data,
+    ).where(ActivityDataset.database == dbname)
+    return [
+        [
+            row.name,
+            row.location,
+            row.data.get("unit"),
+            list(row.data["categories"]) if row.data.get("categories") else None,
+            row.code,
+        ]
+        for row in query
+    ]
+
+
+def get_exact_match_index(dbname) -> dict:
+    """Return {name: [(location, unit, categories, code), …]} for a database.
+
+    The index is read from the activities table once, persisted in
+    `settings.search_index_dir` and rebuilt only when the database is modified."""
+    fingerprint = database_fingerprint(dbname)
+    if dbname in _indexes and _indexes[dbname][0] == fingerprint:
+        return _indexes[dbname][1]
+
+    path = _index_path(dbname)
+    rows = None
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            persisted = orjson.loads(f.read())
+        if persisted["fingerprint"] == fingerprint:
+            rows = persisted["activities"]
+
+    if rows is None:
+        rows = _build_index(dbname)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps({"fingerprint": fingerprint, "activities": rows}))
+        os.replace(tmp_path, path)
+
+    index = defaultdict(list)
+    for name, location, unit, categories, code in rows:
+        index[name].append(
+            (location, unit, tuple(categories) if categories else (), code)
+        )
+
+    _indexes[dbname] = (fingerprint, index)
+    return index
 
 
 @functools.cache
@@ -62,6 +135,20 @@ def search_one(
         #         f"Activity with code {code} not found in database '{dbname}': {e}"
         #     )
 
+    if not excluded_term or excluded_term not in search_terms:
+        exact_matches = [
+            match_code
+            for (result_location, result_unit, result_categories, match_code) in (
+                get_exact_match_index(dbname).get(search_terms, [])
+            )
+            if (location is None or result_location == location)
+            and (categories is None or result_categories == tuple(categories))
+            and (unit is None or result_unit == unit)
+        ]
+        if len(exact_matches) == 1:
+            return bw2data.get_activity((dbname, exact_matches[0]))
+
+    # No single exact match: run the full-text search to report the candidates
     search_query = search_terms
     if location:
         search_query = search_query + f" {location}"
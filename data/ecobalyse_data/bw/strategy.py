@@ -1,11 +1,110 @@
 import copy
+import functools
 import re
+import time
 
 from tqdm import tqdm
 
+from ecobalyse_data import tracing
+from ecobalyse_data.logging import logger
+
 from . import agribalyse
 
 
+def dataset_strategy(func):
+    """Make a strategy on the whole database from `func(ds)`, a strategy on a
+    single dataset.
+
+    `func` never modifies `ds`: it returns it as is when there is nothing to
+    change, a shallow copy with the changes, or None to remove the dataset. So
+    datasets are only copied when they change, and consecutive dataset
+    strategies can be applied in a single pass (see `fuse_strategies`)."""
+
+    @functools.wraps(func)
+    def strategy(db):
+        return [new_ds for ds in tqdm(db) if (new_ds := func(ds)) is not None]
+
+    strategy.per_dataset = func
+    return strategy
+
+
+def _strategy_name(strategy) -> str:
+    # `functools.partial` strategies are named after their function, like bw2io
+    return getattr(strategy, "__name__", None) or strategy.func.__name__
+
+
+def _fuse(strategies: list):
+    funcs = [strategy.per_dataset for strategy in strategies]
+    names = [strategy.__name__ for strategy in strategies]
+
+    def fused(db):
+        elapsed = [0.0] * len(funcs)
+        new_db = []
+        for ds in tqdm(db):
+            for i, func in enumerate(funcs):
+                start = time.perf_counter()
+                ds = func(ds)
+                elapsed[i] += time.perf_counter() - start
+                if ds is None:
+                    break
+            else:
+                new_db.append(ds)
+        fused.timings = list(zip(names, elapsed))
+        return new_db
+
+    fused.__name__ = " + ".join(names)
+    fused.timings = []
+    return fused
+
+
+def fuse_strategies(strategies: list) -> list:
+    """`strategies`, each run of consecutive dataset strategies being replaced
+    by a single strategy applying all of them to each dataset in turn.
+
+    After a pass, the time spent in each of the fused strategies is in the
+    `timings` of the fused strategy."""
+    fused = []
+    run = []
+    for strategy in [*strategies, None]:
+        if strategy is not None and hasattr(strategy, "per_dataset"):
+            run.append(strategy)
+            continue
+        fused.extend([_fuse(run)] if len(run) > 1 else run)
+        run = []
+        if strategy is not None:
+            fused.append(strategy)
+    return fused
+
+
+def apply_strategies(database, strategies: list) -> list[tuple[str, float]]:
+    """Apply `strategies` to the bw2io importer `database`, consecutive dataset
+    strategies in a single pass.
+
+    Returns the time spent in each strategy, in seconds."""
+    timings = []
+    for strategy in fuse_strategies(strategies):
+        name = _strategy_name(strategy)
+        start = time.perf_counter()
+        with tracing.span(f"strategy {name}"):
+            database.apply_strategy(strategy)
+        timings.extend(
+            getattr(strategy, "timings", None) or [(name, time.perf_counter() - start)]
+        )
+
+    for name, seconds in timings:
+        logger.debug(f"-> {name}: {seconds:.2f}s")
+    return timings
+
+
+def _filter_exchanges(ds, keep):
+    """`ds` without the exchanges for which `keep(exc)` is false, copied only
+    if any was removed"""
+    exchanges = [exc for exc in ds["exchanges"] if keep(exc)]
+    if len(exchanges) == len(ds["exchanges"]):
+        return ds
+    return {**ds, "exchanges": exchanges}
+
+
 # Patch for https://github.com/brightway-lca/brightway2-io/pull/283
 def lower_formula_parameters(db):
     """lower formula parameters"""
@@ -16,104 +115,89 @@ def lower_formula_parameters(db):
     return db
 
 
-def remove_azadirachtine(db):
+@dataset_strategy
+def remove_azadirachtine(ds):
     """Remove all exchanges with azadirachtine, except for apples"""
-    new_db = []
-    for ds in tqdm(db):
-        new_ds = copy.deepcopy(ds)
-        new_ds["exchanges"] = [
-            exc
-            for exc in ds["exchanges"]
-            if (
-                "azadirachtin" not in exc.get("name", "").lower()
-                or ds.get("name", "").lower().startswith("apple")
-            )
-        ]
-        new_db.append(new_ds)
-    return new_db
+    if ds.get("name", "").lower().startswith("apple"):
+        return ds
+    return _filter_exchanges(
+        ds, lambda exc: "azadirachtin" not in exc.get("name", "").lower()
+    )
 
 
-def remove_negative_land_use_on_tomato(db):
+@dataset_strategy
+def remove_negative_land_use_on_tomato(ds):
     """Remove transformation flows from urban on greenhouses
     that cause negative land-use on tomatoes"""
-    new_db = []
-    for ds in tqdm(db):
-        new_ds = copy.deepcopy(ds)
-        if ds.get("name", "").lower().startswith("plastic tunnel"):
-            new_ds["exchanges"] = [
-                exc
-                for exc in ds["exchanges"]
-                if not exc.get("name", "")
-                .lower()
-                .startswith("transformation, from urban")
-            ]
-        else:
-            pass
-        new_db.append(new_ds)
-    return new_db
+    if not ds.get("name", "").lower().startswith("plastic tunnel"):
+        return ds
+    return _filter_exchanges(
+        ds,
+        lambda exc: (
+            not exc.get("name", "").lower().startswith("transformation, from urban")
+        ),
+    )
 
 
-def fix_lentil_ldu(db):
+@dataset_strategy
+def fix_lentil_ldu(ds):
     """Replace 'from unspecified' with 'from annual crop'
     to avoid having negative LDU on the lentils.
     Should be removed for AGB 3.2"""
-    new_db = []
-    for ds in tqdm(db):
-        new_ds = copy.deepcopy(ds)
-        if ds.get("name", "").startswith("Lentil"):
-            for exc in new_ds["exchanges"]:
-                if exc.get("name", "").startswith("Transformation, from unspecified"):
-                    exc["name"] = "Transformation, from annual crop"
-        else:
-            pass
-        new_db.append(new_ds)
-    return new_db
+    if not ds.get("name", "").startswith("Lentil"):
+        return ds
+
+    def unspecified(exc):
+        return exc.get("name", "").startswith("Transformation, from unspecified")
+
+    if not any(unspecified(exc) for exc in ds["exchanges"]):
+        return ds
+    return {
+        **ds,
+        "exchanges": [
+            {**exc, "name": "Transformation, from annual crop"}
+            if unspecified(exc)
+            else exc
+            for exc in ds["exchanges"]
+        ],
+    }
 
 
-def remove_some_processes(db):
+@dataset_strategy
+def remove_some_processes(ds):
     """Some processes make the whole import fail
     due to inability to parse the Input and Calculated parameters"""
-    new_db = []
-    for ds in tqdm(db):
-        new_ds = copy.deepcopy(ds)
-        if ds.get("simapro metadata", {}).get("Process identifier") not in (
-            "EI3CQUNI000025017103662",
-        ):
-            new_db.append(new_ds)
-    return new_db
+    if ds.get("simapro metadata", {}).get("Process identifier") in (
+        "EI3CQUNI000025017103662",
+    ):
+        return None
+    return ds
 
 
-def remove_creosote(db):
+@dataset_strategy
+def remove_creosote(ds):
     """Remove creosote flows from flattened system trellis (AGB, WFLDB)"""
-    new_db = []
-    for ds in tqdm(db):
-        new_ds = copy.deepcopy(ds)
-        name = ds["name"].lower()
-        if "treillis" in name or "trellis" in name:
-            new_ds["exchanges"] = [
-                exc
-                for exc in ds["exchanges"]
-                # this is for system trellis
-                if exc.get("name", "")
-                not in ("Pyrene", "Fluoranthene", "Phenanthrene", "Naphtalene")
-                # this is for unit trellis
-                and "creosote" not in exc.get("name", "").lower()
-            ]
-        new_db.append(new_ds)
-    return new_db
+    name = ds["name"].lower()
+    if "treillis" not in name and "trellis" not in name:
+        return ds
+    return _filter_exchanges(
+        ds,
+        lambda exc: (
+            # this is for system trellis
+            exc.get("name", "")
+            not in ("Pyrene", "Fluoranthene", "Phenanthrene", "Naphtalene")
+            # this is for unit trellis
+            and "creosote" not in exc.get("name", "").lower()
+        ),
+    )
 
 
-def remove_acetamiprid(db):
+@dataset_strategy
+def remove_acetamiprid(ds):
     """Remove acetamiprid in FR activities"""
-    new_db = []
-    for ds in tqdm(db):
-        new_ds = copy.deepcopy(ds)
-        if ds.get("location") == "FR":
-            new_ds["exchanges"] = [
-                exc for exc in ds["exchanges"] if exc.get("name", "") != "Acetamiprid"
-            ]
-        new_db.append(new_ds)
-    return new_db
+    if ds.get("location") != "FR":
+        return ds
+    return _filter_exchanges(ds, lambda exc: exc.get("name", "") != "Acetamiprid")
 
 
 def use_unit_processes(db):
@@ -161,128 +245,139 @@ def noLT(db):
     return new_db
 
 
-def extract_name_location_product(db):
+NAME_LOCATION_PRODUCT_PATTERN = re.compile(
+    r"^(?P<product>.+?)(?://\[(?P<cc1>[^\]]+)\]| \{(?P<cc2>[^}]+)\}\|)\s*(?P<activity>.+)$"
+)
+
+
+@dataset_strategy
+def extract_name_location_product(ds):
     """extract the product, name and location from
     ecoinvent passing in SimaPro"""
-    pattern = re.compile(
-        r"^(?P<product>.+?)(?://\[(?P<cc1>[^\]]+)\]| \{(?P<cc2>[^}]+)\}\|)\s*(?P<activity>.+)$"
+    s = ds["name"].strip()
+    m = NAME_LOCATION_PRODUCT_PATTERN.match(s)
+    if not m:
+        raise ValueError(f"Unexpected activity name: {s!r}")
+
+    # pick whichever group matched
+    loc = m.group("cc1") or m.group("cc2")
+    return {
+        **ds,
+        "location": loc.strip(),
+        "reference product": m.group("product").strip(),
+    }
+
+
+DQR_PATTERN = re.compile(
+    r"The overall DQR of this product is: (?P<overall>[\d.]+) {P: (?P<P>[\d.]+), TiR: (?P<TiR>[\d.]+), GR: (?P<GR>[\d.]+), TeR: (?P<TeR>[\d.]+)}"
+)
+
+
+@dataset_strategy
+def extract_simapro_metadata(ds):
+    if "simapro metadata" not in ds:
+        return ds
+
+    new_ds = dict(ds)
+    for sp_field, value in ds["simapro metadata"].items():
+        if value != "Unspecified":
+            new_ds[sp_field] = value
+
+    # Getting the Data Quality Rating of the data when relevant
+    if "Comment" in ds["simapro metadata"]:
+        match = DQR_PATTERN.search(ds["simapro metadata"]["Comment"])
+
+        if match:
+            new_ds["DQR"] = {
+                "overall": float(match["overall"]),
+                "P": float(match["P"]),
+                "TiR": float(match["TiR"]),
+                "GR": float(match["GR"]),
+                "TeR": float(match["TeR"]),
+            }
+
+    del new_ds["simapro metadata"]
+    return new_ds
+
+
+LOCATION_PATTERN = re.compile(r"\{(?P<location>[\w ,\/\-\+]+)\}")
+LOCATION_PATTERN_2 = re.compile(r"\/\ *(?P<location>[\w ,\/\-]+) U$")
+
+
+@dataset_strategy
+def extract_simapro_location(ds):
+    if ds.get("location") is not None:
+        return ds
+
+    location = None
+    match = LOCATION_PATTERN.search(ds["name"])
+    if match is not None:
+        location = match["location"]
+    else:
+        match = LOCATION_PATTERN_2.search(ds["name"])
+        if match is not None:
+            location = match["location"]
+        elif ("French production," in ds["name"]) or (
+            "French production mix," in ds["name"]
+        ):
+            location = "FR"
+        elif "CA - adapted for maple syrup" in ds["name"]:
+            location = "CA"
+        elif ", IT" in ds["name"]:
+            location = "IT"
+        elif ", TR" in ds["name"]:
+            location = "TR"
+        elif "/GLO" in ds["name"]:
+            location = "GLO"
+
+    if location is None:
+        return ds
+    return {**ds, "location": location}
+
+
+CIQUAL_PATTERN = re.compile(r"\[Ciqual code: (?P<ciqual>[\d_]+)\]")
+
+
+@dataset_strategy
+def extract_ciqual(ds):
+    # Getting products CIQUAL code when relevant
+    if "ciqual" not in ds["name"].lower():
+        return ds
+    match = CIQUAL_PATTERN.search(ds["name"])
+    return {**ds, "ciqual_code": match["ciqual"] if match is not None else ""}
+
+
+# The tags of each kind, and how they appear in the names without spaces
+TAGS = {
+    kind: [(tag, tag.replace(" ", "")) for tag in tags]
+    for kind, tags in (
+        ("packaging", agribalyse.PACKAGINGS),
+        ("stage", agribalyse.STAGES),
+        ("transport_type", agribalyse.TRANSPORT_TYPES),
+        ("preparation_mode", agribalyse.PREPARATION_MODES),
     )
-    new_db = []
-    for ds in tqdm(db):
-        s = ds["name"].strip()
-        m = pattern.match(s)
-        if not m:
-            raise ValueError(f"Unexpected activity name: {s!r}")
-
-        new_ds = copy.deepcopy(ds)
-        # pick whichever group matched
-        loc = m.group("cc1") or m.group("cc2")
-        new_ds["location"] = loc.strip()
-        new_ds["reference product"] = m.group("product").strip()
-        new_db.append(new_ds)
+}
 
-    return new_db
-
-
-def extract_simapro_metadata(db):
-    new_db = []
-    dqr_pattern = r"The overall DQR of this product is: (?P<overall>[\d.]+) {P: (?P<P>[\d.]+), TiR: (?P<TiR>[\d.]+), GR: (?P<GR>[\d.]+), TeR: (?P<TeR>[\d.]+)}"
-    for ds in tqdm(db):
-        new_ds = copy.deepcopy(ds)
-        if "simapro metadata" in ds:
-            for sp_field, value in ds["simapro metadata"].items():
-                if value != "Unspecified":
-                    new_ds[sp_field] = value
-
-            # Getting the Data Quality Rating of the data when relevant
-            if "Comment" in ds["simapro metadata"]:
-                match = re.search(
-                    pattern=dqr_pattern, string=ds["simapro metadata"]["Comment"]
-                )
-
-                if match:
-                    new_ds["DQR"] = {
-                        "overall": float(match["overall"]),
-                        "P": float(match["P"]),
-                        "TiR": float(match["TiR"]),
-                        "GR": float(match["GR"]),
-                        "TeR": float(match["TeR"]),
-                    }
-
-            del new_ds["simapro metadata"]
-        new_db.append(new_ds)
-    return new_db
 
-
-def extract_simapro_location(db):
-    new_db = []
-    location_pattern = r"\{(?P<location>[\w ,\/\-\+]+)\}"
-    location_pattern_2 = r"\/\ *(?P<location>[\w ,\/\-]+) U$"
-    for ds in tqdm(db):
-        new_ds = copy.deepcopy(ds)
-        if ds.get("location") is None:
-            match = re.search(pattern=location_pattern, string=ds["name"])
-            if match is not None:
-                new_ds["location"] = match["location"]
-            else:
-                match = re.search(pattern=location_pattern_2, string=ds["name"])
-                if match is not None:
-                    new_ds["location"] = match["location"]
-                elif ("French production," in ds["name"]) or (
-                    "French production mix," in ds["name"]
-                ):
-                    new_ds["location"] = "FR"
-                elif "CA - adapted for maple syrup" in ds["name"]:
-                    new_ds["location"] = "CA"
-                elif ", IT" in ds["name"]:
-                    new_ds["location"] = "IT"
-                elif ", TR" in ds["name"]:
-                    new_ds["location"] = "TR"
-                elif "/GLO" in ds["name"]:
-                    new_ds["location"] = "GLO"
-        new_db.append(new_ds)
-    return new_db
-
-
-def extract_ciqual(db):
-    new_db = []
-    ciqual_pattern = r"\[Ciqual code: (?P<ciqual>[\d_]+)\]"
-    for ds in tqdm(db):
-        new_ds = copy.deepcopy(ds)
-        # Getting products CIQUAL code when relevant
-        if "ciqual" in ds["name"].lower():
-            match = re.search(pattern=ciqual_pattern, string=ds["name"])
-            new_ds["ciqual_code"] = match["ciqual"] if match is not None else ""
-        new_db.append(new_ds)
-    return new_db
-
-
-def extract_tags(db):
-    new_db = []
-    for ds in tqdm(db):
-        new_ds = copy.deepcopy(ds)
-        # Getting activity tags
-        name_without_spaces = ds["name"].replace(" ", "")
-        for packaging in agribalyse.PACKAGINGS:
-            if f"|{packaging.replace(' ', '')}|" in name_without_spaces:
-                new_ds["packaging"] = packaging
-
-        for stage in agribalyse.STAGES:
-            if f"|{stage.replace(' ', '')}" in name_without_spaces:
-                new_ds["stage"] = stage
-
-        for transport_type in agribalyse.TRANSPORT_TYPES:
-            if f"|{transport_type.replace(' ', '')}|" in name_without_spaces:
-                new_ds["transport_type"] = transport_type
-
-        for preparation_mode in agribalyse.PREPARATION_MODES:
-            if f"|{preparation_mode.replace(' ', '')}|" in name_without_spaces:
-                new_ds["preparation_mode"] = preparation_mode
-
-        if "simapro name" in ds:
-            del new_ds["simapro name"]
-
-        if "filename" in ds:
-            del new_ds["filename"]
-        new_db.append(new_ds)
-    return new_db
+@dataset_strategy
+def extract_tags(ds):
+    # Getting activity tags
+    name_without_spaces = ds["name"].replace(" ", "")
+    tags = {}
+    for kind, kind_tags in TAGS.items():
+        for tag, tag_without_spaces in kind_tags:
+            # Stages are only preceded by a pipe
+            if (
+                f"|{tag_without_spaces}" in name_without_spaces
+                if kind == "stage"
+                else f"|{tag_without_spaces}|" in name_without_spaces
+            ):
+                tags[kind] = tag
+
+    if not tags and "simapro name" not in ds and "filename" not in ds:
+        return ds
+
+    new_ds = {**ds, **tags}
+    new_ds.pop("simapro name", None)
+    new_ds.pop("filename", None)
+    return new_ds
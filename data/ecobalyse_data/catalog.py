@@ -0,0 +1,169 @@
+"""Compiled snapshot of the lci_catalog.
+
+Opening and parsing the ~1300 `lci_catalog/*/*.json` files is the first thing
+most data commands and tests do. The parsed files are kept in a single orjson
+snapshot (in `settings.catalog_cache_dir`) along with their modification time
+and size, and only the files that were added or modified since are parsed
+again.
+"""
+
+import concurrent.futures
+import functools
+import hashlib
+import os
+from collections import defaultdict
+from pathlib import Path
+
+import orjson
+
+from config import settings
+from ecobalyse_data import tracing
+from ecobalyse_data.logging import logger
+
+# Bump when the format of the snapshot changes
+SNAPSHOT_VERSION = 1
+
+
+class LciCatalog:
+    """The entries of an lci_catalog, sorted by path, and lookups on them"""
+
+    def __init__(self, activities: list[dict], paths: list[Path]):
+        self.activities = activities
+        # The file of each activity
+        self.paths = paths
+
+    def __len__(self):
+        return len(self.activities)
+
+    def __iter__(self):
+        return iter(self.activities)
+
+    @functools.cached_property
+    def by_id(self) -> dict[str, dict]:
+        return {a["id"]: a for a in self.activities}
+
+    @functools.cached_property
+    def by_alias(self) -> dict[str, dict]:
+        """Activities by the alias of each of their metadata entries"""
+        return {
+            metadata["alias"]: a
+            for a in self.activities
+            for metadata in a.get("metadata", [])
+            if metadata.get("alias")
+        }
+
+    @functools.cached_property
+    def by_source(self) -> dict[str, list[dict]]:
+        by_source = defaultdict(list)
+        for a in self.activities:
+            by_source[a.get("source")].append(a)
+        return dict(by_source)
+
+    @functools.cached_property
+    def by_scope(self) -> dict[str, list[dict]]:
+        by_scope = defaultdict(list)
+        for a in self.activities:
+            for scope in a.get("scopes", []):
+                by_scope[scope].append(a)
+        return dict(by_scope)
+
+
+def _read_activity(path: Path) -> dict:
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
+
+
+def _scan(catalog_dir: Path) -> dict[str, list[int]]:
+    """{relative path: [mtime_ns, size]} of the `*/*.json` files of the catalog.
+    `os.scandir` tells the files from the directories without a `stat`, but
+    `DirEntry.stat()` still makes one system call per file on Linux"""
+    stats = {}
+    for directory in os.scandir(catalog_dir):
+        if not directory.is_dir():
+            continue
+        for entry in os.scandir(directory.path):
+            if entry.name.endswith(".json") and entry.is_file():
+                stat = entry.stat()
+                stats[f"{directory.name}/{entry.name}"] = [
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                ]
+    return stats
+
+
+def _snapshot_path(catalog_dir: Path, cache_dir: Path) -> Path:
+    # One snapshot per catalog (the tests have their own)
+    key = hashlib.sha256(str(catalog_dir.resolve()).encode()).hexdigest()[:16]
+    return Path(cache_dir) / f"lci-catalog-{key}.json"
+
+
+def _load_snapshot(snapshot_path: Path) -> dict:
+    """{relative path: [mtime_ns, size, activity]}, empty if missing or outdated"""
+    try:
+        with open(snapshot_path, "rb") as f:
+            snapshot = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        return {}
+    return snapshot["files"]
+
+
+def _write_snapshot(snapshot_path: Path, files: dict) -> None:
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    # Written next to the snapshot then moved, concurrent readers never see
+    # a partial file
+    tmp_path = snapshot_path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps({"version": SNAPSHOT_VERSION, "files": files}))
+    os.replace(tmp_path, snapshot_path)
+
+
+@tracing.traced("load lci_catalog")
+def load_catalog(
+    catalog_dir: Path, cache_dir: Path | None = None, cache: bool = True
+) -> LciCatalog:
+    """Load the `catalog_dir/*/*.json` entries, from the snapshot of the catalog
+    in `cache_dir` (`settings.catalog_cache_dir` by default) for the files that
+    didn't change. Without `cache`, all the files are parsed.
+
+    Files are compared by modification time and size. The ones that changed
+    are read by a pool of threads, then the snapshot is updated."""
+    catalog_dir = Path(catalog_dir)
+    logger.debug(f"-> Loading lci_catalog {catalog_dir}")
+
+    stats = _scan(catalog_dir)
+
+    snapshot_path = (
+        _snapshot_path(catalog_dir, cache_dir or settings.catalog_cache_dir)
+        if cache
+        else None
+    )
+    cached = _load_snapshot(snapshot_path) if snapshot_path else {}
+
+    files = {}
+    changed = []
+    for name, stat in stats.items():
+        entry = cached.get(name)
+        if entry is not None and entry[:2] == stat:
+            files[name] = entry
+        else:
+            changed.append(name)
+
+    if changed:
+        logger.debug(f"-> Parsing {len(changed)} new or modified lci_catalog files")
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            activities = executor.map(
+                _read_activity, [catalog_dir / name for name in changed]
+            )
+            for name, activity in zip(changed, activities):
+                files[name] = [*stats[name], activity]
+
+    if snapshot_path and (changed or len(files) != len(cached)):
+        _write_snapshot(snapshot_path, files)
+
+    names = sorted(files)
+    return LciCatalog(
+        [files[name][2] for name in names], [catalog_dir / name for name in names]
+    )
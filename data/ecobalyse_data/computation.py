@@ -1,13 +1,12 @@
 #!/usr/bin/env python3
 
 import json
+import math
 import urllib.parse
+from pathlib import Path
 
 import bw2calc
-import bw2data
 import requests
-from bw2data import get_multilca_data_objs
-from bw2data.project import projects
 
 from common import (
     bytrigram,
@@ -17,15 +16,23 @@ from common import (
     spproject,
 )
 from common.infer_metadata import infer_transported_cooled
-from config import settings
-from ecobalyse_data.bw.search import cached_search_one
+from ecobalyse_data import tracing
+from ecobalyse_data.bw.engine import (
+    SOLVE_ERRORS,
+    ChunkError,
+    compute_scores,
+    iter_scores,
+)
+from ecobalyse_data.bw.impacts_cache import ImpactsCache
+from ecobalyse_data.bw.lock import resolve_bw_activity
+from ecobalyse_data.export.land_occupation import (
+    LAND_OCCUPATION_KEY,
+    LAND_OCCUPATION_METHOD,
+)
+from ecobalyse_data.impacts_matrix import raw_impacts_to_impacts
 from ecobalyse_data.logging import logger
 from models.process import ComputedBy, Impacts, Process
 
-# Init BW project
-projects.set_current(settings.bw.project)
-available_bw_databases = ", ".join(bw2data.databases)
-
 
 def check_duplicate_activities(activities: list[dict]) -> None:
     """
@@ -101,6 +108,132 @@ def compute_process_for_bw_activity(
     return process
 
 
+def iter_processes_for_bw_activities(
+    bw_activities,
+    main_method,
+    impacts_py,
+    impacts_json,
+    factors,
+    chunk_size: int = 100,
+    cpu_count: int = 1,
+):
+    """Batched version of `compute_process_for_bw_activity`: all the activities are
+    solved against the same factorized technosphere, chunks being dispatched to
+    `cpu_count` processes. Yields the list of processes of each chunk, in order,
+    as soon as it is solved.
+
+    The activities of a chunk that can't be solved are computed one by one, so
+    that only the failing activities end up without impacts."""
+    bw_activities_by_id = {bw_activity.id: bw_activity for bw_activity in bw_activities}
+    method_to_key = {tuple(m): k for k, m in impacts_py.items()}
+
+    for chunk_scores in iter_scores(
+        bw_activities,
+        [_production_sign(bw_activity) for bw_activity in bw_activities],
+        impacts_py.values(),
+        chunk_size=chunk_size,
+        cpu_count=cpu_count,
+    ):
+        if isinstance(chunk_scores, ChunkError):
+            logger.error(
+                f"-> Impossible to solve {len(chunk_scores.activity_ids)} activities together "
+                f"({chunk_scores.error!r}), computing them one by one"
+            )
+            yield [
+                _compute_process_alone(
+                    bw_activities_by_id[act_id],
+                    main_method,
+                    impacts_py,
+                    impacts_json,
+                    factors,
+                )
+                for act_id in chunk_scores.activity_ids
+            ]
+            continue
+
+        impacts = raw_impacts_to_impacts(
+            [
+                _raw_impacts(act_scores, method_to_key)
+                for act_scores in chunk_scores.values()
+            ],
+            list(impacts_py),
+            impacts_json,
+            factors,
+        )
+
+        yield [
+            activity_to_process_with_impacts(
+                # Same minimal eco_activity as `compute_process_for_bw_activity`
+                eco_activity={
+                    "source": bw_activity.get("database"),
+                    "displayName": bw_activity.get("name", "Unknown activity"),
+                    "id": "aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa",
+                },
+                impacts=activity_impacts,
+                computed_by=ComputedBy.brightway,
+                bw_activity=bw_activity,
+            )
+            for bw_activity, activity_impacts in zip(
+                (bw_activities_by_id[act_id] for act_id in chunk_scores), impacts
+            )
+        ]
+
+
+def _compute_process_alone(
+    bw_activity, main_method, impacts_py, impacts_json, factors
+) -> Process:
+    """`compute_process_for_bw_activity`, without impacts (as on a Brightway
+    error) when they can't be solved or aren't finite"""
+    try:
+        process = compute_process_for_bw_activity(
+            bw_activity, main_method, impacts_py, impacts_json, factors
+        )
+    except SOLVE_ERRORS as e:
+        logger.error(f"-> Impossible to compute impacts in Brightway for {bw_activity}")
+        logger.exception(e)
+    else:
+        if process.impacts is None or all(
+            math.isfinite(value) for value in process.impacts.model_dump().values()
+        ):
+            return process
+        logger.error(f"-> Non finite impacts in Brightway for {bw_activity}")
+
+    return activity_to_process_with_impacts(
+        # Same minimal eco_activity as `compute_process_for_bw_activity`
+        eco_activity={
+            "source": bw_activity.get("database"),
+            "displayName": bw_activity.get("name", "Unknown activity"),
+            "id": "aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa",
+        },
+        impacts=None,
+        computed_by=None,
+        bw_activity=bw_activity,
+    )
+
+
+def compute_processes_for_bw_activities(
+    bw_activities,
+    main_method,
+    impacts_py,
+    impacts_json,
+    factors,
+    cpu_count: int = 1,
+) -> list[Process]:
+    """All the processes of `iter_processes_for_bw_activities` at once"""
+    return [
+        process
+        for chunk_processes in iter_processes_for_bw_activities(
+            bw_activities,
+            main_method,
+            impacts_py,
+            impacts_json,
+            factors,
+            cpu_count=cpu_count,
+        )
+        for process in chunk_processes
+    ]
+
+
 def compute_process_for_activity(
     eco_activity,
     bw_activity,
@@ -148,12 +281,17 @@ def compute_process_for_activity(
     return process
 
 
+def _production_sign(bw_activity):
+    # Same default demand as `compute_brightway_impacts`
+    pa = bw_activity["production amount"]
+    return (pa > 0) - (pa < 0)
+
+
 def _demand_amount_for(eco_activity, bw_activity):
     is_packaging = "packaging" in eco_activity.get("categories", [])
     if is_packaging and eco_activity.get("unit") == "item":
         return bw_activity["production amount"]
-    pa = bw_activity["production amount"]
-    return (pa > 0) - (pa < 0)
+    return _production_sign(bw_activity)
 
 
 def compute_brightway_impacts_batch(
@@ -161,43 +299,38 @@ def compute_brightway_impacts_batch(
     demand_amounts,
     main_method,
     impacts_py,
-    chunk_size: int = 50,
+    chunk_size: int = 100,
+    cpu_count: int = 1,
 ) -> dict:
     """Compute raw (uncorrected, no subimpacts, no aggregate) brightway impacts for many
-    activities at once via MultiLCA. Returns {bw_activity.id: {impact_key: float}}.
+    activities at once. Returns {bw_activity.id: {impact_key: float}}.
 
     Matches compute_brightway_impacts numerically: each demand is {act.id: demand_amount}.
-    Chunked because MultiLCA's spsolve degrades past ~200 demands."""
-    method_config = {"impact_categories": [tuple(m) for m in impacts_py.values()]}
+    The technosphere is factorized once for the whole set of databases (see
+    `LCIEngine`), `chunk_size` only bounds the number of supply vectors in memory.
+    With `cpu_count` > 1 the chunks are solved by a pool of processes."""
     method_to_key = {tuple(m): k for k, m in impacts_py.items()}
 
-    out = {}
-    total = len(bw_activities)
-    for i in range(0, len(bw_activities), chunk_size):
-        chunk_acts = bw_activities[i : i + chunk_size]
-        chunk_amts = demand_amounts[i : i + chunk_size]
-        logger.info(
-            f"-> compute brightway impacts: chunk {i // chunk_size + 1}/"
-            f"{(total + chunk_size - 1) // chunk_size} ({len(chunk_acts)} activities)"
-        )
-        # Use the bw_activity id as the demand key (string).
-        demands = {str(a.id): {a.id: amt} for a, amt in zip(chunk_acts, chunk_amts)}
-        data_objs = get_multilca_data_objs(
-            functional_units=demands, method_config=method_config
-        )
-        mlca = bw2calc.MultiLCA(
-            demands=demands, method_config=method_config, data_objs=data_objs
-        )
-        mlca.lci()
-        mlca.lcia()
-        per_demand: dict = {a.id: {} for a in chunk_acts}
-        for (method_t, fu_name), ci in mlca.characterized_inventories.items():
-            act_id = int(fu_name)
-            per_demand[act_id][method_to_key[tuple(method_t)]] = float(
-                f"{ci.sum():.10g}"
-            )
-        out.update(per_demand)
-    return out
+    scores = compute_scores(
+        bw_activities,
+        demand_amounts,
+        impacts_py.values(),
+        chunk_size=chunk_size,
+        cpu_count=cpu_count,
+    )
+
+    return {
+        act_id: _raw_impacts(act_scores, method_to_key)
+        for act_id, act_scores in scores.items()
+    }
+
+
+def _raw_impacts(act_scores: dict, method_to_key: dict) -> dict:
+    """{impact_category: score} from the engine to {impact_key: rounded score}"""
+    return {
+        method_to_key[method]: float(f"{score:.10g}")
+        for method, score in act_scores.items()
+    }
 
 
 def compute_processes_for_activities(
@@ -206,7 +339,22 @@ def compute_processes_for_activities(
     impacts_py,
     impacts_json,
     factors,
+    cache_dir: Path | None = None,
+    cpu_count: int = 1,
+    lock: dict | None = None,
 ) -> list[Process]:
+    """Compute the processes of the lci_catalog activities.
+
+    If `cache_dir` is given, raw brightway impacts are read from (and written
+    to) an on-disk `ImpactsCache` so that only new or changed activities are
+    solved.
+
+    The land occupation is solved in the same pass, as an extra impact
+    category, and set on `Process.land_occupation` (for one unit of the
+    activity) so that the metadata export doesn't have to solve the LCI again.
+
+    Brightway activities are taken from the lci_catalog `lock` when possible,
+    and searched otherwise."""
     # Check for duplicate activities before processing
     check_duplicate_activities(activities)
 
@@ -217,32 +365,37 @@ def compute_processes_for_activities(
 
     computation_parameters = []
     logger.info("Preparing processes from activities")
-    for eco_activity in activities:
-        logger.debug(
-            f"-> [{index}/{total}] Preparing parameters for '{eco_activity.get('displayName')}'"
-        )
-        index += 1
-
-        bw_activity = {}
-
-        if not eco_activity.get(
-            "impacts"
-        ):  # Only need to search if impacts aren't hardcoded
-            bw_activity = cached_search_one(
-                eco_activity["source"],
-                eco_activity["activityName"],
-                location=eco_activity.get("location"),
+    with tracing.span("resolve brightway activities"):
+        for eco_activity in activities:
+            logger.debug(
+                f"-> [{index}/{total}] Preparing parameters for '{eco_activity.get('displayName')}'"
+            )
+            index += 1
+
+            bw_activity = {}
+
+            if not eco_activity.get(
+                "impacts"
+            ):  # Only need to search if impacts aren't hardcoded
+                bw_activity = resolve_bw_activity(eco_activity, lock)
+
+            computation_parameters.append(
+                # Parameters of the `get_process_with_impacts` function
+                (
+                    eco_activity,
+                    bw_activity,
+                    main_method,
+                    impacts_py,
+                    impacts_json,
+                    factors,
+                )
             )
 
-        computation_parameters.append(
-            # Parameters of the `get_process_with_impacts` function
-            (eco_activity, bw_activity, main_method, impacts_py, impacts_json, factors)
-        )
-
-    # Batch all non-hardcoded BW computations through MultiLCA.
-    # This is dramatically faster than per-activity LCA (~10x in benchmarks) because
-    # the technosphere matrix is built once per chunk and the linear system is solved
-    # for many demands and impact categories at once.
+    # Batch all non-hardcoded BW computations through the LCI engine.
+    # This is dramatically faster than per-activity LCA (~10x, measured by the
+    # `batched_speedup` of `bin/benchmark.py`) because the technosphere matrix is
+    # built and factorized once and the linear system is solved for many demands
+    # and impact categories at once.
     batch_indices = []
     batch_acts = []
     batch_amts = []
@@ -256,40 +409,83 @@ def compute_processes_for_activities(
         batch_acts.append(bw_activity)
         batch_amts.append(_demand_amount_for(eco_activity, bw_activity))
 
+    impact_categories = {**impacts_py, LAND_OCCUPATION_KEY: LAND_OCCUPATION_METHOD}
+    impacts_cache = ImpactsCache(cache_dir, impact_categories) if cache_dir else None
+
     batched_raw = {}
-    if batch_acts:
+    if impacts_cache:
+        with tracing.span("read impacts cache"):
+            to_compute = []
+            for act, amt in zip(batch_acts, batch_amts):
+                cached = impacts_cache.get(act, amt)
+                if cached is None:
+                    to_compute.append((act, amt))
+                else:
+                    batched_raw[act.id] = cached
+            impacts_cache.log_stats()
+    else:
+        to_compute = list(zip(batch_acts, batch_amts))
+
+    if to_compute:
         logger.info(
-            f"Computing brightway impacts in batch via MultiLCA ({len(batch_acts)} activities)"
+            f"Computing brightway impacts in batch ({len(to_compute)} activities)"
         )
-        batched_raw = compute_brightway_impacts_batch(
-            batch_acts, batch_amts, main_method, impacts_py
+        with tracing.span("solve impacts", activities=len(to_compute)):
+            computed_raw = compute_brightway_impacts_batch(
+                [act for act, _ in to_compute],
+                [amt for _, amt in to_compute],
+                main_method,
+                impact_categories,
+                cpu_count=cpu_count,
+            )
+        if impacts_cache:
+            with tracing.span("write impacts cache"):
+                for act, amt in to_compute:
+                    if act.id in computed_raw:
+                        impacts_cache.set(act, amt, computed_raw[act.id])
+        batched_raw.update(computed_raw)
+
+    batched_amts = dict(zip(batch_indices, batch_amts))
+
+    # Corrections and ECS aggregation for all the batched activities at once
+    solved_indices = [
+        idx for idx in batch_indices if computation_parameters[idx][1].id in batched_raw
+    ]
+    with tracing.span("corrections and aggregation"):
+        solved_impacts = dict(
+            zip(
+                solved_indices,
+                raw_impacts_to_impacts(
+                    [
+                        batched_raw[computation_parameters[idx][1].id]
+                        for idx in solved_indices
+                    ],
+                    list(impacts_py),
+                    impacts_json,
+                    factors,
+                ),
+            )
         )
 
-    batched_set = set(batch_indices)
-    corrections = {
-        k: v["correction"] for (k, v) in impacts_json.items() if "correction" in v
-    }
-
-    for idx, parameters in enumerate(computation_parameters):
-        if idx in batched_set:
-            eco_activity, bw_activity, _, _, _, _ = parameters
-            raw = batched_raw.get(bw_activity.id)
-            if raw is None:
-                # Fallback to per-activity if batch lost it for any reason.
+    with tracing.span("build processes"):
+        for idx, parameters in enumerate(computation_parameters):
+            if idx in solved_impacts:
+                eco_activity, bw_activity, _, _, _, _ = parameters
+                land_occupation = batched_raw[bw_activity.id].get(LAND_OCCUPATION_KEY)
+                demand_amount = batched_amts[idx]
+                process = activity_to_process_with_impacts(
+                    eco_activity=eco_activity,
+                    impacts=solved_impacts[idx],
+                    computed_by=ComputedBy.brightway,
+                    bw_activity=bw_activity,
+                    land_occupation=land_occupation / demand_amount
+                    if land_occupation is not None and demand_amount
+                    else None,
+                )
+                processes.append(process)
+            else:
+                # Hardcoded impacts, or fallback to per-activity if batch lost it for any reason.
                 processes.append(compute_process_for_activity(*parameters))
-                continue
-            impacts = dict(raw)
-            correct_process_impacts(impacts, corrections)
-            impacts["ecs"] = calculate_aggregate("ecs", impacts, factors)
-            process = activity_to_process_with_impacts(
-                eco_activity=eco_activity,
-                impacts=Impacts(**impacts),
-                computed_by=ComputedBy.brightway,
-                bw_activity=bw_activity,
-            )
-            processes.append(process)
-        else:
-            processes.append(compute_process_for_activity(*parameters))
 
     return processes
 
@@ -417,7 +613,11 @@ def get_mass_per_unit(eco_activity: dict, bw_activity) -> float | None:
 
 
 def activity_to_process_with_impacts(
-    eco_activity, impacts, computed_by: ComputedBy | None, bw_activity=None
+    eco_activity,
+    impacts,
+    computed_by: ComputedBy | None,
+    bw_activity=None,
+    land_occupation: float | None = None,
 ) -> Process:
     if bw_activity is None:
         bw_activity = {}
@@ -449,6 +649,7 @@ def activity_to_process_with_impacts(
         heat_mj=eco_activity.get("heatMJ", 0),
         id=eco_activity["id"],
         impacts=impacts,
+        land_occupation=land_occupation,
         location=bw_activity.get("location") or eco_activity.get("location") or None,
         mass_per_unit=get_mass_per_unit(eco_activity, bw_activity),
         scopes=eco_activity.get("scopes", []),
@@ -3,23 +3,28 @@ import os
 
 import orjson
 
-from common import activities_processes_sort_key, remove_detailed_impacts
-from common.export import export_json
+from common import activities_processes_sort_key, without_detailed_impacts
+from common.export import export_json_variants
 from common.infer_metadata import (
     infer_base_ingredient,
     infer_default_origin,
     infer_raw_to_cooked_ratio,
 )
-from ecobalyse_data.bw.search import cached_search_one
+from ecobalyse_data import tracing
+from ecobalyse_data.bw.lock import resolve_bw_activity
 from ecobalyse_data.export.complements import compute_forest_complement
-from ecobalyse_data.export.land_occupation import compute_land_occupation_batch
+from ecobalyse_data.export.land_occupation import (
+    compute_land_occupation_batch,
+    load_land_occupations,
+)
 from ecobalyse_data.export.utils import get_metadata_for_scope
-from ecobalyse_data.logging import logger
 from models.process import (
     GENERIC_SCOPES,
     IngredientMetadata,
     ProcessGeneric,
     Scope,
+    dump_all,
+    validate_all,
 )
 
 
@@ -93,6 +98,8 @@ def compute_processes_generic(
     ecosystemic_factors_path: str | None = None,
     feed_file_path: str | None = None,
     raw_to_transformed_file_path: str | None = None,
+    land_occupations_path: str | None = None,
+    lock: dict | None = None,
 ) -> list[dict]:
     """Compute ProcessGeneric dicts with metadata enrichment.
 
@@ -107,9 +114,10 @@ def compute_processes_generic(
             "Run 'just export-all' first to generate it."
         )
 
-    with open(processes_impacts_path, "rb") as f:
+    with tracing.span("load processes"), open(processes_impacts_path, "rb") as f:
         processes_list = orjson.loads(f.read())
     processes_by_id = {p["id"]: p for p in processes_list}
+    land_occupations = load_land_occupations(land_occupations_path)
 
     food_activities = [a for a in activities if get_metadata_for_scope(a, "food")]
     has_food = bool(food_activities)
@@ -133,7 +141,9 @@ def compute_processes_generic(
             load_ecosystemic_dic,
         )
 
-        food_activities = add_food_land_occupations(food_activities)
+        food_activities = add_food_land_occupations(
+            food_activities, land_occupations, cpu_count=cpu_count, lock=lock
+        )
         food_by_id = {a["id"]: a for a in food_activities}
         activities = [food_by_id.get(a["id"], a) for a in activities]
 
@@ -159,11 +169,23 @@ def compute_processes_generic(
                 break
 
     if activities_needing_land:
-        activities_needing_land = add_land_occupations(activities_needing_land)
+        activities_needing_land = add_land_occupations(
+            activities_needing_land, land_occupations, cpu_count=cpu_count, lock=lock
+        )
         land_by_id = {a["id"]: a for a in activities_needing_land}
         activities = [land_by_id.get(a["id"], a) for a in activities]
 
-    generic_dicts = []
+    return build_processes_generic(activities, processes_by_id, es_by_alias)
+
+
+@tracing.traced("build generic processes")
+def build_processes_generic(
+    activities: list[dict], processes_by_id: dict, es_by_alias: dict
+) -> list[dict]:
+    """ProcessGeneric dicts of `activities`, sorted, once their land occupations
+    are populated and their ecosystemic services computed (`es_by_alias`)"""
+    rows = []
+    variants_metadata = []
     for activity in activities:
         process = processes_by_id.get(activity["id"])
         if not process:
@@ -192,35 +214,41 @@ def compute_processes_generic(
                 else activity.get("landOccupation")
             )
 
-            entry = ProcessGeneric(
-                activity_name=process["activityName"],
-                alias=variant.get("alias"),
-                categories=process["categories"],
-                comment=process.get("comment", ""),
-                display_name=variant.get(
-                    "displayName", activity.get("displayName", "")
-                ),
-                elec_kwh=process.get("elecKwh", 0),
-                heat_mj=process.get("heatMJ", 0),
-                id=variant["id"],
-                impacts=process["impacts"],
-                land_occupation=land_occupation,
-                location=process.get("location"),
-                mass_per_unit=process.get("massPerUnit"),
-                metadata=None,
-                scopes=[
-                    Scope(s)
-                    for s in variant.get("scopes", [])
-                    if Scope(s) in GENERIC_SCOPES
-                ],
-                source=process["source"],
-                unit=process.get("unit"),
-                qty_variation_ratio=process.get("qtyVariationRatio", 1),
-                visible=variant.get("visible", True),
+            rows.append(
+                {
+                    "activity_name": process["activityName"],
+                    "alias": variant.get("alias"),
+                    "categories": process["categories"],
+                    "comment": process.get("comment", ""),
+                    "display_name": variant.get(
+                        "displayName", activity.get("displayName", "")
+                    ),
+                    "elec_kwh": process.get("elecKwh", 0),
+                    "heat_mj": process.get("heatMJ", 0),
+                    "id": variant["id"],
+                    "impacts": process["impacts"],
+                    "land_occupation": land_occupation,
+                    "location": process.get("location"),
+                    "mass_per_unit": process.get("massPerUnit"),
+                    "metadata": None,
+                    "scopes": [
+                        Scope(s)
+                        for s in variant.get("scopes", [])
+                        if Scope(s) in GENERIC_SCOPES
+                    ],
+                    "source": process["source"],
+                    "unit": process.get("unit"),
+                    "qty_variation_ratio": process.get("qtyVariationRatio", 1),
+                    "visible": variant.get("visible", True),
+                }
             )
-            entry_dict = entry.model_dump(by_alias=True)
-            entry_dict["metadata"] = metadata_out
-            generic_dicts.append(entry_dict)
+            variants_metadata.append(metadata_out)
+
+    # Validated and serialized in bulk: one pydantic-core call each instead of
+    # one per variant
+    generic_dicts = dump_all(ProcessGeneric, validate_all(ProcessGeneric, rows))
+    for entry_dict, metadata_out in zip(generic_dicts, variants_metadata):
+        entry_dict["metadata"] = metadata_out
 
     generic_dicts.sort(key=activities_processes_sort_key)
 
@@ -236,6 +264,8 @@ def activities_to_processes_generic_json(
     ecosystemic_factors_path: str | None = None,
     feed_file_path: str | None = None,
     raw_to_transformed_file_path: str | None = None,
+    land_occupations_path: str | None = None,
+    lock: dict | None = None,
 ) -> list[dict]:
     """Export object processes to ProcessGeneric json files."""
     generic_dicts = compute_processes_generic(
@@ -245,31 +275,56 @@ def activities_to_processes_generic_json(
         ecosystemic_factors_path=ecosystemic_factors_path,
         feed_file_path=feed_file_path,
         raw_to_transformed_file_path=raw_to_transformed_file_path,
+        land_occupations_path=land_occupations_path,
+        lock=lock,
     )
 
-    for path in impacts_output_paths:
-        export_json(generic_dicts, path)
-        logger.info(f"Exported {len(generic_dicts)} generic processes to {path}")
-
-    without_detailed_impacts = remove_detailed_impacts(generic_dicts)
-    for path in ecs_output_paths:
-        export_json(without_detailed_impacts, path)
-        logger.info(
-            f"Exported {len(without_detailed_impacts)} generic processes without detailed impacts to {path}"
-        )
+    write_processes_generic(generic_dicts, ecs_output_paths, impacts_output_paths)
 
     return generic_dicts
 
 
-def add_land_occupations(activities: list[dict]) -> list[dict]:
-    todo = [a for a in activities if "landOccupation" not in a]
-    bw_by_eco_id = {
-        a["id"]: cached_search_one(
-            a.get("source"), a.get("activityName"), location=a.get("location")
-        )
-        for a in todo
-    }
-    scores = compute_land_occupation_batch(list(bw_by_eco_id.values()))
+def write_processes_generic(
+    generic_dicts: list[dict],
+    ecs_output_paths: list[str],
+    impacts_output_paths: list[str],
+) -> None:
+    # All the files are written in a single pass over the processes
+    export_json_variants(
+        generic_dicts,
+        {
+            **{path: None for path in impacts_output_paths},
+            **{path: without_detailed_impacts for path in ecs_output_paths},
+        },
+    )
+
+
+@tracing.traced("add land occupations")
+def add_land_occupations(
+    activities: list[dict],
+    land_occupations: dict[str, float] | None = None,
+    cpu_count: int = 1,
+    lock: dict | None = None,
+) -> list[dict]:
+    """Populate `landOccupation` on activities, reusing the scores computed by
+    the `processes-legacy` export (`land_occupations`, by process id) and only
+    solving the LCI for the missing ones."""
+    if land_occupations is None:
+        land_occupations = {}
+
+    todo = []
+    for activity in activities:
+        if "landOccupation" in activity:
+            continue
+        if activity["id"] in land_occupations:
+            activity["landOccupation"] = land_occupations[activity["id"]]
+        else:
+            todo.append(activity)
+
+    bw_by_eco_id = {a["id"]: resolve_bw_activity(a, lock) for a in todo}
+    scores = compute_land_occupation_batch(
+        list(bw_by_eco_id.values()), cpu_count=cpu_count
+    )
     for activity in todo:
         activity["landOccupation"] = scores[bw_by_eco_id[activity["id"]].id]
     return activities
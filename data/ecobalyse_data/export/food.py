@@ -1,4 +1,5 @@
 import csv
+import functools
 import json
 from enum import StrEnum
 from pathlib import Path
@@ -7,12 +8,16 @@ from common.export import (
     export_json,
 )
 from common.infer_metadata import infer_base_ingredient, infer_raw_to_cooked_ratio
-from ecobalyse_data.bw.search import cached_search_one
+from ecobalyse_data import tracing
+from ecobalyse_data.bw.lock import resolve_bw_activity
 from ecobalyse_data.export import complements
-from ecobalyse_data.export.land_occupation import compute_land_occupation_batch
+from ecobalyse_data.export.land_occupation import (
+    compute_land_occupation_batch,
+    load_land_occupations,
+)
 from ecobalyse_data.export.utils import get_metadata_for_scope
 from ecobalyse_data.logging import logger
-from models.process import EcosystemicServices, Ingredient
+from models.process import EcosystemicServices, Ingredient, dump_all
 
 
 class Scenario(StrEnum):
@@ -85,6 +90,7 @@ def build_transformed_to_raw(raw_to_transformed):
     return transformed_to_raw
 
 
+@tracing.traced("compute ecosystemic services")
 def compute_es_for_ingredients(
     activities: list[dict],
     ecosystemic_factors,
@@ -166,10 +172,12 @@ def activities_to_ingredients_json(
     feed_file_path: str,
     raw_to_transformed_file_path: str,
     cpu_count: int,
-) -> list[dict]:
+    land_occupations_path: Path | None = None,
+    lock: dict | None = None,
+) -> None:
     ecosystemic_factors = load_ecosystemic_dic(ecosystemic_factors_path)
 
-    with open(processes_impacts_path, "r") as file:
+    with tracing.span("load processes"), open(processes_impacts_path, "r") as file:
         processes_list = json.load(file)
     processes_by_id = {p["id"]: p for p in processes_list}
 
@@ -179,7 +187,12 @@ def activities_to_ingredients_json(
     with open(raw_to_transformed_file_path, "r") as file:
         raw_to_transformed = json.load(file)
 
-    activities_with_land_occupation = add_land_occupations(activities)
+    activities_with_land_occupation = add_land_occupations(
+        activities,
+        load_land_occupations(land_occupations_path),
+        cpu_count=cpu_count,
+        lock=lock,
+    )
 
     ingredients = activities_to_ingredients(
         activities_with_land_occupation,
@@ -187,29 +200,40 @@ def activities_to_ingredients_json(
         ecosystemic_factors,
         feed_file_content,
         raw_to_transformed,
+        lock=lock,
     )
 
-    ingredients_dicts = [
-        ingredient.model_dump(by_alias=True) for ingredient in ingredients
-    ]
+    ingredients_to_json(ingredients, ingredients_path)
 
-    ingredients_dicts.sort(key=lambda x: x["id"])
 
-    export_json(ingredients_dicts, ingredients_path)
+def ingredients_to_json(ingredients: list[Ingredient], ingredients_path: Path):
+    ingredients.sort(key=lambda ingredient: ingredient.id)
 
-    logger.debug(
-        f"-> Exported {len(ingredients_dicts)} 'ingredients' to {ingredients_path}"
+    # Dumped by chunks while being written
+    export_json(
+        ingredients, ingredients_path, dump=functools.partial(dump_all, Ingredient)
     )
 
-    return ingredients_dicts
+    logger.debug(f"-> Exported {len(ingredients)} 'ingredients' to {ingredients_path}")
 
 
-def add_land_occupations(activities: list[dict]) -> list[dict]:
-    """Populate `landOccupation` on every food metadata block via MultiLCA.
+@tracing.traced("add land occupations")
+def add_land_occupations(
+    activities: list[dict],
+    land_occupations: dict[str, float] | None = None,
+    cpu_count: int = 1,
+    lock: dict | None = None,
+) -> list[dict]:
+    """Populate `landOccupation` on every food metadata block.
 
     Hardcoded values (e.g. `walnut-inshell-fr`) are preserved. One score per
     (source, activityName) is shared across all metadata entries of an activity.
+    Scores already computed by the `processes-legacy` export (`land_occupations`,
+    by process id) are reused, the LCI is only solved for the missing ones.
     """
+    if land_occupations is None:
+        land_occupations = {}
+
     needs_compute = []
     for activity in activities:
         for food_metadata in get_metadata_for_scope(activity, "food"):
@@ -218,19 +242,20 @@ def add_land_occupations(activities: list[dict]) -> list[dict]:
                     f"-> Not computing land occupation for {food_metadata['alias']}, value is already hardcoded"
                 )
                 continue
+            if activity["id"] in land_occupations:
+                food_metadata["landOccupation"] = land_occupations[activity["id"]]
+                continue
             needs_compute.append((activity, food_metadata))
 
     bw_by_eco_id = {}
     for activity, _ in needs_compute:
         eco_id = activity["id"]
         if eco_id not in bw_by_eco_id:
-            bw_by_eco_id[eco_id] = cached_search_one(
-                activity.get("source"),
-                activity.get("activityName"),
-                location=activity.get("location"),
-            )
+            bw_by_eco_id[eco_id] = resolve_bw_activity(activity, lock)
 
-    scores = compute_land_occupation_batch(list(bw_by_eco_id.values()))
+    scores = compute_land_occupation_batch(
+        list(bw_by_eco_id.values()), cpu_count=cpu_count
+    )
     for activity, food_metadata in needs_compute:
         food_metadata["landOccupation"] = scores[bw_by_eco_id[activity["id"]].id]
     return activities
@@ -242,6 +267,7 @@ def activities_to_ingredients(
     ecosystemic_factors,
     feed_file_content,
     raw_to_transformed,
+    lock: dict | None = None,
 ) -> list[Ingredient]:
     es_by_alias = compute_es_for_ingredients(
         activities,
@@ -253,20 +279,20 @@ def activities_to_ingredients(
 
     ingredients = []
     for activity in activities:
-        ingredients.extend(activity_to_ingredients(activity, es_by_alias))
+        bw_activity = resolve_bw_activity(activity, lock)
+        ingredients.extend(
+            activity_to_ingredients(activity, es_by_alias, bw_activity.get("location"))
+        )
 
     return ingredients
 
 
-def activity_to_ingredients(eco_activity: dict, es_by_alias: dict) -> list[Ingredient]:
+def activity_to_ingredients(
+    eco_activity: dict, es_by_alias: dict, location: str | None
+) -> list[Ingredient]:
+    """`location` is the location of the Brightway activity of `eco_activity`"""
     ingredients = []
 
-    bw_activity = cached_search_one(
-        eco_activity.get("source"),
-        eco_activity.get("activityName"),
-        location=eco_activity.get("location"),
-    )
-
     for food_metadata in get_metadata_for_scope(eco_activity, "food"):
         land_occupation = food_metadata.get("landOccupation")
 
@@ -300,7 +326,7 @@ def activity_to_ingredients(eco_activity: dict, es_by_alias: dict) -> list[Ingre
                     id=food_metadata["id"],
                     inedible_part=food_metadata["inediblePart"],
                     land_occupation=land_occupation,
-                    location=bw_activity.get("location"),
+                    location=location,
                     name=food_metadata["displayName"],
                     raw_to_cooked_ratio=infer_raw_to_cooked_ratio(
                         food_metadata.get("rawToCookedRatio"),
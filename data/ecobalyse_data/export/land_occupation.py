@@ -1,6 +1,8 @@
-import bw2calc
-from bw2data import get_multilca_data_objs
+import os
 
+import orjson
+
+from ecobalyse_data.bw.engine import compute_scores
 from ecobalyse_data.logging import logger
 
 LAND_OCCUPATION_METHOD: tuple[str, str, str] = (
@@ -8,34 +10,38 @@ LAND_OCCUPATION_METHOD: tuple[str, str, str] = (
     "resource",
     "land occupation",
 )
+# Key of the land occupation among the impact categories solved by
+# `compute_processes_for_activities`
+LAND_OCCUPATION_KEY = "landOccupation"
 
 
 def compute_land_occupation_batch(
-    bw_activities, chunk_size: int = 200
+    bw_activities, chunk_size: int = 200, cpu_count: int = 1
 ) -> dict[int, float]:
-    """Return {bw_activity.id: land_occupation_score} via a chunked MultiLCA."""
+    """Return {bw_activity.id: land_occupation_score} via the LCI engine."""
     unique = list({a.id: a for a in bw_activities}.values())
     if not unique:
         return {}
 
-    method_config = {"impact_categories": [LAND_OCCUPATION_METHOD]}
-    out: dict[int, float] = {}
-    total = len(unique)
-    for i in range(0, total, chunk_size):
-        chunk = unique[i : i + chunk_size]
-        logger.info(
-            f"-> land occupation: chunk {i // chunk_size + 1}/"
-            f"{(total + chunk_size - 1) // chunk_size} ({len(chunk)} activities)"
-        )
-        demands = {str(a.id): {a.id: 1} for a in chunk}
-        data_objs = get_multilca_data_objs(
-            functional_units=demands, method_config=method_config
-        )
-        mlca = bw2calc.MultiLCA(
-            demands=demands, method_config=method_config, data_objs=data_objs
-        )
-        mlca.lci()
-        mlca.lcia()
-        for (_method_t, fu_name), ci in mlca.characterized_inventories.items():
-            out[int(fu_name)] = float(ci.sum())
-    return out
+    logger.info(f"-> Computing land occupation for {len(unique)} activities")
+    scores = compute_scores(
+        unique,
+        [1] * len(unique),
+        [LAND_OCCUPATION_METHOD],
+        chunk_size=chunk_size,
+        cpu_count=cpu_count,
+    )
+    return {
+        act_id: act_scores[LAND_OCCUPATION_METHOD]
+        for act_id, act_scores in scores.items()
+    }
+
+
+def load_land_occupations(land_occupations_path) -> dict[str, float]:
+    """Load the land occupations persisted by the `processes-legacy` export,
+    {process id: land occupation}. Returns an empty dict if there is none."""
+    if land_occupations_path is None or not os.path.exists(land_occupations_path):
+        return {}
+
+    with open(land_occupations_path, "rb") as f:
+        return orjson.loads(f.read())
@@ -0,0 +1,156 @@
+"""Pipeline mode of the metadata export (`export.py metadata --pipeline`).
+
+The food and generic scopes share most of their inputs: the processes impacts,
+the land occupation of the food ingredients and their ecosystemic services.
+They are computed once, in the main process (the only one using Brightway), then
+the files of each scope are built and written by parallel workers.
+"""
+
+import concurrent.futures
+import json
+import os
+from pathlib import Path
+
+import orjson
+
+from ecobalyse_data import tracing
+from ecobalyse_data.bw.lock import resolve_bw_activity
+from ecobalyse_data.export import export_generic, food, textile
+from ecobalyse_data.export.land_occupation import load_land_occupations
+from ecobalyse_data.export.utils import get_metadata_for_scope
+from ecobalyse_data.logging import logger
+
+
+def compute_shared_inputs(
+    food_activities: list[dict],
+    generic_activities: list[dict],
+    processes_impacts_path: Path,
+    ecosystemic_factors_path: Path,
+    feed_file_path: Path,
+    raw_to_transformed_file_path: Path,
+    cpu_count: int = 1,
+    land_occupations_path: Path | None = None,
+    lock: dict | None = None,
+) -> dict:
+    """Populate the land occupations of the food ingredients (`food_activities`)
+    and of the generic processes (`generic_activities`), in place, and compute
+    what their writers need.
+
+    Returns `processes_by_id`, the ecosystemic services by alias (`es_by_alias`)
+    and the Brightway location of each food ingredient (`locations`)."""
+    if not os.path.exists(processes_impacts_path):
+        raise FileNotFoundError(
+            f"{processes_impacts_path} not found. "
+            "Run 'just export-all' first to generate it."
+        )
+
+    with tracing.span("load processes"), open(processes_impacts_path, "rb") as f:
+        processes_by_id = {p["id"]: p for p in orjson.loads(f.read())}
+    land_occupations = load_land_occupations(land_occupations_path)
+
+    # Most ingredients are both food ingredients and generic processes: their
+    # land occupation and their ecosystemic services are only computed once
+    with_food_metadata = {
+        a["id"]: a
+        for a in [*food_activities, *generic_activities]
+        if get_metadata_for_scope(a, "food")
+    }
+    activities_with_food = food.add_land_occupations(
+        list(with_food_metadata.values()),
+        land_occupations,
+        cpu_count=cpu_count,
+        lock=lock,
+    )
+
+    es_by_alias = {}
+    if activities_with_food:
+        with open(feed_file_path, "r") as f:
+            feed_file_content = json.load(f)
+        with open(raw_to_transformed_file_path, "r") as f:
+            raw_to_transformed = json.load(f)
+        es_by_alias = food.compute_es_for_ingredients(
+            activities_with_food,
+            food.load_ecosystemic_dic(ecosystemic_factors_path),
+            feed_file_content,
+            raw_to_transformed,
+            processes_by_id,
+        )
+
+    export_generic.add_land_occupations(
+        [
+            a
+            for a in generic_activities
+            if any("forestManagement" in m for m in a.get("metadata", []))
+        ],
+        land_occupations,
+        cpu_count=cpu_count,
+        lock=lock,
+    )
+
+    # The workers don't have access to the Brightway project
+    with tracing.span("resolve locations"):
+        locations = {
+            a["id"]: resolve_bw_activity(a, lock).get("location")
+            for a in food_activities
+        }
+
+    return {
+        "processes_by_id": processes_by_id,
+        "es_by_alias": es_by_alias,
+        "locations": locations,
+    }
+
+
+def write_materials(activities: list[dict], materials_path: Path) -> None:
+    textile.activities_to_materials_json(activities, materials_path)
+
+
+def write_ingredients(
+    activities: list[dict], es_by_alias: dict, locations: dict, ingredients_path: Path
+) -> None:
+    ingredients = [
+        ingredient
+        for activity in activities
+        for ingredient in food.activity_to_ingredients(
+            activity, es_by_alias, locations[activity["id"]]
+        )
+    ]
+    food.ingredients_to_json(ingredients, ingredients_path)
+
+
+def write_processes_generic(
+    activities: list[dict],
+    processes_by_id: dict,
+    es_by_alias: dict,
+    ecs_output_paths: list[Path],
+    impacts_output_paths: list[Path],
+) -> None:
+    generic_dicts = export_generic.build_processes_generic(
+        activities, processes_by_id, es_by_alias
+    )
+    export_generic.write_processes_generic(
+        generic_dicts, ecs_output_paths, impacts_output_paths
+    )
+
+
+def run_writers(writers: list[tuple], cpu_count: int = 1) -> None:
+    """Run the `(writer, kwargs)` of `writers`, in up to `cpu_count` workers.
+
+    The spans recorded by the workers are not part of the trace, only the time
+    spent waiting for them is."""
+    if cpu_count <= 1 or len(writers) <= 1:
+        for writer, kwargs in writers:
+            writer(**kwargs)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=min(cpu_count, len(writers))
+    ) as executor:
+        futures = {
+            executor.submit(writer, **kwargs): writer.__name__
+            for writer, kwargs in writers
+        }
+        for future in concurrent.futures.as_completed(futures):
+            # Raise the exception of a failed writer
+            future.result()
+            logger.debug(f"-> {futures[future]} done")
@@ -1,18 +1,23 @@
 from pathlib import Path
 
+import orjson
+
 from common import (
     get_normalization_weighting_factors,
 )
 from common.export import (
-    IMPACTS_JSON,
     display_changes_from_json,
     export_processes_to_dir,
+    get_impacts_json,
 )
 from common.impacts import impacts as impacts_py
 from common.impacts import main_method
+from config import DATA_ROOT_DIR, settings
+from ecobalyse_data import tracing
 from ecobalyse_data.computation import compute_processes_for_activities
+from ecobalyse_data.export.land_occupation import load_land_occupations
 from ecobalyse_data.logging import logger
-from models.process import Process, Scope
+from models.process import Process, Scope, dump_all
 
 
 def activities_to_processes(
@@ -24,39 +29,82 @@ def activities_to_processes(
     display_changes: bool = True,
     merge: bool = False,
     scopes: list[Scope] | None = None,
+    cache_dir: Path | None = None,
+    cpu_count: int = 1,
+    lock: dict | None = None,
 ):
-    factors = get_normalization_weighting_factors(IMPACTS_JSON)
-
-    processes: list[Process] = compute_processes_for_activities(
-        activities,
-        main_method,
-        impacts_py,
-        IMPACTS_JSON,
-        factors,
-    )
+    impacts_json = get_impacts_json()
+    factors = get_normalization_weighting_factors(impacts_json)
+
+    with tracing.span("compute processes", activities=len(activities)):
+        processes: list[Process] = compute_processes_for_activities(
+            activities,
+            main_method,
+            impacts_py,
+            impacts_json,
+            factors,
+            cache_dir=cache_dir,
+            cpu_count=cpu_count,
+            lock=lock,
+        )
 
     # Convert objects to dicts
-    dumped_processes = [
-        process.model_dump(by_alias=True, exclude={"bw_activity", "computed_by"})
-        for process in processes
-    ]
+    with tracing.span("dump processes"):
+        dumped_processes = dump_all(
+            Process,
+            processes,
+            exclude={"bw_activity", "computed_by", "land_occupation"},
+        )
 
     if display_changes:
-        display_changes_from_json(
-            processes_impacts_path=impacts_relative_file_path,
-            processes_corrected_impacts=dumped_processes,
-            # Compare by default with the first output dir
-            dir=dir_to_export_to,
+        with tracing.span("display changes"):
+            display_changes_from_json(
+                processes_impacts_path=impacts_relative_file_path,
+                processes_corrected_impacts=dumped_processes,
+                # Compare by default with the first output dir
+                dir=dir_to_export_to,
+            )
+
+    with tracing.span("export processes"):
+        export_processes_to_dir(
+            ecs_relative_file_path,
+            impacts_relative_file_path,
+            dumped_processes,
+            dir_to_export_to,
+            full_impacts_relative_file_path,
+            merge=merge,
+            scopes=scopes,
         )
 
-    export_processes_to_dir(
-        ecs_relative_file_path,
-        impacts_relative_file_path,
-        dumped_processes,
-        dir_to_export_to,
-        full_impacts_relative_file_path,
-        merge=merge,
-        scopes=scopes,
-    )
+    # Written next to the full impacts file, read back by the `metadata` export
+    with tracing.span("export land occupations"):
+        export_land_occupations(
+            processes,
+            DATA_ROOT_DIR / settings.export_dir / settings.land_occupations_file,
+            merge=merge,
+        )
 
     logger.info("Export completed successfully.")
+
+
+def export_land_occupations(processes: list[Process], path: Path, merge=False):
+    """Export {process id: land occupation} for the processes computed by Brightway.
+
+    When merging, land occupations of processes that were not recomputed are kept."""
+    land_occupations = load_land_occupations(path) if merge else {}
+    land_occupations.update(
+        {
+            str(process.id): process.land_occupation
+            for process in processes
+            if process.land_occupation is not None
+        }
+    )
+
+    # Not rounded like the other exports: these are inputs of further computations
+    logger.info(f"Exporting {len(land_occupations)} land occupations to {path}")
+    with open(path, "wb") as f:
+        f.write(
+            orjson.dumps(
+                land_occupations, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+            )
+        )
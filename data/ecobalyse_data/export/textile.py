@@ -1,25 +1,21 @@
+import functools
 from pathlib import Path
 
 from common.export import export_json
 from ecobalyse_data.export.utils import get_metadata_for_scope
 from ecobalyse_data.logging import logger
-from models.process import Cff, Material
+from models.process import Cff, Material, dump_all
 
 
-def activities_to_materials_json(
-    activities: list[dict], materials_path: Path
-) -> list[Material]:
+def activities_to_materials_json(activities: list[dict], materials_path: Path) -> None:
     materials = activities_to_materials_list(activities)
 
-    materials_dicts = [material.model_dump(by_alias=True) for material in materials]
+    materials.sort(key=lambda material: material.id)
 
-    materials_dicts.sort(key=lambda x: x["id"])
+    # Dumped by chunks while being written
+    export_json(materials, materials_path, dump=functools.partial(dump_all, Material))
 
-    export_json(materials_dicts, materials_path)
-
-    logger.info(f"-> Exported {len(materials_dicts)} materials to {materials_path}")
-
-    return materials_dicts
+    logger.info(f"-> Exported {len(materials)} materials to {materials_path}")
 
 
 def activities_to_materials_list(activities: list[dict]) -> list[Material]:
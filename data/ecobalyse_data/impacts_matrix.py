@@ -0,0 +1,88 @@
+import numpy as np
+
+from models.process import Impacts
+
+
+def build_impacts_transform(
+    impact_keys: list[str], impacts_json, normalization_factors
+) -> tuple[list[str], np.ndarray, np.ndarray]:
+    """Express `correct_process_impacts` and `calculate_aggregate("ecs", …)` as matrices.
+
+    Returns `(output_keys, correction_matrix, ecs_weights)` so that, for a
+    matrix of raw impacts (activities × `impact_keys`):
+
+    - `raw @ correction_matrix` are the corrected impacts (activities × `output_keys`)
+    - `corrected @ ecs_weights` are the ECS scores (in µPts)
+    """
+    corrections = {
+        k: v["correction"] for (k, v) in impacts_json.items() if "correction" in v
+    }
+
+    # Same semantics as `correct_process_impacts`: a corrected impact that is
+    # already computed is kept as is, and each sub-impact is consumed (removed
+    # from the impacts) by the first correction using it
+    remaining = list(impact_keys)
+    columns: dict[str, dict[str, float]] = {}
+    for impact_to_correct, correction in corrections.items():
+        if impact_to_correct in remaining:
+            continue
+        column = {}
+        for correction_item in correction:
+            sub_impact_name = correction_item["sub-impact"]
+            if sub_impact_name in remaining:
+                column[sub_impact_name] = correction_item["weighting"]
+                remaining.remove(sub_impact_name)
+        columns[impact_to_correct] = column
+
+    output_keys = remaining + list(columns)
+    input_index = {key: i for i, key in enumerate(impact_keys)}
+
+    correction_matrix = np.zeros((len(impact_keys), len(output_keys)))
+    for j, key in enumerate(remaining):
+        correction_matrix[input_index[key], j] = 1
+    for j, (key, column) in enumerate(columns.items(), start=len(remaining)):
+        for sub_impact_name, weighting in column.items():
+            correction_matrix[input_index[sub_impact_name], j] = weighting
+
+    normalizations = normalization_factors["ecs_normalizations"]
+    weightings = normalization_factors["ecs_weightings"]
+    missing = set(normalizations) - set(output_keys)
+    if missing:
+        raise ValueError(f"Impacts needed for the ECS are not computed: {missing}")
+
+    # We multiply by 10**6 to get the result in µPts
+    ecs_weights = np.array(
+        [
+            10**6 * weightings[key] / normalizations[key]
+            if key in normalizations
+            else 0
+            for key in output_keys
+        ]
+    )
+
+    return (output_keys, correction_matrix, ecs_weights)
+
+
+def raw_impacts_to_impacts(
+    raw_impacts: list[dict], impact_keys: list[str], impacts_json, normalization_factors
+) -> list[Impacts]:
+    """Correct and aggregate many raw brightway impacts dicts at once.
+
+    Equivalent to calling `correct_process_impacts` then `calculate_aggregate`
+    on each of them, with a single matrix product for all the activities."""
+    if not raw_impacts:
+        return []
+
+    output_keys, correction_matrix, ecs_weights = build_impacts_transform(
+        impact_keys, impacts_json, normalization_factors
+    )
+
+    raw = np.array([[impacts[key] for key in impact_keys] for impacts in raw_impacts])
+    corrected = raw @ correction_matrix
+    ecs = corrected @ ecs_weights
+
+    keys = [*output_keys, "ecs"]
+    return [
+        Impacts(**dict(zip(keys, row)))
+        for row in np.column_stack([corrected, ecs]).tolist()
+    ]
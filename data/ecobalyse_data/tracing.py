@@ -0,0 +1,124 @@
+import contextlib
+import functools
+import os
+import resource
+import sys
+import threading
+import time
+from pathlib import Path
+
+import orjson
+
+from ecobalyse_data.logging import logger
+
+# Recorded spans, in the Chrome trace event format. None when tracing is off,
+# so that `span` costs a single check in normal runs
+_events: list[dict] | None = None
+_origin_ns = 0
+
+
+def start_tracing() -> None:
+    global _events, _origin_ns
+    _events = []
+    _origin_ns = time.perf_counter_ns()
+
+
+def stop_tracing() -> list[dict]:
+    """Stop recording and return the recorded events"""
+    global _events
+    events, _events = _events or [], None
+    return events
+
+
+def _max_rss_mb(who) -> float:
+    max_rss = resource.getrusage(who).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _cpu_ms(start: float, end: float) -> float:
+    # Clamped: the times are floats and can round to a tiny negative difference
+    return max(0.0, 1000 * (end - start))
+
+
+@contextlib.contextmanager
+def span(name: str, **args):
+    """Record the wall time, the CPU time and the memory of a stage.
+
+    `peak_rss_mb` is the peak RSS of the process when the stage ends (it
+    includes the previous stages), `peak_rss_growth_mb` how much the stage
+    raised it. Spans can be nested, they are displayed as a flame graph by any
+    Chrome trace viewer (https://ui.perfetto.dev, chrome://tracing). CPU time
+    and memory of the pool workers are reported separately (`children_*`)."""
+    if _events is None:
+        yield
+        return
+
+    start_ns = time.perf_counter_ns()
+    start_times = os.times()
+    start_rss = _max_rss_mb(resource.RUSAGE_SELF)
+    start_children_rss = _max_rss_mb(resource.RUSAGE_CHILDREN)
+    try:
+        yield
+    finally:
+        end_ns = time.perf_counter_ns()
+        end_times = os.times()
+        end_rss = _max_rss_mb(resource.RUSAGE_SELF)
+        end_children_rss = _max_rss_mb(resource.RUSAGE_CHILDREN)
+        # The list is replaced by `stop_tracing`: don't record a span that
+        # outlived the trace
+        if _events is not None:
+            _events.append(
+                {
+                    "name": name,
+                    "cat": "ecobalyse",
+                    "ph": "X",
+                    "ts": (start_ns - _origin_ns) / 1000,
+                    "dur": (end_ns - start_ns) / 1000,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": {
+                        **args,
+                        "cpu_ms": _cpu_ms(start_times.user, end_times.user)
+                        + _cpu_ms(start_times.system, end_times.system),
+                        "children_cpu_ms": _cpu_ms(
+                            start_times.children_user, end_times.children_user
+                        )
+                        + _cpu_ms(
+                            start_times.children_system, end_times.children_system
+                        ),
+                        "peak_rss_mb": end_rss,
+                        "peak_rss_growth_mb": end_rss - start_rss,
+                        "children_peak_rss_mb": end_children_rss,
+                        "children_peak_rss_growth_mb": end_children_rss
+                        - start_children_rss,
+                    },
+                }
+            )
+
+
+def traced(name: str):
+    """Decorator version of `span`"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def write_trace(path: Path) -> None:
+    """Write the recorded spans to a Chrome trace file and stop tracing"""
+    events = stop_tracing()
+    logger.info(f"Exporting {len(events)} trace events to {path}")
+    with open(path, "wb") as f:
+        f.write(
+            orjson.dumps(
+                {"traceEvents": events, "displayTimeUnit": "ms"},
+                option=orjson.OPT_INDENT_2,
+            )
+        )
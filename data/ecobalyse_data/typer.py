@@ -1,7 +1,7 @@
 import bw2data
 import typer
 
-from common.export import IMPACTS_JSON
+from common.export import get_impacts_json
 from common.impacts import impacts as impacts_py
 from common.impacts import main_method
 
@@ -28,9 +28,10 @@ def bw_database_validation(value: str | None):
 
 def ecobalyse_impact_validation(values: list[str] | None):
     if values:
+        impacts_json = get_impacts_json()
         for value in values:
-            if value not in IMPACTS_JSON:
-                available_impacts = ", ".join(IMPACTS_JSON.keys())
+            if value not in impacts_json:
+                available_impacts = ", ".join(impacts_json.keys())
                 raise typer.BadParameter(
                     f"Impact not present in ecobalyse format. Available impacts are: {available_impacts}."
                 )
@@ -1,8 +1,16 @@
+import functools
 import uuid
 from enum import Enum
 from typing import Annotated, Any
 
-from pydantic import AfterValidator, AliasGenerator, BaseModel, ConfigDict, Field
+from pydantic import (
+    AfterValidator,
+    AliasGenerator,
+    BaseModel,
+    ConfigDict,
+    Field,
+    TypeAdapter,
+)
 from pydantic.alias_generators import to_camel, to_snake
 
 from common.export import (
@@ -187,6 +195,8 @@ class Process(EcoModel):
     heat_mj: Annotated[float, Field(serialization_alias="heatMJ")]
     id: uuid.UUID | None
     impacts: Impacts | None = None
+    # Not exported with the process, see `export_land_occupations`
+    land_occupation: float | None = None
     location: str | None
     scopes: list[Scope]
     source: str
@@ -194,3 +204,26 @@ class Process(EcoModel):
     activity_name: str
     unit: UnitEnum | None
     qty_variation_ratio: float
+
+
+@functools.cache
+def _list_adapter(model: type[BaseModel]) -> TypeAdapter:
+    # Built on first use: building the schema of a list of models isn't free
+    return TypeAdapter(list[model])
+
+
+def validate_all(model: type[BaseModel], rows: list[dict]) -> list:
+    """`[model(**row) for row in rows]`, validated by a single pydantic-core call"""
+    return _list_adapter(model).validate_python(rows)
+
+
+def dump_all(
+    model: type[BaseModel], instances: list, exclude: set[str] | None = None
+) -> list[dict]:
+    """`[i.model_dump(by_alias=True, exclude=exclude) for i in instances]`, serialized
+    by a single pydantic-core call instead of one call per instance"""
+    return _list_adapter(model).dump_python(
+        instances,
+        by_alias=True,
+        exclude={"__all__": exclude} if exclude else None,
+    )
@@ -49,6 +49,8 @@ def temp_bw_dir(tmp_path):
     )
     projects._is_temp_dir = True
 
+    settings.set("SEARCH_INDEX_DIR", tmp_path / "search-index")
+
 
 @pytest.fixture
 def forwast_json_icv():
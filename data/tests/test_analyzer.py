@@ -0,0 +1,41 @@
+import bw2calc
+import bw2data
+from pytest import approx
+
+from common.impacts import impacts as impacts_py
+from ecobalyse_data.bw.analyzer import contribution_tree, print_contribution_tree
+
+
+def test_contribution_tree(forwast):
+    activity = next(
+        a for a in bw2data.Database("forwast") if "process" in a.get("type")
+    )
+    impact_categories = {key: impacts_py[key] for key in ("cch", "acd", "ldu")}
+
+    tree = contribution_tree(activity, impact_categories, max_level=2, cutoff=0.05)
+
+    assert (tree["database"], tree["code"]) == (activity["database"], activity["code"])
+    assert tree["fractions"] == approx({key: 1 for key in impact_categories})
+
+    assert tree["children"]
+    child = tree["children"][0]
+    for key, method in impact_categories.items():
+        # The score of a component is the score of an LCA of its amount
+        lca = bw2calc.LCA(
+            {bw2data.get_activity((child["database"], child["code"])): child["amount"]},
+            method,
+        )
+        lca.lci()
+        lca.lcia()
+        assert child["scores"][key] == approx(lca.score)
+
+    # A component is kept only above the cutoff for at least one impact
+    def check(node, level):
+        assert level <= 2
+        for child in node["children"]:
+            assert any(abs(child["fractions"][key]) > 0.05 for key in impact_categories)
+            check(child, level + 1)
+
+    check(tree, 0)
+
+    print_contribution_tree(tree, ["cch"])
@@ -0,0 +1,27 @@
+import bw2data
+
+from ecobalyse_data.benchmark import create_synthetic_databases, run_benchmarks
+
+
+def test_benchmark_synthetic_database(temp_bw_dir, tmp_path):
+    bw2data.projects.set_current("benchmark")
+    eco_activities = create_synthetic_databases(
+        activities=30, exchanges=3, flows=10, characterization_factors=5
+    )
+    assert len(eco_activities) == 30
+
+    results = run_benchmarks(eco_activities, tmp_path, repeat=1, sample=3)
+
+    assert set(results) >= {
+        "search",
+        "lci",
+        "lcia",
+        "corrections",
+        "compute_processes_for_activities",
+        "compute_land_occupation_batch",
+        "compute_processes_generic",
+        "export",
+        "batched_speedup",
+    }
+    for stage, timings in results.items():
+        assert timings["min"] > 0, stage
@@ -1,7 +1,10 @@
 import tempfile
+from pathlib import Path
 
 import bw2data
 import orjson
+import pytest
+import typer
 from pytest import approx
 
 from bin import export_bw_db, export_lcia, lcia_info
@@ -16,7 +19,7 @@ def test_export_icv(mocker):
 
     with tempfile.NamedTemporaryFile(delete=False) as fp:
         # Just check that the main function runs as expected
-        export_lcia.main(output_file=fp, cpu_count=1, max=1)
+        export_lcia.main(output_file=Path(fp.name), cpu_count=1, max=1)
         fp.close()
 
         # And that it creates an empty file
@@ -31,7 +34,7 @@ def test_export_icv_forwast(forwast, forwast_json_icv):
         # Just check that the main function runs as expected
         export_lcia.main(
             project=settings.bw.project,
-            output_file=fp,
+            output_file=Path(fp.name),
             activity_name="_22 Vegetable and animal oils and fats, EU27",
             location="GLO",
             db=["forwast"],
@@ -55,6 +58,28 @@ def test_export_icv_forwast(forwast, forwast_json_icv):
             assert val_computed == val_expected
 
 
+def test_export_icv_ndjson_resume(forwast, tmp_path):
+    output_file = tmp_path / "impacts.ndjson"
+    kwargs = {
+        "project": settings.bw.project,
+        "output_file": output_file,
+        "max": 2,
+        "db": ["forwast"],
+        "multiprocessing": False,
+        "output_format": export_lcia.OutputFormat.ndjson,
+    }
+    export_lcia.main(**kwargs)
+    lines = output_file.read_bytes().splitlines()
+    assert len(lines) == 2
+
+    # Simulate a crash: the second process is only partially written
+    output_file.write_bytes(lines[0] + b"\n" + lines[1][:10])
+    export_lcia.main(**kwargs, resume=True)
+
+    records = [orjson.loads(line) for line in output_file.read_bytes().splitlines()]
+    assert [orjson.loads(line) for line in lines] == records
+
+
 def test_export_bw_db(mocker):
     # Just check that the imports are ok
 
@@ -81,3 +106,57 @@ def test_lcia_info(forwast, forwast_json_icv):
     forwast_impacts = forwast_json_icv["forwast"][0]["impacts"]
     assert impacts[0] == ComputedBy.brightway
     assert impacts[1].model_dump() == approx(Impacts(**forwast_impacts).model_dump())
+
+
+def test_compare_processes(tmp_path):
+    def process(name, cch, ecs, source="forwast"):
+        return {
+            "displayName": name,
+            "impacts": {"cch": cch, "ecs": ecs, "ldu": 0},
+            "source": source,
+        }
+
+    first = [process("a", 1, 10), process("b", 2, 20), process("removed", 1, 1)]
+    second = [
+        process("a", 1.5, 10.001),
+        process("b", 1, 30, "other"),
+        process("new", 1, 1),
+    ]
+    with open(tmp_path / "first.json", "wb") as f:
+        f.write(orjson.dumps(first))
+    with open(tmp_path / "second.json", "wb") as f:
+        f.write(orjson.dumps(second))
+
+    for output_format in [lcia_info.ChangesFormat.json, lcia_info.ChangesFormat.csv]:
+        with (
+            open(tmp_path / "first.json") as first_file,
+            open(tmp_path / "second.json") as second_file,
+        ):
+            lcia_info.compare_processes(
+                first_file,
+                second_file,
+                impact=None,
+                output_format=output_format,
+                output=tmp_path / "changes",
+            )
+
+        if output_format == lcia_info.ChangesFormat.json:
+            with open(tmp_path / "changes", "rb") as f:
+                changes = orjson.loads(f.read())
+            # Sorted by percent change, changes under 0.1% are ignored
+            assert [(c["name"], c["trg"], c["%diff"]) for c in changes] == [
+                ("b", "cch", -50.0),
+                ("a", "cch", 50.0),
+                ("b", "ecs", 50.0),
+            ]
+            assert changes[0]["DB change"] == "forwast\n-> other"
+        else:
+            with open(tmp_path / "changes") as f:
+                lines = f.read().splitlines()
+            assert lines[0] == "trg,name,%diff,from,to,DB change"
+            assert lines[1].startswith("cch,b,-50.0,2.0,1.0,")
+
+
+def test_export_icv_json_cannot_resume(tmp_path):
+    with pytest.raises(typer.BadParameter, match="ndjson"):
+        export_lcia.main(output_file=tmp_path / "impacts.json", resume=True)
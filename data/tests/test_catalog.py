@@ -0,0 +1,57 @@
+import os
+
+import orjson
+
+from config import TESTS_FIXTURE_DIR
+from ecobalyse_data import catalog
+from ecobalyse_data.catalog import load_catalog
+
+
+def write_entry(path, **entry):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(entry))
+
+
+def test_load_catalog(tmp_path, mocker):
+    catalog_dir = tmp_path / "lci_catalog"
+    cache_dir = tmp_path / "cache"
+    write_entry(
+        catalog_dir / "db" / "a.json",
+        id="a",
+        source="db",
+        scopes=["food"],
+        metadata=[{"alias": "a-fr"}, {"alias": "a-eu"}],
+    )
+    write_entry(catalog_dir / "db" / "b.json", id="b", source="db", scopes=["object"])
+    write_entry(catalog_dir / "other" / "c.json", id="c", source="other", scopes=[])
+
+    loaded = load_catalog(catalog_dir, cache_dir)
+    assert [a["id"] for a in loaded] == ["a", "b", "c"]
+    assert [p.stem for p in loaded.paths] == ["a", "b", "c"]
+    assert loaded.by_id["b"]["source"] == "db"
+    assert loaded.by_alias["a-eu"]["id"] == "a"
+    assert [a["id"] for a in loaded.by_source["db"]] == ["a", "b"]
+    assert [a["id"] for a in loaded.by_scope["food"]] == ["a"]
+
+    # Unchanged files are read from the snapshot
+    read_activity = mocker.spy(catalog, "_read_activity")
+    assert load_catalog(catalog_dir, cache_dir).activities == loaded.activities
+    assert read_activity.call_count == 0
+
+    # Only the modified files are parsed again
+    write_entry(catalog_dir / "db" / "b.json", id="b", source="db", scopes=["veli"])
+    os.remove(catalog_dir / "other" / "c.json")
+    reloaded = load_catalog(catalog_dir, cache_dir)
+    assert read_activity.call_count == 1
+    assert [a["id"] for a in reloaded] == ["a", "b"]
+    assert reloaded.by_id["b"]["scopes"] == ["veli"]
+
+    assert load_catalog(catalog_dir, cache=False).activities == reloaded.activities
+
+
+def test_load_catalog_fixtures(tmp_path):
+    catalog_dir = TESTS_FIXTURE_DIR / "lci_catalog"
+    loaded = load_catalog(catalog_dir, tmp_path)
+    assert len(loaded) == len(list(catalog_dir.glob("*/*.json")))
+    assert load_catalog(catalog_dir, tmp_path).activities == loaded.activities
@@ -0,0 +1,94 @@
+import threading
+
+import bw2data
+import pytest
+from pytest import approx
+
+from common import get_normalization_weighting_factors
+from common.export import IMPACTS_JSON
+from common.impacts import impacts as impacts_py
+from common.impacts import main_method
+from config import settings
+from ecobalyse_data.bw.daemon import (
+    BrightwayDaemon,
+    DaemonError,
+    dump_process,
+    get_client,
+)
+from ecobalyse_data.computation import compute_process_for_bw_activity
+
+
+@pytest.fixture
+def daemon(forwast, tmp_path):
+    socket_path = tmp_path / "bw.sock"
+    with BrightwayDaemon(socket_path, settings.bw.project) as server:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        yield socket_path
+        server.shutdown()
+        thread.join()
+
+    assert not socket_path.exists()
+
+
+def test_no_daemon(forwast, tmp_path):
+    assert get_client(tmp_path / "missing.sock") is None
+
+
+def test_daemon_impacts(daemon):
+    activity = next(
+        a for a in bw2data.Database("forwast") if "process" in a.get("type")
+    )
+    client = get_client(daemon)
+    assert client is not None
+
+    # Twice, the second time against the warm engine
+    for _ in range(2):
+        process = client.request(
+            "impacts", database=activity["database"], code=activity["code"]
+        )
+        expected = dump_process(
+            compute_process_for_bw_activity(
+                activity,
+                main_method,
+                impacts_py,
+                IMPACTS_JSON,
+                get_normalization_weighting_factors(IMPACTS_JSON),
+            )
+        )
+
+        assert process["impacts"] == approx(expected.pop("impacts"))
+        process.pop("impacts")
+        assert process == expected
+
+    # Many activities in a single request
+    activities = [a for a in bw2data.Database("forwast") if "process" in a.get("type")][
+        :3
+    ]
+    processes = client.request(
+        "processes", activities=[[a["database"], a["code"]] for a in activities]
+    )
+    assert [p["displayName"] for p in processes] == [a["name"] for a in activities]
+    assert processes[0]["impacts"] == approx(
+        client.request("impacts", database=activity["database"], code=activity["code"])[
+            "impacts"
+        ]
+    )
+
+    assert (
+        client.request(
+            "land_occupation", database=activity["database"], code=activity["code"]
+        )
+        >= 0
+    )
+
+
+def test_daemon_errors(daemon):
+    client = get_client(daemon)
+    with pytest.raises(DaemonError, match="Unknown command"):
+        client.request("unknown")
+    with pytest.raises(DaemonError, match="UnknownObject"):
+        client.request("impacts", database="forwast", code="missing")
+
+    # The daemon still answers after an error
+    assert client.request("ping")["project"] == settings.bw.project
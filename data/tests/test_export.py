@@ -14,6 +14,7 @@ def test_export_processes(forwast, tmp_path, processes_impacts_json):
     export.processes_legacy(
         scopes=None,
         verbose=False,
+        cache_dir=tmp_path / "impacts-cache",
         root_dir=TESTS_FIXTURE_DIR,
     )
 
@@ -25,6 +26,12 @@ def test_export_processes(forwast, tmp_path, processes_impacts_json):
         )
         assert json_data == processes_impacts_json
 
+    # Land occupations are solved along the impacts, for the metadata export
+    with open(tmp_path / settings.land_occupations_file, "rb") as f:
+        land_occupations = orjson.loads(f.read())
+        assert land_occupations
+        assert all(isinstance(v, float) for v in land_occupations.values())
+
 
 def test_export_ingredients(
     forwast, tmp_path, ingredients_food_json, processes_impacts_full_json
@@ -91,3 +98,37 @@ def test_export_processes_generic(
             TESTS_FIXTURE_DIR / "processes_generic_impacts_output.json",
         )
         assert json_data == processes_generic_impacts_json
+
+
+def test_export_metadata_pipeline(
+    forwast,
+    tmp_path,
+    processes_impacts_full_json,
+    ingredients_food_json,
+    materials_textile_json,
+    processes_generic_impacts_json,
+):
+    settings.set("FRONTEND_DATA_DIR", str(tmp_path))
+    settings.set("EXPORT_DIR", str(tmp_path))
+    (tmp_path / "food").mkdir()
+    (tmp_path / "textile").mkdir()
+
+    export_json(
+        processes_impacts_full_json,
+        tmp_path / settings.processes_legacy_impacts_full_file,
+    )
+
+    # Same files as the scopes exported one after the other
+    export.metadata(
+        scopes=None,
+        root_dir=TESTS_FIXTURE_DIR,
+        cpu_count=2,
+        pipeline=True,
+    )
+
+    with open(tmp_path / "food" / "ingredients.json", "rb") as f:
+        assert orjson.loads(f.read()) == ingredients_food_json
+    with open(tmp_path / "textile" / "materials.json", "rb") as f:
+        assert orjson.loads(f.read()) == materials_textile_json
+    with open(tmp_path / settings.processes_generic_impacts_file, "rb") as f:
+        assert orjson.loads(f.read()) == processes_generic_impacts_json
@@ -0,0 +1,35 @@
+import bw2data
+
+from common.impacts import impacts as impacts_py
+from ecobalyse_data.bw.impacts_cache import ImpactsCache
+
+
+def test_impacts_cache(forwast, tmp_path):
+    activity = next(iter(bw2data.Database("forwast")))
+    impacts = {"acd": 0.1, "cch": 2.5}
+
+    cache = ImpactsCache(tmp_path, impacts_py)
+    assert cache.get(activity, 1) is None
+
+    cache.set(activity, 1, impacts)
+
+    # A new cache instance (a new export) reads what the previous one wrote
+    cache = ImpactsCache(tmp_path, impacts_py)
+    assert cache.get(activity, 1) == impacts
+    # The demand amount is part of the key
+    assert cache.get(activity, 0.22) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_impacts_cache_characterization_factors(forwast, tmp_path):
+    activity = next(iter(bw2data.Database("forwast")))
+    method = bw2data.Method(("test", "impacts cache"))
+    method.write([(activity.key, 1.0)])
+    impacts = {"test": 1.0}
+
+    ImpactsCache(tmp_path, {"test": method.name}).set(activity, 1, impacts)
+    assert ImpactsCache(tmp_path, {"test": method.name}).get(activity, 1) == impacts
+
+    # Characterization factors imported again, with other values
+    method.write([(activity.key, 2.0)])
+    assert ImpactsCache(tmp_path, {"test": method.name}).get(activity, 1) is None
@@ -0,0 +1,40 @@
+import random
+
+from pytest import approx
+
+from common import (
+    calculate_aggregate,
+    correct_process_impacts,
+    get_normalization_weighting_factors,
+)
+from common.export import IMPACTS_JSON
+from common.impacts import impacts as impacts_py
+from ecobalyse_data.impacts_matrix import raw_impacts_to_impacts
+from models.process import Impacts
+
+
+def test_raw_impacts_to_impacts():
+    factors = get_normalization_weighting_factors(IMPACTS_JSON)
+    corrections = {
+        k: v["correction"] for (k, v) in IMPACTS_JSON.items() if "correction" in v
+    }
+
+    random.seed(42)
+    raw_impacts = [
+        {key: random.uniform(-1, 10) for key in impacts_py} for _ in range(10)
+    ]
+
+    expected = []
+    for raw in raw_impacts:
+        impacts = dict(raw)
+        correct_process_impacts(impacts, corrections)
+        impacts["ecs"] = calculate_aggregate("ecs", impacts, factors)
+        expected.append(Impacts(**impacts).model_dump())
+
+    computed = raw_impacts_to_impacts(
+        raw_impacts, list(impacts_py), IMPACTS_JSON, factors
+    )
+
+    assert len(computed) == len(expected)
+    for impacts, expected_impacts in zip(computed, expected):
+        assert impacts.model_dump() == approx(expected_impacts)
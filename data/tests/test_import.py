@@ -0,0 +1,45 @@
+import pytest
+from bw2io.errors import StrategyError
+
+from common.import_ import link_technosphere_cascade
+
+
+def exchange(name, location=None, **kwargs):
+    return {"name": name, "unit": "kg", "location": location, **kwargs}
+
+
+def test_link_technosphere_cascade():
+    db = [
+        {"database": "db", "code": "a", **exchange("a", "FR")},
+        {"database": "db", "code": "b-fr", **exchange("b", "FR")},
+        {"database": "db", "code": "b-glo", **exchange("b", "GLO")},
+        {
+            "database": "db",
+            "code": "c",
+            **exchange("c"),
+            "exchanges": [
+                # Linked by name, unit and location
+                exchange("b", "GLO", type="technosphere"),
+                # Then by name and unit
+                exchange("a", "GLO", type="technosphere"),
+                # Already linked
+                exchange("a", "FR", type="technosphere", input=("other", "x")),
+                exchange("a", "FR", type="biosphere"),
+                exchange("unknown", type="technosphere"),
+            ],
+        },
+    ]
+
+    exchanges = link_technosphere_cascade(db)[3]["exchanges"]
+    assert [exc.get("input") for exc in exchanges] == [
+        ("db", "b-glo"),
+        ("db", "a"),
+        ("other", "x"),
+        None,
+        None,
+    ]
+
+    # Two activities with the same name and unit
+    db[3]["exchanges"] = [exchange("b", "IT", type="technosphere")]
+    with pytest.raises(StrategyError):
+        link_technosphere_cascade(db)
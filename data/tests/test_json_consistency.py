@@ -1,184 +1,198 @@
 #!/usr/bin/env python3
 """
 Consistency checks on json files.
-To add a new check define a new function and set it in the CHECKS dict
+To add a new check define a new function and set it in the CHECKS dict (or in
+CONTENT_CHECKS for the checks on the entire content of a file).
+
+Each file is loaded once, by its own worker process, and its checks share the
+indexes of its records (`Records`). A check returns the list of its violations,
+all of them are reported at the end.
 """
 
-import json
+import concurrent.futures
+import functools
+import os
 import re
 import sys
-import tempfile
 import uuid
-from collections import Counter
-from pathlib import Path
+from collections import Counter, defaultdict
+
+import orjson
 
-from config import DATA_ROOT_DIR, TESTS_FIXTURE_DIR
+from config import DATA_ROOT_DIR
+from ecobalyse_data.catalog import load_catalog
 from ecobalyse_data.export.food import Scenario, scenario
 from ecobalyse_data.export.utils import get_metadata_for_scope
 
 
-def duplicate_across_records(filename, content, key):
+class Records(list):
+    """The records of a json file, and the indexes shared by its checks"""
+
+    def __init__(self, filename: str, records: list[dict]):
+        super().__init__(records)
+        self.filename = filename
+        self._counts = {}
+
+    def counts(self, key: str) -> Counter:
+        """Occurrences of each value of `key` across the records"""
+        if key not in self._counts:
+            self._counts[key] = Counter(record[key] for record in self if key in record)
+        return self._counts[key]
+
+    def duplicates(self, key: str) -> list:
+        return [
+            value for value, count in self.counts(key).items() if count > 1 and value
+        ]
+
+    @functools.cached_property
+    def metadata_aliases(self) -> dict[str, list[str]]:
+        """'display name (metadata[scopes])' of each metadata entry, by alias"""
+        occurrences = defaultdict(list)
+        for record in self:
+            for meta in record.get("metadata") or []:
+                if meta.get("alias"):
+                    scopes_str = ",".join(meta.get("scopes", []))
+                    display_name = meta.get(
+                        "displayName", record.get("displayName", "unknown")
+                    )
+                    occurrences[meta["alias"]].append(
+                        f"{display_name} (metadata[{scopes_str}])"
+                    )
+        return occurrences
+
+
+def duplicate_across_records(records, key):
     """Duplicate check across all lci_catalog for `key`"
     ie check if alias `pineapple-default` is unique"""
-    values = [act[key] for act in content if key in act]
-    counter = Counter(values)
-    duplicates = [name for name, count in counter.items() if count > 1 and name]
+    duplicates = records.duplicates(key)
     if duplicates:
-        raise AssertionError(f"Duplicate {key} in {filename}: " + ", ".join(duplicates))
+        return [f"Duplicate {key} in {records.filename}: " + ", ".join(duplicates)]
+    return []
 
 
-def duplicate_within_value(filename, content, key):
+def duplicate_within_value(records, key):
     """Duplicate check for each lci_catalog inside a `key`
     ie check if  "categories": ["material","ingredient", "material"] has duplicates"""
-    for act in content:
+    errors = []
+    for act in records:
         counter = Counter(act[key])
         duplicates = [name for name, count in counter.items() if count > 1 and name]
         if duplicates:
-            raise AssertionError(
-                f"Duplicate {key} in {filename} in {act['alias']}: "
-                + ", ".join(duplicates)
+            errors.append(
+                f"Duplicate {key} in {records.filename} in "
+                f"{act.get('alias', act.get('displayName'))}: " + ", ".join(duplicates)
             )
+    return errors
 
 
-def duplicate_alias_in_metadata(filename, content):
+def duplicate_alias_in_metadata(records):
     "Duplicate alias check in metadata"
-    all_aliases = []
-
-    for activity in content:
-        # Collect aliases from metadata only (not top-level)
-        metadata = activity.get("metadata") or []
-        for meta in metadata:
-            if meta.get("alias"):
-                scopes_str = ",".join(meta.get("scopes", []))
-                all_aliases.append(
-                    (
-                        meta["alias"],
-                        meta.get(
-                            "displayName",
-                            activity.get("displayName", "unknown"),
-                        ),
-                        f"metadata[{scopes_str}]",
-                    )
-                )
-
-    # Check for duplicates
-    alias_values = [alias for alias, _, _ in all_aliases]
-    counter = Counter(alias_values)
-    duplicates = [alias for alias, count in counter.items() if count > 1 and alias]
-
-    if duplicates:
-        # Build detailed error message
-        error_lines = []
-        for dup_alias in duplicates:
-            occurrences = [
-                f"{display_name} ({location})"
-                for alias, display_name, location in all_aliases
-                if alias == dup_alias
-            ]
-            error_lines.append(f"  '{dup_alias}': {', '.join(occurrences)}")
-
-        raise AssertionError(
-            f"Duplicate aliases in metadata in {filename}:\n" + "\n".join(error_lines)
-        )
-
-
-def metadata_consistency(filename, activities):
+    error_lines = [
+        f"  '{alias}': {', '.join(occurrences)}"
+        for alias, occurrences in records.metadata_aliases.items()
+        if len(occurrences) > 1
+    ]
+    if error_lines:
+        return [
+            f"Duplicate aliases in metadata in {records.filename}:\n"
+            + "\n".join(error_lines)
+        ]
+    return []
+
+
+def metadata_consistency(records):
     """
     Check that metadata and scope are consistent in the lci_activity/* files.
     A metadata item can't reference a scope not in activity["scopes"]
     """
-    for activity in activities:
+    errors = []
+    for activity in records:
         metadata = activity.get("metadata") or []
         activity_scopes = set(activity["scopes"])
         for item in metadata:
             metadata_scopes = set(item.get("scopes", []))
             if not metadata_scopes <= activity_scopes:
                 extra = metadata_scopes - activity_scopes
-                raise AssertionError(
-                    f"Inconsistent metadata-scopes for object {activity['displayName']} in {filename}: metadata item scopes {extra} not in activity scopes {activity_scopes}"
+                errors.append(
+                    f"Inconsistent metadata-scopes for object {activity['displayName']} in {records.filename}: metadata item scopes {extra} not in activity scopes {activity_scopes}"
                 )
+    return errors
 
 
-def custom_source_consistency(filename, activities):
+def custom_source_consistency(records):
     """
     Check that source = "Ecobalyse_manual_lcia" if and only if impacts are present
     """
-    for activity in activities:
+    errors = []
+    for activity in records:
         source = activity["source"]
         display_name = activity["displayName"]
         if "impacts" in activity and source != "Ecobalyse_manual_lcia":
-            raise AssertionError(
+            errors.append(
                 f"Manual LCIA source inconsistency : activity {display_name} has hardcoded impacts but source is not 'Ecobalyse_manual_lcia' (source = {source})"
             )
         elif "impacts" not in activity and source == "Ecobalyse_manual_lcia":
-            raise AssertionError(
+            errors.append(
                 f"Manual LCIA source inconsistency : activity {display_name} has source = 'Ecobalyse_manual_lcia' but no hardcoded impacts"
             )
+    return errors
 
 
-def invalid_uuid(filename, content, key):
+def invalid_uuid(records, key):
     "Invalid UUID check"
     invalid_uuids = []
-    for obj in content:
+    for obj in records:
         try:
             uuid.UUID(obj.get(key))
         except ValueError:
-            invalid_uuids.append(f"Invalid UUID: '{obj[key]}' in {filename}\n")
-            continue
+            invalid_uuids.append(f"Invalid UUID: '{obj[key]}' in {records.filename}")
         except TypeError:
-            invalid_uuids.append(f"Missing UUID in {filename}: {obj}\n")
-            continue
-
-    if invalid_uuids:
-        raise AssertionError("".join(invalid_uuids))
+            invalid_uuids.append(f"Missing UUID in {records.filename}: {obj}")
+    return invalid_uuids
 
 
-def missing(filename, content, key):
+def missing(records, key):
     "Missing check"
     missing_items = []
-    for obj in content:
+    for obj in records:
         if key not in obj or not obj[key]:
-            missing_items.append(f"Missing '{key}' in {filename}:")
+            missing_items.append(f"Missing '{key}' in {records.filename}:")
             missing_items.append(f"    {obj}")
+    return missing_items
+
 
-    if missing_items:
-        raise AssertionError("\n".join(missing_items))
+ALIAS_PATTERN = re.compile(r"^[a-z0-9-]+$")
 
 
-def alias_syntax(filename, content, key):
+def alias_syntax(records, key):
     "Alias syntax check (lowercase, digits and hyphens only)"
-    alias_pattern = re.compile(r"^[a-z0-9-]+$")
     invalid_aliases = []
-    for obj in content:
+    for obj in records:
         alias = obj.get(key)
-        if alias and not alias_pattern.match(alias):
+        if alias and not ALIAS_PATTERN.match(alias):
             invalid_aliases.append(
-                f"Invalid alias syntax '{alias}' for '{obj.get('displayName', obj.get('newName', 'unknown'))}' in {filename}"
+                f"Invalid alias syntax '{alias}' for '{obj.get('displayName', obj.get('newName', 'unknown'))}' in {records.filename}"
             )
+    return invalid_aliases
 
-    if invalid_aliases:
-        raise AssertionError("\n".join(invalid_aliases))
 
-
-def check_ingredient_densities(filename, content, key):
+def check_ingredient_densities(records, key):
     """check the ingredientDensity is strictly positive"""
     wrong = []
-    for obj in content:
+    for obj in records:
         if "ingredient" in obj.get("categories"):
             for metadata in get_metadata_for_scope(obj, "food"):
                 if metadata.get("ingredientDensity", 0) <= 0:
                     wrong.append(
-                        f"Wrong or missing '{key}' for `{obj['displayName']}` in {filename}"
+                        f"Wrong or missing '{key}' for `{obj['displayName']}` in {records.filename}"
                     )
-
-    if wrong:
-        raise AssertionError("\n".join(wrong))
+    return wrong
 
 
-def check_scenario(filename, content, key):
+def check_scenario(records, key):
     """Check scenario consistency"""
     errors = []
-    for obj in content:
+    for obj in records:
         if "ingredient" not in obj["categories"]:
             continue
         if not obj.get("ingredientCategories"):
@@ -187,7 +201,9 @@ def check_scenario(filename, content, key):
         # computed scenario must be the same as stored scenario
         # (at least for now)
         if "scenario" not in obj:
-            errors.append(f"No scenario found for `{obj['displayName']}` in {filename}")
+            errors.append(
+                f"No scenario found for `{obj['displayName']}` in {records.filename}"
+            )
         else:
             if obj["scenario"] not in list(Scenario):
                 errors.append(
@@ -195,7 +211,7 @@ def check_scenario(filename, content, key):
                 )
             if obj.get("scenario") != scenario(obj):
                 errors.append(
-                    f"Wrong scenario for `{obj['displayName']}` in {filename}"
+                    f"Wrong scenario for `{obj['displayName']}` in {records.filename}"
                 )
         # organic scenario is kind of redundant with organic category
         # but check it anyway
@@ -204,45 +220,19 @@ def check_scenario(filename, content, key):
             and "organic" not in obj["ingredientCategories"]
         ):
             errors.append(
-                f"The 'ingredientCategories' should contain 'organic' for `{obj['displayName']}` in {filename}"
+                f"The 'ingredientCategories' should contain 'organic' for `{obj['displayName']}` in {records.filename}"
             )
+    return errors
 
-    if errors:
-        raise AssertionError("\n".join(errors))
-
-
-def check_all(checks_by_file, content_checks_by_file=None):
-    for filename, checks_by_key in checks_by_file.items():
-        print(f"Checking {filename}")
-        with open(DATA_ROOT_DIR / filename) as f:
-            content = json.load(f)
-
-            # Run content-level checks (no specific key)
-            if content_checks_by_file and filename in content_checks_by_file:
-                for function in content_checks_by_file[filename]:
-                    function(filename, content)
-                    print("  OK: " + function.__doc__)
-
-            # Run key-specific checks
-            for key, checks in checks_by_key.items():
-                for function in checks:
-                    function(filename, content, key)
-                    print("  OK: " + function.__doc__ + f" for key '{key}'")
-    print("== All checks passed ==")
 
-
-def creation_alias_matches_export_alias(activities_fp):
+def creation_alias_matches_export_alias(records):
     """Check that creation aliases in custom_lci.json match export aliases in lci_catalog/__alias__.json.
 
     For each activity in lci_catalog/* whose activityName contains {{alias}},
     the alias inside {{...}} must match the activity.alias,
     and must correspond to an entry in custom_lci.json.
     """
-    with open(DATA_ROOT_DIR / "custom_lci.json") as f:
-        atc = json.load(f)
-    activities = json.load(activities_fp)
-
-    atc_aliases = {entry["alias"] for entry in atc}
+    atc_aliases = {entry["alias"] for entry in load_records("custom_lci.json")}
     errors = []
 
     # Live animal activities intentionally reuse a created process (with its
@@ -259,7 +249,7 @@ def creation_alias_matches_export_alias(activities_fp):
         "pork-default",
     }
 
-    for activity in activities:
+    for activity in records:
         activity_name = activity.get("activityName", "")
         match = re.search(r"\{\{(.+?)\}\}", activity_name)
         if not match:
@@ -284,97 +274,169 @@ def creation_alias_matches_export_alias(activities_fp):
             )
 
     if errors:
-        raise AssertionError(
-            "Creation/export alias inconsistencies:\n" + "\n".join(errors)
-        )
-    print("  OK: Creation alias matches export alias")
+        return ["Creation/export alias inconsistencies:\n" + "\n".join(errors)]
+    return []
 
 
-def _concat_lci(activities_file_path: Path):
-    activities = []
-    for lci_path in activities_file_path.glob("*/*.json"):
-        if lci_path.is_file():
-            with open(lci_path, "r") as file:
-                activity = json.load(file)
-                activity["alias"] = lci_path.stem
-                activities.append(activity)
-    return activities
+def load_records(filename: str) -> Records:
+    """The records of `filename` (relative to DATA_ROOT_DIR). A directory is an
+    lci_catalog, each activity gets the alias of its file."""
+    path = DATA_ROOT_DIR / filename
+    if path.is_dir():
+        catalog = load_catalog(path)
+        for activity, lci_path in zip(catalog.activities, catalog.paths):
+            activity["alias"] = lci_path.stem
+        return Records(filename, catalog.activities)
 
+    with open(path, "rb") as f:
+        return Records(filename, orjson.loads(f.read()))
 
-def test():
-    with tempfile.NamedTemporaryFile(
-        mode="w+", prefix="activities-"
-    ) as activities_temp:
-        json.dump(_concat_lci(DATA_ROOT_DIR / "lci_catalog"), activities_temp)
-        activities_temp.seek(0)
-
-        with tempfile.NamedTemporaryFile(
-            mode="w+", prefix="test-activities-"
-        ) as test_activities_temp:
-            json.dump(
-                _concat_lci(TESTS_FIXTURE_DIR / "lci_catalog"), test_activities_temp
+
+def check_file(filename, checks_by_key, content_checks) -> list[tuple[str, list]]:
+    """Load `filename` and run its checks, [(check description, violations)]"""
+    try:
+        records = load_records(filename)
+    except OSError as e:
+        return [(f"Load {filename}", [f"Can't read {filename}: {e}"])]
+
+    results = []
+    # Content-level checks (no specific key)
+    for function in content_checks:
+        results.append((function.__doc__, function(records)))
+    # Key-specific checks
+    for key, checks in checks_by_key.items():
+        for function in checks:
+            results.append(
+                (function.__doc__ + f" for key '{key}'", function(records, key))
             )
-            test_activities_temp.seek(0)
-
-            # Key-specific checks: validate specific fields
-            CHECKS = {
-                "custom_lci.json": {
-                    "alias": (duplicate_across_records, missing, alias_syntax),
-                    "newName": (duplicate_across_records, missing),
-                },
-                activities_temp.name: {
-                    "id": (duplicate_across_records, invalid_uuid, missing),
-                    "displayName": (duplicate_across_records,),
-                    "alias": (duplicate_across_records, alias_syntax),  # TODO
-                    "scenario": (check_scenario,),
-                    "ingredientDensity": (check_ingredient_densities,),
-                    "categories": (duplicate_within_value,),
-                },
-                "tests/custom_lci.json": {
-                    "alias": (duplicate_across_records, alias_syntax),
-                    "newName": (duplicate_across_records, missing),
-                },
-                test_activities_temp.name: {
-                    # "displayName": (duplicate,),
-                    "alias": (duplicate_across_records, alias_syntax),  # TODO
-                },
-                "../public/data/food/ingredients.json": {
-                    "id": (duplicate_across_records, invalid_uuid, missing),
-                    "alias": (missing, duplicate_across_records, alias_syntax),
-                    "name": (missing, duplicate_across_records),
-                },
-                "export/processes_legacy.json": {
-                    "id": (duplicate_across_records, invalid_uuid, missing),
-                    "displayName": (duplicate_across_records,),
-                    "categories": (duplicate_within_value,),
-                },
-                "export/processes_generic.json": {
-                    "id": (duplicate_across_records, invalid_uuid, missing),
-                    "displayName": (duplicate_across_records,),
-                    "categories": (duplicate_within_value,),
-                },
-                "../public/data/processes.json": {
-                    "id": (duplicate_across_records, invalid_uuid, missing),
-                    "categories": (duplicate_within_value,),
-                },
-                "../public/data/textile/materials.json": {
-                    "id": (duplicate_across_records, missing),
-                    "name": (missing,),
-                    "processId": (missing, duplicate_across_records, invalid_uuid),
-                },
-            }
-
-            # Content-level checks: validate relationships across the entire content
-            CONTENT_CHECKS = {
-                activities_temp.name: (
-                    metadata_consistency,
-                    custom_source_consistency,
-                    duplicate_alias_in_metadata,
-                ),
-            }
-
-            check_all(CHECKS, CONTENT_CHECKS)
-            creation_alias_matches_export_alias(activities_temp)
+    return results
+
+
+def check_all(checks_by_file, content_checks_by_file=None, max_workers=None):
+    """Run the checks of all the files, in parallel, and raise an AssertionError
+    with all the violations if any"""
+    content_checks_by_file = content_checks_by_file or {}
+    filenames = list(dict.fromkeys([*checks_by_file, *content_checks_by_file]))
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=min(max_workers or os.cpu_count() or 1, len(filenames))
+    ) as executor:
+        futures = [
+            executor.submit(
+                check_file,
+                filename,
+                checks_by_file.get(filename, {}),
+                content_checks_by_file.get(filename, ()),
+            )
+            for filename in filenames
+        ]
+
+        violations = []
+        # Reported in the order of the files
+        for filename, future in zip(filenames, futures):
+            print(f"Checking {filename}")
+            for description, errors in future.result():
+                print(("  FAILED: " if errors else "  OK: ") + description)
+                violations.extend(errors)
+
+    if violations:
+        raise AssertionError("\n".join(violations))
+    print("== All checks passed ==")
+
+
+# Key-specific checks: validate specific fields
+CHECKS = {
+    "custom_lci.json": {
+        "alias": (duplicate_across_records, missing, alias_syntax),
+        "newName": (duplicate_across_records, missing),
+    },
+    "lci_catalog": {
+        "id": (duplicate_across_records, invalid_uuid, missing),
+        "displayName": (duplicate_across_records,),
+        "alias": (duplicate_across_records, alias_syntax),  # TODO
+        "scenario": (check_scenario,),
+        "ingredientDensity": (check_ingredient_densities,),
+        "categories": (duplicate_within_value,),
+    },
+    "tests/custom_lci.json": {
+        "alias": (duplicate_across_records, alias_syntax),
+        "newName": (duplicate_across_records, missing),
+    },
+    "tests/fixtures/lci_catalog": {
+        # "displayName": (duplicate,),
+        "alias": (duplicate_across_records, alias_syntax),  # TODO
+    },
+    "../public/data/food/ingredients.json": {
+        "id": (duplicate_across_records, invalid_uuid, missing),
+        "alias": (missing, duplicate_across_records, alias_syntax),
+        "name": (missing, duplicate_across_records),
+    },
+    "export/processes_legacy.json": {
+        "id": (duplicate_across_records, invalid_uuid, missing),
+        "displayName": (duplicate_across_records,),
+        "categories": (duplicate_within_value,),
+    },
+    "export/processes_generic.json": {
+        "id": (duplicate_across_records, invalid_uuid, missing),
+        "displayName": (duplicate_across_records,),
+        "categories": (duplicate_within_value,),
+    },
+    "../public/data/processes.json": {
+        "id": (duplicate_across_records, invalid_uuid, missing),
+        "categories": (duplicate_within_value,),
+    },
+    "../public/data/textile/materials.json": {
+        "id": (duplicate_across_records, missing),
+        "name": (missing,),
+        "processId": (missing, duplicate_across_records, invalid_uuid),
+    },
+}
+
+# Content-level checks: validate relationships across the entire content
+CONTENT_CHECKS = {
+    "lci_catalog": (
+        metadata_consistency,
+        custom_source_consistency,
+        duplicate_alias_in_metadata,
+        creation_alias_matches_export_alias,
+    ),
+}
+
+
+def test():
+    check_all(CHECKS, CONTENT_CHECKS)
+
+
+def test_checks_report_all_violations():
+    records = Records(
+        "lci_catalog",
+        [
+            {
+                "id": "not-a-uuid",
+                "alias": "a",
+                "scopes": ["food"],
+                "metadata": [{"alias": "a-fr", "scopes": ["food", "object"]}],
+            },
+            {
+                "id": None,
+                "alias": "a",
+                "displayName": "B",
+                "scopes": ["food"],
+                "metadata": [{"alias": "a-fr", "scopes": ["food"]}],
+            },
+        ],
+    )
+
+    assert duplicate_across_records(records, "alias") == [
+        "Duplicate alias in lci_catalog: a"
+    ]
+    assert invalid_uuid(records, "id") == [
+        "Invalid UUID: 'not-a-uuid' in lci_catalog",
+        f"Missing UUID in lci_catalog: {records[1]}",
+    ]
+    assert duplicate_alias_in_metadata(records) == [
+        "Duplicate aliases in metadata in lci_catalog:\n  'a-fr': unknown (metadata[food,object]), B (metadata[food])"
+    ]
 
 
 if __name__ == "__main__":
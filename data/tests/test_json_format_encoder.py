@@ -1,6 +1,13 @@
+import functools
+import json
+import random
+import uuid
+
 import pytest
 
 from common import FormatNumberJsonEncoder
+from common.export import EXPORT_CHUNK_SIZE, export_json, export_json_variants
+from models.process import Impacts, dump_all
 
 
 @pytest.mark.parametrize(
@@ -44,3 +51,82 @@ def test_format_number_json_encoder(input_data, expected, test_id):
     assert result == expected, (
         f"{test_id}: Expected {expected}, but got {result} for input {input_data}"
     )
+
+
+def test_write_json_same_bytes_as_encoder(tmp_path):
+    random.seed(42)
+    data = [
+        {
+            "id": uuid.UUID(int=i),
+            "impacts": {
+                "cch": random.choice([-1, 1]) * 10 ** random.uniform(-25, 25),
+                "ecs": random.randint(-(10**6), 10**6),
+                "ldu": 0,
+            },
+            "tuple": (0.000123456789, 1234560000, 0.1000),
+            "values": [2.5, 0.00012345, 9.99996, 1e16, -0.0, True, None, "é\n"],
+        }
+        for i in range(EXPORT_CHUNK_SIZE + 10)
+    ]
+
+    for json_data in [data, data[0], [], {}]:
+        export_json(json_data, tmp_path / "export.json")
+
+        expected = (
+            json.dumps(
+                json_data,
+                indent=2,
+                ensure_ascii=False,
+                cls=FormatNumberJsonEncoder,
+                sort_keys=True,
+            )
+            + "\n"
+        )
+        assert (tmp_path / "export.json").read_text(encoding="utf-8") == expected
+
+
+def test_export_json_variants(tmp_path):
+    processes = [
+        {"id": str(uuid.UUID(int=i)), "impacts": {"cch": i / 3, "ecs": i / 7}}
+        for i in range(EXPORT_CHUNK_SIZE + 10)
+    ]
+
+    def even_ecs(p):
+        return (
+            {**p, "impacts": {"ecs": p["impacts"]["ecs"]}}
+            if int(p["id"][-1], 16) % 2 == 0
+            else None
+        )
+
+    export_json_variants(
+        processes,
+        {
+            tmp_path / "full.json": None,
+            tmp_path / "even_ecs.json": even_ecs,
+            tmp_path / "none.json": lambda p: None,
+        },
+    )
+
+    for name, expected in [
+        ("full.json", processes),
+        ("even_ecs.json", [p for p in map(even_ecs, processes) if p is not None]),
+        ("none.json", []),
+    ]:
+        export_json(expected, tmp_path / "expected.json")
+        assert (tmp_path / name).read_bytes() == (
+            tmp_path / "expected.json"
+        ).read_bytes()
+
+
+def test_export_json_dumped_by_chunks(tmp_path):
+    impacts = [
+        Impacts(**{"cch": i / 3, "etf-c": i / 7}) for i in range(EXPORT_CHUNK_SIZE + 10)
+    ]
+    dump = functools.partial(dump_all, Impacts)
+
+    export_json(impacts, tmp_path / "dumped.json", dump=dump)
+    export_json(dump(impacts), tmp_path / "expected.json")
+
+    assert (tmp_path / "dumped.json").read_bytes() == (
+        tmp_path / "expected.json"
+    ).read_bytes()
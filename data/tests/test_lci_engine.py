@@ -0,0 +1,127 @@
+import bw2data
+import numpy as np
+import pytest
+from bw2calc.errors import BW2CalcError
+from pytest import approx
+
+from common import get_normalization_weighting_factors
+from common.export import IMPACTS_JSON
+from common.impacts import impacts as impacts_py
+from common.impacts import main_method
+from ecobalyse_data.bw.engine import LCIEngine
+from ecobalyse_data.computation import (
+    compute_brightway_impacts,
+    compute_brightway_impacts_batch,
+    compute_processes_for_bw_activities,
+)
+from models.process import ComputedBy
+
+
+def test_batch_matches_single_lca(forwast):
+    activities = [
+        activity
+        for activity in bw2data.Database("forwast")
+        if "process" in activity.get("type")
+    ][:5]
+
+    # A chunk smaller than the number of activities to solve several times
+    # against the same factorization
+    demand_amounts = [
+        (a["production amount"] > 0) - (a["production amount"] < 0) for a in activities
+    ]
+    batch = compute_brightway_impacts_batch(
+        activities, demand_amounts, main_method, impacts_py, chunk_size=2
+    )
+
+    assert len(batch) == len(activities)
+    for activity in activities:
+        assert batch[activity.id] == approx(
+            compute_brightway_impacts(activity, impacts_py)
+        )
+
+
+def test_parallel_matches_serial(forwast):
+    activities = [
+        activity
+        for activity in bw2data.Database("forwast")
+        if "process" in activity.get("type")
+    ][:6]
+    demand_amounts = [1] * len(activities)
+
+    serial = compute_brightway_impacts_batch(
+        activities, demand_amounts, main_method, impacts_py, chunk_size=2
+    )
+    parallel = compute_brightway_impacts_batch(
+        activities,
+        demand_amounts,
+        main_method,
+        impacts_py,
+        chunk_size=2,
+        cpu_count=2,
+    )
+
+    assert list(parallel) == list(serial)
+    for activity_id, impacts in serial.items():
+        assert parallel[activity_id] == approx(impacts)
+
+
+@pytest.mark.parametrize(
+    "patch",
+    [
+        {"side_effect": BW2CalcError("test")},
+        # Raised by SuperLU on a singular technosphere
+        {"side_effect": RuntimeError("Factor is exactly singular")},
+    ],
+)
+def test_unsolvable_chunk_is_computed_activity_by_activity(forwast, mocker, patch):
+    activities = [
+        activity
+        for activity in bw2data.Database("forwast")
+        if "process" in activity.get("type")
+    ][:3]
+    mocker.patch.object(LCIEngine, "scores_by_id", **patch)
+
+    processes = compute_processes_for_bw_activities(
+        activities,
+        main_method,
+        impacts_py,
+        IMPACTS_JSON,
+        get_normalization_weighting_factors(IMPACTS_JSON),
+    )
+
+    assert [p.bw_activity for p in processes] == activities
+    assert all(p.computed_by == ComputedBy.brightway for p in processes)
+
+
+def test_non_finite_scores_are_not_exported(forwast, mocker):
+    activities = [
+        activity
+        for activity in bw2data.Database("forwast")
+        if "process" in activity.get("type")
+    ][:3]
+    # An ill-conditioned technosphere, for the batch and the single activity paths
+    mocker.patch.object(
+        LCIEngine,
+        "supply",
+        autospec=True,
+        side_effect=lambda engine, ids, amounts: np.full(
+            (engine.size, len(ids)), np.nan
+        ),
+    )
+    mocker.patch(
+        "ecobalyse_data.computation.compute_brightway_impacts",
+        side_effect=lambda activity, impacts_py, demand_amount=None: dict.fromkeys(
+            impacts_py, float("nan")
+        ),
+    )
+
+    processes = compute_processes_for_bw_activities(
+        activities,
+        main_method,
+        impacts_py,
+        IMPACTS_JSON,
+        get_normalization_weighting_factors(IMPACTS_JSON),
+    )
+
+    assert [p.bw_activity for p in processes] == activities
+    assert all(p.impacts is None and p.computed_by is None for p in processes)
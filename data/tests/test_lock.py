@@ -0,0 +1,35 @@
+from ecobalyse_data.bw.lock import resolve_bw_activity, update_lock
+
+ACTIVITY = {
+    "id": "9f1c0a1e-5a4c-4d0f-8a59-0d3c1f6d2b11",
+    "displayName": "Vegetable oils",
+    "source": "forwast",
+    "activityName": "_22 Vegetable and animal oils and fats, EU27",
+    "location": "GLO",
+}
+
+
+def test_update_lock(forwast):
+    lock, stale, refreshed = update_lock([ACTIVITY], {})
+    assert stale == [ACTIVITY["id"]]
+    assert refreshed == []
+    assert lock[ACTIVITY["id"]]["database"] == "forwast"
+
+    # Up to date entries are not searched again
+    assert update_lock([ACTIVITY], lock) == (lock, [], [])
+
+    # An entry resolved from other catalog fields is stale
+    renamed = {ACTIVITY["id"]: {**lock[ACTIVITY["id"]], "activityName": "Old name"}}
+    assert update_lock([ACTIVITY], renamed) == (lock, [ACTIVITY["id"]], [])
+
+    # An entry of a database written since is refreshed, without a search
+    outdated = {ACTIVITY["id"]: {**lock[ACTIVITY["id"]], "fingerprint": "old"}}
+    assert update_lock([ACTIVITY], outdated) == (lock, [], [ACTIVITY["id"]])
+
+
+def test_resolve_bw_activity(forwast):
+    lock, _, _ = update_lock([ACTIVITY], {})
+    bw_activity = resolve_bw_activity(ACTIVITY, lock)
+
+    assert bw_activity["code"] == lock[ACTIVITY["id"]]["code"]
+    assert bw_activity == resolve_bw_activity(ACTIVITY)
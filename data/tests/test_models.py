@@ -0,0 +1,66 @@
+import uuid
+
+from models.process import (
+    Impacts,
+    Process,
+    ProcessGeneric,
+    Scope,
+    dump_all,
+    validate_all,
+)
+
+
+def make_process(i: int) -> Process:
+    return Process(
+        bw_activity=object(),
+        categories=["material"],
+        comment="",
+        computed_by="brightway",
+        mass_per_unit=None,
+        display_name=f"Process {i}",
+        elec_kwh=i,
+        heat_mj=0,
+        id=uuid.UUID(int=i),
+        impacts=Impacts(**{"cch": i, "etf-c": 2 * i}),
+        land_occupation=0.5,
+        location="GLO",
+        scopes=[Scope.object],
+        source="test",
+        activity_name=f"activity {i}",
+        unit="kg",
+        qty_variation_ratio=1,
+    )
+
+
+def test_dump_all():
+    processes = [make_process(i) for i in range(5)]
+    exclude = {"bw_activity", "computed_by", "land_occupation"}
+
+    assert dump_all(Process, processes, exclude=exclude) == [
+        p.model_dump(by_alias=True, exclude=exclude) for p in processes
+    ]
+    assert dump_all(Process, []) == []
+
+
+def test_validate_all():
+    rows = [
+        {
+            "activity_name": f"activity {i}",
+            "categories": ["material"],
+            "comment": "",
+            "display_name": f"Process {i}",
+            "elec_kwh": 0,
+            "heat_mj": 0,
+            "id": str(uuid.UUID(int=i)),
+            "impacts": {"cch": i, "etf-c": i},
+            "location": "GLO",
+            "mass_per_unit": None,
+            "scopes": ["object"],
+            "source": "test",
+            "unit": "kg",
+            "qty_variation_ratio": 1,
+        }
+        for i in range(5)
+    ]
+
+    assert validate_all(ProcessGeneric, rows) == [ProcessGeneric(**r) for r in rows]
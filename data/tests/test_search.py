@@ -0,0 +1,23 @@
+import pytest
+
+from ecobalyse_data.bw import search
+from ecobalyse_data.bw.search import search_one
+
+ACTIVITY_NAME = "_22 Vegetable and animal oils and fats, EU27"
+
+
+def test_search_one_exact_match(forwast):
+    activity = search_one("forwast", ACTIVITY_NAME, location="GLO")
+    assert activity["name"] == ACTIVITY_NAME
+
+    # A new process reads the persisted index instead of rebuilding it
+    search._indexes.clear()
+    assert search_one("forwast", ACTIVITY_NAME) == activity
+
+
+def test_search_one_no_match(forwast):
+    with pytest.raises(ValueError):
+        search_one("forwast", ACTIVITY_NAME, location="FR")
+
+    with pytest.raises(ValueError):
+        search_one("forwast", ACTIVITY_NAME, excluded_term="oils")
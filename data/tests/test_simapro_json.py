@@ -0,0 +1,22 @@
+import zipfile
+
+from common.bw.simapro_json import patch_agb3, read_zipped_csv_lines
+
+
+def test_read_zipped_csv_lines(tmp_path):
+    zip_path = tmp_path / "AGB3.CSV.zip"
+    with zipfile.ZipFile(zip_path, "w") as zf:
+        zf.writestr(
+            "AGB3.CSV",
+            b'{SimaPro 9}\r\nyield;01/03/2005;"0;001172";"0;001172"\r\n'
+            b"caf\xe9 \x81\x9d\r\n",
+        )
+
+    assert list(read_zipped_csv_lines(zip_path)) == [
+        "{SimaPro 9}\n",
+        'yield;01/03/2005;"0;001172";"0;001172"\n',
+        "café ??\n",
+    ]
+    assert list(read_zipped_csv_lines(zip_path, patch=patch_agb3))[1] == (
+        'Yield_;1/3/5;0,001172;"0;001172"\n'
+    )
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from config import DATA_ROOT_DIR, settings
+
+# Cold start (new interpreter, `--help`) budget of each data CLI, in seconds.
+# Most of it is spent importing brightway, the budget is there to catch
+# anything heavier (activating the project, loading databases or
+# datapackages…) creeping back at import time.
+STARTUP_TIME_BUDGET = float(os.environ.get("EB_STARTUP_TIME_BUDGET", "10"))
+
+SCRIPTS = ["export.py", "export_lcia.py", "lcia_info.py", "export_bw_db.py"]
+
+
+def _env() -> dict[str, str]:
+    return {
+        **dict(os.environ),
+        "PYTHONPATH": os.pathsep.join(
+            [str(DATA_ROOT_DIR), *filter(None, [os.environ.get("PYTHONPATH")])]
+        ),
+    }
+
+
+@pytest.mark.parametrize("script", SCRIPTS)
+def test_help_startup_time(temp_bw_dir, script):
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, DATA_ROOT_DIR / "bin" / script, "--help"],
+        env=_env(),
+        capture_output=True,
+        check=True,
+    )
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < STARTUP_TIME_BUDGET, (
+        f"`{script} --help` took {elapsed:.1f}s (budget: {STARTUP_TIME_BUDGET}s)"
+    )
+
+
+def test_import_is_lazy(temp_bw_dir):
+    """Importing the CLIs doesn't activate the Brightway project nor parse impacts.json"""
+    code = "\n".join(
+        [
+            *[f"import bin.{script.removesuffix('.py')}" for script in SCRIPTS],
+            "import bw2data, common.export",
+            # bw2data prints its own messages (the Brightway directory…)
+            "print('current_project=' + bw2data.projects.current)",
+            "print(f'impacts_json_loaded={common.export.get_impacts_json.cache_info().currsize}')",
+        ]
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env=_env(),
+        cwd=DATA_ROOT_DIR,
+        capture_output=True,
+        check=True,
+    )
+
+    values = dict(
+        line.split("=", 1)
+        for line in result.stdout.decode().splitlines()
+        if line.startswith(("current_project=", "impacts_json_loaded="))
+    )
+    assert values["current_project"] != settings.bw.project
+    assert values["impacts_json_loaded"] == "0"
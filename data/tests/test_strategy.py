@@ -0,0 +1,83 @@
+import copy
+
+from ecobalyse_data.bw.strategy import (
+    apply_strategies,
+    extract_ciqual,
+    fix_lentil_ldu,
+    fuse_strategies,
+    lower_formula_parameters,
+    remove_acetamiprid,
+    remove_some_processes,
+)
+
+DB = [
+    {
+        "name": "Lentil, at farm [Ciqual code: 20505]",
+        "location": "FR",
+        "exchanges": [
+            {"name": "Transformation, from unspecified"},
+            {"name": "Acetamiprid"},
+        ],
+    },
+    {"name": "Wheat", "location": "GLO", "exchanges": [{"name": "Acetamiprid"}]},
+    {
+        "name": "Failing process",
+        "exchanges": [],
+        "simapro metadata": {"Process identifier": "EI3CQUNI000025017103662"},
+    },
+]
+EXPECTED = [
+    {
+        "name": "Lentil, at farm [Ciqual code: 20505]",
+        "location": "FR",
+        "exchanges": [{"name": "Transformation, from annual crop"}],
+        "ciqual_code": "20505",
+    },
+    {"name": "Wheat", "location": "GLO", "exchanges": [{"name": "Acetamiprid"}]},
+]
+STRATEGIES = [extract_ciqual, fix_lentil_ldu, remove_acetamiprid, remove_some_processes]
+
+
+def test_dataset_strategies():
+    db = copy.deepcopy(DB)
+    new_db = db
+    for strategy in STRATEGIES:
+        new_db = strategy(new_db)
+
+    assert new_db == EXPECTED
+    # The datasets are only copied when modified
+    assert db == DB
+    assert new_db[1] is db[1]
+
+
+def test_fuse_strategies():
+    fused = fuse_strategies([lower_formula_parameters, *STRATEGIES])
+    assert fused[0] is lower_formula_parameters
+    assert len(fused) == 2
+
+    db = copy.deepcopy(DB)
+    assert fused[1](db) == EXPECTED
+    assert db == DB
+    assert [name for name, _ in fused[1].timings] == [s.__name__ for s in STRATEGIES]
+
+
+class Importer:
+    def __init__(self, data):
+        self.data = data
+        self.applied_strategies = []
+
+    def apply_strategy(self, strategy):
+        self.data = strategy(self.data)
+        self.applied_strategies.append(strategy.__name__)
+
+
+def test_apply_strategies():
+    importer = Importer(copy.deepcopy(DB))
+    timings = apply_strategies(importer, [lower_formula_parameters, *STRATEGIES])
+
+    assert importer.data == EXPECTED
+    assert len(importer.applied_strategies) == 2
+    assert [name for name, _ in timings] == [
+        "lower_formula_parameters",
+        *[s.__name__ for s in STRATEGIES],
+    ]
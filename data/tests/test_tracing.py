@@ -0,0 +1,46 @@
+import orjson
+
+from ecobalyse_data import tracing
+
+
+def test_span_disabled():
+    with tracing.span("not recorded"):
+        pass
+
+    assert tracing.stop_tracing() == []
+
+
+def test_nested_spans(tmp_path):
+    tracing.start_tracing()
+
+    @tracing.traced("inner")
+    def inner():
+        return sum(range(1000))
+
+    with tracing.span("outer", activities=2):
+        assert inner() == 499500
+        inner()
+
+    trace_path = tmp_path / "trace.json"
+    tracing.write_trace(trace_path)
+
+    with open(trace_path, "rb") as f:
+        events = orjson.loads(f.read())["traceEvents"]
+
+    assert [e["name"] for e in events] == ["inner", "inner", "outer"]
+    outer = events[-1]
+    assert outer["args"]["activities"] == 2
+    for event in events[:-1]:
+        assert event["ph"] == "X"
+        # Nested in the outer span
+        assert outer["ts"] <= event["ts"]
+        assert event["ts"] + event["dur"] <= outer["ts"] + outer["dur"]
+        assert event["args"]["cpu_ms"] >= 0
+        assert event["args"]["children_cpu_ms"] >= 0
+        assert event["args"]["peak_rss_mb"] > 0
+        assert event["args"]["peak_rss_growth_mb"] >= 0
+
+    # Tracing is stopped once written
+    with tracing.span("not recorded"):
+        pass
+    assert tracing.stop_tracing() == []